@@ -24,10 +24,11 @@ from django.views.generic import View
 from django.http import Http404,HttpResponse
 from django.shortcuts import get_object_or_404
 
-from harvest.models import Job
+from harvest.models import Job,StateStatistic
 from tablemanager.models import Publish,Workspace,Input,DataSource
 from wmsmanager.models import WmsLayer,WmsServer
 from harvest.jobstatemachine import JobStatemachine
+from harvest.jobstatistics import JobStatistics
 from monitor.models import SlaveServer,PublishSyncStatus
 from livelayermanager.models import Layer as LiveLayer
 from livelayermanager.models import SqlViewLayer as LiveSqlViewLayer
@@ -491,6 +492,71 @@ class PublishStatusApi(DjangoResource,BasicHttpAuthMixin):
             logger.error(traceback.format_exc())
             raise
 
+class StateStatisticApi(DjangoResource,BasicHttpAuthMixin):
+    """
+    The duration statistics of harvest states for a publish and its inputs
+    """
+    def is_authenticated(self):
+        if self.request.user.is_authenticated():
+            return True
+        else:
+            return self.authenticate(self.request)
+
+    @staticmethod
+    def urls():
+        return [
+            url(r'^statistics/publishs/(?P<name>[a-zA-Z0-9_\-]+)/$',StateStatisticApi.as_detail(),name='publish_statistics'),
+        ]
+
+    @staticmethod
+    def _statistic(s):
+        return {
+            "state":s.state,
+            "samples":s.samples,
+            "p50":s.p50,
+            "p95":s.p95,
+            "max":s.max,
+            "refreshed":timezone.localtime(s.refreshed).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    @skip_prepare
+    def detail(self,name):
+        publish = get_object_or_404(Publish,name=name)
+        resp = {
+            "publish":publish.name,
+            "states":[self._statistic(s) for s in StateStatistic.objects.filter(publish=publish).order_by("state")],
+            "inputs":{},
+        }
+        for i in publish.inputs:
+            resp["inputs"][i.name] = [self._statistic(s) for s in StateStatistic.objects.filter(input=i).order_by("state")]
+
+        return resp
+
+class BatchEstimateApi(DjangoResource,BasicHttpAuthMixin):
+    """
+    The estimated completion time of the running job batches
+    """
+    def is_authenticated(self):
+        if self.request.user.is_authenticated():
+            return True
+        else:
+            return self.authenticate(self.request)
+
+    @staticmethod
+    def urls():
+        return [
+            url(r'^statistics/batches/$',BatchEstimateApi.as_list(),name='batch_estimates'),
+            url(r'^statistics/batches/(?P<batch_id>[a-zA-Z0-9_\-]+)/$',BatchEstimateApi.as_detail(),name='batch_estimate'),
+        ]
+
+    @skip_prepare
+    def list(self):
+        return [JobStatistics.estimate_batch(batch_id) for batch_id in JobStatistics.running_batches()]
+
+    @skip_prepare
+    def detail(self,batch_id):
+        return JobStatistics.estimate_batch(batch_id)
+
 
-urlpatterns =  JobApi.urls() + MetadataApi.urls() + LegendApi.urls()
+urlpatterns =  JobApi.urls() + MetadataApi.urls() + LegendApi.urls() + StateStatisticApi.urls() + BatchEstimateApi.urls()
 
@@ -203,10 +203,22 @@ HARVEST_CONFIG = {
     "WORKSPACE_AS_SCHEMA" : True,
     "MAX_TEST_IMPORT_TIME" : int(os.environ.get("MAX_TEST_DATA_IMPORT_TIME") or 300), #seconds
     "RETRY_INTERVAL" : 300, #seconds
+    "MAX_RETRY_INTERVAL" : int(os.environ.get("MAX_RETRY_INTERVAL") or 21600), #seconds, the upper bound of the retry interval of a failed job
     "IMPORT_CANCEL_TIME" : 60, #seconds
+    "INPUT_TABLE_LOGGED" : (os.environ.get("INPUT_TABLE_LOGGED") or "true").lower() in ("true","yes","on"), #create the input tables imported in swap mode as logged tables, the unlogged tables are truncated after a database crash
+    "HARVEST_WORKERS" : int(os.environ.get("HARVEST_WORKERS") or 1), #the number of jobs which can run concurrently
+    "JOB_ORDERING" : os.environ.get("JOB_ORDERING") or "id", #the order in which the ready jobs are run: id, priority, cost (shortest job first) or fair_share (per workspace)
+    "STATE_STATISTIC_SAMPLES" : int(os.environ.get("STATE_STATISTIC_SAMPLES") or 30), #the number of latest executions used to calculate the state duration statistics
+    "DATA_DUMP_METHOD" : os.environ.get("DATA_DUMP_METHOD") or "move", #move: move the published table into the publish data schema while dumping; copy: dump a copy of the published table, which is not locked exclusively
+    "FILE_DIGEST_WORKERS" : int(os.environ.get("FILE_DIGEST_WORKERS") or 0), #the number of threads to hash the changed datasource files; 0 means the number of cpus
+    "DS_WATCH_DEBOUNCE" : int(os.environ.get("DS_WATCH_DEBOUNCE") or 5), #seconds, the datasource watcher waits until no more change happens in this time before updating the inputs
+    "DS_WATCH_MAX_DELAY" : int(os.environ.get("DS_WATCH_MAX_DELAY") or 60), #seconds, the longest time a datasource change can wait for the debounce
+    "DS_WATCH_REFRESH_INTERVAL" : int(os.environ.get("DS_WATCH_REFRESH_INTERVAL") or 300), #seconds, the interval to refresh the watched directories from the inputs
+    "JOB_LEASE_TIME" : int(os.environ.get("JOB_LEASE_TIME") or 300), #seconds, a job claimed by a harvest node is reclaimable by other nodes after its lease expired
     "BORG_STATE_REPOSITORY" : os.environ.get("BORG_STATE_REPOSITORY", os.path.join(BASE_DIR, "borgcollector-state")),
     "BORG_STATE_USER": os.environ.get("BORG_STATE_USER", "borgcollector"),
     "BORG_STATE_SSH": "ssh -i " + os.environ.get("BORG_STATE_SSH", "~/.ssh/id_rsa"),
+    "HG_POOL_SIZE": int(os.environ.get("HG_POOL_SIZE") or 4), #the maximum number of idle mercurial command servers kept for reuse
     "USERLIST": os.environ.get("USERLIST", ""),
     "USERLIST_USERNAME": os.environ.get("USERLIST_USERNAME", ""),
     "USERLIST_PASSWORD": os.environ.get("USERLIST_PASSWORD", ""),
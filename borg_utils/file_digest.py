@@ -0,0 +1,98 @@
+import os
+import hashlib
+import logging
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection
+from django.utils import timezone
+
+from borg_utils.models import FileDigest
+from borg_utils.utils import file_md5
+from borg_utils.gdal import source_files
+from borg_utils.borg_config import BorgConfiguration
+
+logger = logging.getLogger(__name__)
+
+def file_digests(paths,workers=None):
+    """
+    return a dict from path to the md5 digest of the file's content.
+    The digests are cached in the FileDigest table, keyed by the file's path, inode, size and modify time;
+    only the files whose stat is changed are hashed again, in parallel by 'workers' threads;
+    hashlib releases the GIL while hashing, and threads are safe to start in the multi-threaded harvest process, unlike forked processes.
+    A file which doesn't exist is not included in the result.
+    """
+    stats = {}
+    for path in set(paths):
+        try:
+            stats[path] = os.stat(path)
+        except OSError:
+            continue
+
+    cached = dict([(d.path,d) for d in FileDigest.objects.filter(path__in=stats.keys())])
+    digests = {}
+    stale_paths = []
+    for path,stat in stats.items():
+        if path in cached and cached[path].matches(stat):
+            digests[path] = cached[path].digest
+        else:
+            stale_paths.append(path)
+
+    if not stale_paths:
+        return digests
+
+    workers = min(workers or BorgConfiguration.FILE_DIGEST_WORKERS or multiprocessing.cpu_count(),len(stale_paths))
+    if workers > 1:
+        pool = ThreadPool(workers)
+        try:
+            stale_digests = pool.map(file_md5,stale_paths)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        stale_digests = [file_md5(path) for path in stale_paths]
+    logger.debug("Hashed {0} changed files with {1} workers".format(len(stale_paths),workers))
+
+    #upsert, the same file can be hashed by other harvest workers at the same time
+    sql = """INSERT INTO "{0}" (path,inode,size,mtime,digest,digest_time) VALUES (%s,%s,%s,%s,%s,%s)
+ON CONFLICT (path) DO UPDATE SET inode=EXCLUDED.inode,size=EXCLUDED.size,mtime=EXCLUDED.mtime,digest=EXCLUDED.digest,digest_time=EXCLUDED.digest_time""".format(FileDigest._meta.db_table)
+    now = timezone.now()
+    cursor = connection.cursor()
+    try:
+        for path,digest in zip(stale_paths,stale_digests):
+            stat = stats[path]
+            cursor.execute(sql,[path,stat.st_ino,stat.st_size,stat.st_mtime,digest,now])
+            digests[path] = digest
+    finally:
+        cursor.close()
+
+    return digests
+
+def clean_file_digests():
+    """
+    remove the cached digests of the files which don't exist any more
+    return the number of removed digests
+    """
+    removed_paths = [path for path in FileDigest.objects.values_list("path",flat=True) if not os.path.exists(path)]
+    for i in range(0,len(removed_paths),1000):
+        FileDigest.objects.filter(path__in=removed_paths[i:i + 1000]).delete()
+    return len(removed_paths)
+
+def datasource_digest(datasources,workers=None):
+    """
+    return the content digest of the data source files and their sidecar files,
+    or None if any data source is not a file.
+    """
+    if not datasources:
+        return None
+    paths = []
+    for datasource in datasources:
+        if not os.path.isfile(datasource):
+            return None
+        paths.extend(source_files(datasource))
+    digests = file_digests(paths,workers)
+    m = hashlib.md5()
+    for path in paths:
+        if path in digests:
+            m.update("{0}|{1}\n".format(os.path.basename(path),digests[path]))
+    return m.hexdigest()
@@ -1,8 +1,110 @@
 import subprocess
 import os
+import glob
+import hashlib
+import logging
+import threading
+import traceback
 
+from django.core.cache import caches
 
-def detect_epsg(filename):
+logger = logging.getLogger(__name__)
+
+try:
+    shared_cache = caches["shared"]
+except:
+    logger.warning("The introspection cache is not shared between processes because uwsgi cache is not configured properly.\n{0}".format(traceback.format_exc()))
+    shared_cache = None
+
+def source_files(datasource):
+    """
+    return the source file and its sidecar files, such as .dbf and .prj of a shape file
+    """
+    return sorted(set([datasource] + glob.glob(os.path.splitext(datasource)[0] + ".*")))
+
+class IntrospectionCache(object):
+    """
+    Cache the introspection result of data sources, such as the 'ogrinfo' output and the EPSG code,
+    to avoid running the GDAL tools against the same vrt and source files again and again.
+
+    The cache key is the fingerprint of the rendered vrt and the path, size and modify time of the source files,
+    so the cached result is invalidated automatically when the vrt or any source file is changed.
+    Only the file based data sources are cached; a database data source can change without any file being changed.
+
+    The result is cached in the current process, and also in the shared uwsgi cache if configured.
+    """
+    _local = {}
+    _lock = threading.Lock()
+    max_entries = 512
+    timeout = 7 * 86400
+
+    @staticmethod
+    def fingerprint(vrt_file,datasources):
+        """
+        return the fingerprint of the vrt file and its data sources, or None if the data sources are not files.
+        """
+        if not datasources:
+            return None
+        m = hashlib.md5()
+        with open(vrt_file,'rb') as f:
+            m.update(f.read())
+        for datasource in datasources:
+            if not os.path.isfile(datasource):
+                return None
+            for path in source_files(datasource):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                m.update("{0}|{1}|{2}\n".format(path,stat.st_size,stat.st_mtime))
+        return "introspection_{0}".format(m.hexdigest())
+
+    @staticmethod
+    def get(key):
+        """
+        return the cached introspection result, or None if not cached
+        """
+        if not key:
+            return None
+        result = IntrospectionCache._local.get(key)
+        if result is None and shared_cache:
+            try:
+                result = shared_cache.get(key)
+            except:
+                result = None
+            if result is not None:
+                with IntrospectionCache._lock:
+                    IntrospectionCache._local[key] = result
+        return result
+
+    @staticmethod
+    def update(key,**kwargs):
+        """
+        add the introspection result into the cache entry
+        """
+        if not key:
+            return
+        with IntrospectionCache._lock:
+            result = dict(IntrospectionCache._local.get(key) or {})
+            result.update(kwargs)
+            if key not in IntrospectionCache._local and len(IntrospectionCache._local) >= IntrospectionCache.max_entries:
+                IntrospectionCache._local.clear()
+            IntrospectionCache._local[key] = result
+        if shared_cache:
+            try:
+                shared_cache.set(key,result,IntrospectionCache.timeout)
+            except:
+                pass
+
+
+def detect_epsg(filename,cache_key=None):
+    """
+    return the EPSG code of the data source;
+    if cache_key is not None, the result is cached with the key.
+    """
+    cached = IntrospectionCache.get(cache_key)
+    if cached and "epsg" in cached:
+        return cached["epsg"]
     
     gdal_cmd = ['gdalsrsinfo', '-e', filename]
     gdal = subprocess.Popen(gdal_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -14,4 +116,6 @@ def detect_epsg(filename):
             result = line
             break
 
+    if gdal.returncode == 0:
+        IntrospectionCache.update(cache_key,epsg=result)
     return result
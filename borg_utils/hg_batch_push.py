@@ -1,10 +1,10 @@
-import hglib
 import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
 from borg_utils.borg_config import BorgConfiguration
+from borg_utils.hg_pool import open_repository
 
 def try_set_push_owner(owner,enforce=False):
     if enforce or getattr(threading.current_thread,"push_owner",None) in [None,owner]:
@@ -45,7 +45,7 @@ def try_push_to_repository(pusher,hg=None,enforce=False):
         logger.debug("Push {0} changesets to the repository".format(changesets))
 
     if hg is None:
-        hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+        hg = open_repository()
         try:
             hg.push(ssh=BorgConfiguration.BORG_STATE_SSH)
         finally:
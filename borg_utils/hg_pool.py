@@ -0,0 +1,111 @@
+import os
+import threading
+import logging
+import atexit
+
+import hglib
+
+from borg_utils.borg_config import BorgConfiguration
+
+logger = logging.getLogger(__name__)
+
+class PooledRepository(object):
+    """
+    A repository client borrowed from RepositoryPool.
+    It can be used as a hglib client; close() returns the client to the pool instead of terminating the command server.
+    """
+    def __init__(self,pool,client):
+        self._pool = pool
+        self._client = client
+        self._broken = False
+
+    def __getattr__(self,name):
+        if self._client is None:
+            raise Exception("The repository client is already closed.")
+        attr = getattr(self._client,name)
+        if not callable(attr):
+            return attr
+
+        def _call(*args,**kwargs):
+            try:
+                return attr(*args,**kwargs)
+            except hglib.error.CommandError:
+                #the command failed, but the command server is still usable
+                raise
+            except:
+                #the command server may be broken, don't return it to the pool
+                self._broken = True
+                raise
+        return _call
+
+    def close(self):
+        if self._client is not None:
+            client = self._client
+            self._client = None
+            self._pool.release(client,self._broken)
+
+class RepositoryPool(object):
+    """
+    A thread safe pool of hglib clients for a repository.
+    Each hglib client is a mercurial command server process; reusing them avoids starting a new process for every repository access.
+    A client is used by one borrower at a time.
+    """
+    def __init__(self,path,size):
+        self._path = path
+        self._size = size
+        self._idle = []
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def open(self):
+        """
+        borrow a client from the pool, or open a new one if no idle client is available
+        """
+        client = None
+        with self._lock:
+            if self._pid != os.getpid():
+                #forked by another process, the command servers belong to the parent process.
+                self._idle = []
+                self._pid = os.getpid()
+            if self._idle:
+                client = self._idle.pop()
+
+        if client is None:
+            client = hglib.open(self._path)
+        return PooledRepository(self,client)
+
+    def release(self,client,broken=False):
+        """
+        return the client to the pool; close it if it is broken or the pool is full.
+        """
+        if not broken:
+            with self._lock:
+                if self._pid == os.getpid() and len(self._idle) < self._size:
+                    self._idle.append(client)
+                    return
+        try:
+            client.close()
+        except:
+            logger.debug("Failed to close the repository client.")
+
+    def clear(self):
+        """
+        close all idle clients
+        """
+        with self._lock:
+            clients = self._idle if self._pid == os.getpid() else []
+            self._idle = []
+        for client in clients:
+            try:
+                client.close()
+            except:
+                pass
+
+state_repository_pool = RepositoryPool(BorgConfiguration.BORG_STATE_REPOSITORY,BorgConfiguration.HG_POOL_SIZE)
+atexit.register(state_repository_pool.clear)
+
+def open_repository():
+    """
+    borrow a client of the borg state repository from the pool; call close() on the returned client to return it.
+    """
+    return state_repository_pool.open()
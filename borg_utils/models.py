@@ -62,3 +62,20 @@ class BorgModel(django.db.models.Model):
 
     class Meta:
         abstract = True
+
+class FileDigest(django.db.models.Model):
+    """
+    The content digest of a file, reused until the file's inode, size or modify time is changed.
+    """
+    path = django.db.models.CharField(max_length=1024, unique=True)
+    inode = django.db.models.BigIntegerField()
+    size = django.db.models.BigIntegerField()
+    mtime = django.db.models.FloatField()
+    digest = django.db.models.CharField(max_length=32)
+    digest_time = django.db.models.DateTimeField(auto_now=True)
+
+    def matches(self,stat):
+        return self.inode == stat.st_ino and self.size == stat.st_size and self.mtime == stat.st_mtime
+
+    def __str__(self):
+        return self.path
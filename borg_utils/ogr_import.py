@@ -0,0 +1,396 @@
+import logging
+import struct
+import binascii
+import time
+
+try:
+    from osgeo import ogr,osr
+    ogr.UseExceptions()
+    osr.UseExceptions()
+except ImportError:
+    ogr = None
+    osr = None
+
+logger = logging.getLogger(__name__)
+
+def gdal_available():
+    """
+    return True if the GDAL python bindings are installed.
+    """
+    return ogr is not None
+
+class OgrImportCancelled(Exception):
+    pass
+
+class _CopyStream(object):
+    """
+    A file like object which reads the COPY data from a generator of lines, so the features are streamed to the database
+    without being buffered in memory or in a temporary file.
+    """
+    def __init__(self,lines):
+        self._lines = lines
+        self._buffer = []
+        self._buffer_size = 0
+
+    def _fill(self,size):
+        while size < 0 or self._buffer_size < size:
+            try:
+                line = next(self._lines)
+            except StopIteration:
+                break
+            self._buffer.append(line)
+            self._buffer_size += len(line)
+
+    def read(self,size=-1):
+        self._fill(size)
+        data = "".join(self._buffer)
+        if size >= 0 and len(data) > size:
+            data,rest = data[:size],data[size:]
+            self._buffer = [rest]
+            self._buffer_size = len(rest)
+        else:
+            self._buffer = []
+            self._buffer_size = 0
+        return data
+
+class OgrDataset(object):
+    """
+    A data source opened once through the GDAL python bindings.
+    The layer information, the spatial reference system and the features are all read from the opened data source,
+    instead of running ogrinfo, gdalsrsinfo and ogr2ogr against the vrt file one after another.
+
+    The imported table has the same structure as the table created by
+    'ogr2ogr -overwrite -preserve_fid -nlt PROMOTE_TO_MULTI -f PostgreSQL', and the layer summary has the same format as 'ogrinfo -so -al'.
+    """
+    fid_column = "ogc_fid"
+    geometry_column = "wkb_geometry"
+
+    _multi_types = None
+    _pg_geometry_types = None
+
+    def __init__(self,filename,layer_name=None):
+        if ogr is None:
+            raise Exception("GDAL python bindings are not installed.")
+        self.filename = filename
+        self._ds = ogr.Open(filename)
+        if self._ds is None:
+            raise Exception("Failed to open the data source '{0}'".format(filename))
+        self.layer = self._ds.GetLayerByName(layer_name) if layer_name else self._ds.GetLayer(0)
+        if self.layer is None:
+            raise Exception("Failed to find the layer '{0}' in data source '{1}'".format(layer_name or 0,filename))
+
+    @staticmethod
+    def _init_types():
+        if OgrDataset._multi_types is None:
+            OgrDataset._multi_types = {
+                ogr.wkbPoint:ogr.wkbMultiPoint,
+                ogr.wkbLineString:ogr.wkbMultiLineString,
+                ogr.wkbPolygon:ogr.wkbMultiPolygon,
+            }
+            OgrDataset._pg_geometry_types = {
+                ogr.wkbPoint:"POINT",
+                ogr.wkbLineString:"LINESTRING",
+                ogr.wkbPolygon:"POLYGON",
+                ogr.wkbMultiPoint:"MULTIPOINT",
+                ogr.wkbMultiLineString:"MULTILINESTRING",
+                ogr.wkbMultiPolygon:"MULTIPOLYGON",
+                ogr.wkbGeometryCollection:"GEOMETRYCOLLECTION",
+            }
+
+    @property
+    def layer_name(self):
+        return self.layer.GetName()
+
+    @property
+    def geometry_type(self):
+        return self.layer.GetGeomType()
+
+    @property
+    def is_spatial(self):
+        return ogr.GT_Flatten(self.geometry_type) != ogr.wkbNone
+
+    @property
+    def fields(self):
+        defn = self.layer.GetLayerDefn()
+        return [defn.GetFieldDefn(i) for i in range(defn.GetFieldCount())]
+
+    def epsg(self):
+        """
+        return the EPSG code of the layer's spatial reference system, in the same format as 'gdalsrsinfo -e', or None if not found
+        """
+        srs = self.layer.GetSpatialRef()
+        if srs is None:
+            return None
+        srs = srs.Clone()
+        try:
+            srs.AutoIdentifyEPSG()
+        except:
+            pass
+        if srs.GetAuthorityName(None) == "EPSG" and srs.GetAuthorityCode(None):
+            return "EPSG:{0}".format(srs.GetAuthorityCode(None))
+        return None
+
+    def info(self,feature_count=None,extent=None):
+        """
+        return the layer summary in the same format as 'ogrinfo -so -al'.
+        feature_count and extent are calculated from the layer if not provided.
+        """
+        lines = [
+            "INFO: Open of `{0}'".format(self.filename),
+            "      using driver `{0}' successful.".format(self._ds.GetDriver().GetName()),
+            "",
+            "Layer name: {0}".format(self.layer_name),
+            "Geometry: {0}".format(ogr.GeometryTypeToName(self.geometry_type)),
+            "Feature Count: {0}".format(self.layer.GetFeatureCount() if feature_count is None else feature_count),
+        ]
+        if self.is_spatial:
+            if extent is None:
+                try:
+                    extent = self.layer.GetExtent()
+                except:
+                    extent = None
+            if extent:
+                lines.append("Extent: ({0:f}, {2:f}) - ({1:f}, {3:f})".format(*extent))
+        srs = self.layer.GetSpatialRef()
+        lines.append("Layer SRS WKT:")
+        lines.append(srs.ExportToPrettyWkt() if srs is not None else "(unknown)")
+        for f in self.fields:
+            type_name = ogr.GetFieldTypeName(f.GetType())
+            if f.GetSubType() != ogr.OFSTNone:
+                type_name = "{0}({1})".format(type_name,ogr.GetFieldSubTypeName(f.GetSubType()))
+            lines.append("{0}: {1} ({2}.{3})".format(f.GetName(),type_name,f.GetWidth(),f.GetPrecision()))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def launder(name):
+        """
+        launder the column name in the same way as the ogr2ogr PostgreSQL driver
+        """
+        return name.lower().replace("-","_").replace("#","_").replace("'","_")
+
+    @staticmethod
+    def _pg_field_type(field):
+        field_type,width,precision = field.GetType(),field.GetWidth(),field.GetPrecision()
+        if field_type == ogr.OFTInteger:
+            if field.GetSubType() == ogr.OFSTBoolean:
+                return "boolean"
+            elif field.GetSubType() == ogr.OFSTInt16:
+                return "smallint"
+            return "integer"
+        elif field_type == ogr.OFTInteger64:
+            return "bigint"
+        elif field_type == ogr.OFTReal:
+            if width > 0:
+                return "numeric({0},{1})".format(width,precision)
+            return "float8"
+        elif field_type == ogr.OFTString:
+            if width > 0:
+                return "varchar({0})".format(width)
+            return "varchar"
+        elif field_type == ogr.OFTDate:
+            return "date"
+        elif field_type == ogr.OFTTime:
+            return "time"
+        elif field_type == ogr.OFTDateTime:
+            return "timestamp with time zone"
+        elif field_type == ogr.OFTBinary:
+            return "bytea"
+        elif field_type == ogr.OFTIntegerList:
+            return "integer[]"
+        elif field_type == ogr.OFTInteger64List:
+            return "bigint[]"
+        elif field_type == ogr.OFTRealList:
+            return "float8[]"
+        else:
+            return "varchar[]" if field_type == ogr.OFTStringList else "varchar"
+
+    def _target_geometry_type(self):
+        """
+        return the geometry type of the imported table; single part geometries are promoted to multi part geometries.
+        """
+        OgrDataset._init_types()
+        geometry_type = self.geometry_type
+        flat_type = ogr.GT_Flatten(geometry_type)
+        if flat_type in OgrDataset._multi_types:
+            multi_type = OgrDataset._multi_types[flat_type]
+            return ogr.GT_SetZ(multi_type) if ogr.GT_HasZ(geometry_type) else multi_type
+        return geometry_type
+
+    def _pg_geometry_type(self,srid):
+        geometry_type = self._target_geometry_type()
+        name = OgrDataset._pg_geometry_types.get(ogr.GT_Flatten(geometry_type),"GEOMETRY")
+        if ogr.GT_HasZ(geometry_type):
+            name += "Z"
+        return "geometry({0},{1})".format(name,srid or 0)
+
+    def create_table_sql(self,schema,table,srid=None,unlogged=False,rowid_column=None):
+        columns = ["\"{0}\" integer NOT NULL".format(self.fid_column)]
+        for f in self.fields:
+            columns.append("\"{0}\" {1}".format(self.launder(f.GetName()),self._pg_field_type(f)))
+        if self.is_spatial:
+            columns.append("\"{0}\" {1}".format(self.geometry_column,self._pg_geometry_type(srid)))
+        if rowid_column:
+            columns.append("\"{0}\" text".format(rowid_column))
+        return "CREATE {3}TABLE \"{0}\".\"{1}\" ({2})".format(schema,table,",".join(columns),"UNLOGGED " if unlogged else "")
+
+    @staticmethod
+    def _escape(value):
+        return value.replace("\\","\\\\").replace("\t","\\t").replace("\n","\\n").replace("\r","\\r")
+
+    @staticmethod
+    def _array_value(values,quote):
+        if quote:
+            values = ["\"{0}\"".format(v.replace("\\","\\\\").replace("\"","\\\"")) for v in values]
+        else:
+            values = [repr(v) if isinstance(v,float) else str(v) for v in values]
+        return "{" + ",".join(values) + "}"
+
+    def _field_value(self,feature,index,field_type):
+        if not feature.IsFieldSet(index) or (hasattr(feature,"IsFieldNull") and feature.IsFieldNull(index)):
+            return "\\N"
+        if field_type == ogr.OFTReal:
+            value = repr(feature.GetFieldAsDouble(index))
+        elif field_type == ogr.OFTBinary:
+            value = "\\x" + binascii.hexlify(feature.GetFieldAsBinary(index))
+        elif field_type in (ogr.OFTIntegerList,ogr.OFTInteger64List,ogr.OFTRealList,ogr.OFTStringList):
+            value = self._array_value(feature.GetField(index),field_type == ogr.OFTStringList)
+        else:
+            value = feature.GetFieldAsString(index)
+        return self._escape(value)
+
+    def _geometry_value(self,geometry,target_type,srid):
+        """
+        return the geometry as hex encoded EWKB
+        """
+        if target_type != geometry.GetGeometryType() and ogr.GT_Flatten(target_type) in OgrDataset._multi_types.values():
+            geometry = ogr.ForceTo(geometry.Clone(),target_type)
+        wkb = bytes(geometry.ExportToWkb(ogr.wkbNDR))
+        if srid:
+            geometry_type = struct.unpack("<I",wkb[1:5])[0]
+            wkb = wkb[0:1] + struct.pack("<Ii",geometry_type | 0x20000000,srid) + wkb[5:]
+        return binascii.hexlify(wkb)
+
+    #the number of consecutive failures of reading the features before the import is aborted
+    max_read_errors = 10
+    def _copy_lines(self,srid,result,max_time=None,cancel_check=None,check_interval=60):
+        """
+        A generator of the COPY lines of all the features;
+        the feature count, extent and the failed features are collected into result in the same pass.
+        A feature which can't be read is skipped; the import is aborted if max_read_errors features in a row can't be read,
+        which means the data source itself is broken, for example a truncated file.
+        """
+        field_types = [f.GetType() for f in self.fields]
+        target_type = self._target_geometry_type() if self.is_spatial else None
+        begin_time = time.time()
+        last_check_time = begin_time
+        read_errors = 0
+        self.layer.ResetReading()
+        while True:
+            now = time.time()
+            if max_time and result["feature_count"] > 0 and now - begin_time > max_time:
+                #only part of the data is imported.
+                result["completed"] = False
+                break
+            if cancel_check and now - last_check_time >= check_interval:
+                last_check_time = now
+                if cancel_check():
+                    raise OgrImportCancelled()
+
+            try:
+                feature = self.layer.GetNextFeature()
+                read_errors = 0
+            except Exception as ex:
+                read_errors += 1
+                if read_errors >= self.max_read_errors:
+                    raise Exception("Failed to read {0} features in a row, abort the import. {1}".format(read_errors,ex))
+                result["errors"].append(str(ex))
+                continue
+            if feature is None:
+                break
+
+            try:
+                values = [str(feature.GetFID())]
+                values += [self._field_value(feature,i,field_types[i]) for i in range(len(field_types))]
+                if target_type is not None:
+                    geometry = feature.GetGeometryRef()
+                    if geometry is None or geometry.IsEmpty():
+                        values.append("\\N")
+                    else:
+                        values.append(self._geometry_value(geometry,target_type,srid))
+                        envelope = geometry.GetEnvelope()
+                        extent = result["extent"]
+                        if extent:
+                            result["extent"] = (min(extent[0],envelope[0]),max(extent[1],envelope[1]),min(extent[2],envelope[2]),max(extent[3],envelope[3]))
+                        else:
+                            result["extent"] = envelope
+            except Exception as ex:
+                #skip the failed feature, the same as 'ogr2ogr -skipfailures'
+                result["errors"].append("ERROR: Failed to import feature {0}. {1}".format(feature.GetFID(),ex))
+                continue
+
+            result["feature_count"] += 1
+            yield "\t".join(values) + "\n"
+
+    @staticmethod
+    def _rowid_trigger_sql(schema,table,columns,rowid_column):
+        """
+        return the sql to create a trigger which populates the rowid column with the hash of all the other columns while the features are copied
+        """
+        return """CREATE OR REPLACE FUNCTION "{0}"."{1}_rowid"() RETURNS trigger AS $$
+BEGIN
+    NEW."{2}" := md5(CAST(({3}) AS text));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER "{1}_rowid" BEFORE INSERT ON "{0}"."{1}" FOR EACH ROW EXECUTE PROCEDURE "{0}"."{1}_rowid"()""".format(
+            schema,table,rowid_column,",".join(["NEW.\"{0}\"".format(c) for c in columns]))
+
+    @staticmethod
+    def _drop_rowid_trigger_sql(schema,table):
+        """
+        return the sql to drop the trigger created by _rowid_trigger_sql
+        """
+        return "DROP TRIGGER IF EXISTS \"{1}_rowid\" ON \"{0}\".\"{1}\"; DROP FUNCTION IF EXISTS \"{0}\".\"{1}_rowid\"()".format(schema,table)
+
+    def import_to(self,cursor,schema,table,srid=None,max_time=None,cancel_check=None,check_interval=60,unlogged=False,rowid_column=None):
+        """
+        Import the layer into the table, the existing table will be dropped first.
+        All the features are streamed into the database by one COPY statement.
+        unlogged: create the table as an unlogged table.
+        rowid_column: add a text column populated with md5 of all the other columns while the features are copied.
+        max_time: the maximum seconds to import the data, the remaining features are not imported if the time is exceeded.
+        cancel_check: a function called every check_interval seconds, the importing is cancelled if it returns True.
+
+        Return a dictionary with feature_count, extent, errors and completed; raise OgrImportCancelled if cancelled.
+        """
+        if isinstance(srid,basestring):
+            srid = int(srid.split(":")[-1]) if srid else None
+
+        result = {"feature_count":0,"extent":None,"errors":[],"completed":True}
+        cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE".format(schema,table))
+        cursor.execute(self.create_table_sql(schema,table,srid,unlogged,rowid_column))
+
+        columns = [self.fid_column] + [self.launder(f.GetName()) for f in self.fields]
+        if self.is_spatial:
+            columns.append(self.geometry_column)
+        if rowid_column:
+            cursor.execute(self._rowid_trigger_sql(schema,table,columns,rowid_column))
+        copy_sql = "COPY \"{0}\".\"{1}\" ({2}) FROM STDIN".format(schema,table,",".join(["\"{0}\"".format(c) for c in columns]))
+        try:
+            cursor.copy_expert(copy_sql,_CopyStream(self._copy_lines(srid,result,max_time,cancel_check,check_interval)))
+        finally:
+            if rowid_column:
+                cursor.execute(self._drop_rowid_trigger_sql(schema,table))
+
+        #build the indexes once, after all the data is loaded.
+        cursor.execute("ALTER TABLE \"{0}\".\"{1}\" ADD CONSTRAINT \"{1}_pkey\" PRIMARY KEY (\"{2}\")".format(schema,table,self.fid_column))
+        if self.is_spatial:
+            cursor.execute("CREATE INDEX \"{1}_{2}_geom_idx\" ON \"{0}\".\"{1}\" USING GIST (\"{2}\")".format(schema,table,self.geometry_column))
+
+        if result["errors"]:
+            logger.error("{0} features are failed to import into table {1}.{2}".format(len(result["errors"]),schema,table))
+        return result
+
+    def close(self):
+        self.layer = None
+        self._ds = None
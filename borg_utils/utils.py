@@ -1,9 +1,27 @@
+import os
 import hashlib
 
-def file_md5(f):
+def file_md5(f,chunk_size=1024 * 1024):
     md5 = hashlib.md5()
     with open(f,"rb") as f:
-        for chunk in iter(lambda: f.read(2048),b""):
+        for chunk in iter(lambda: f.read(chunk_size),b""):
             md5.update(chunk)
     return md5.hexdigest()
 
+
+def path_mtime(path):
+    """
+    return the modify time of the path.
+    For a directory, return the latest modify time of the directory and the files in it,
+    because rewriting a file in place doesn't change the modify time of the directory.
+    """
+    mtime = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for root,dirs,files in os.walk(path):
+            for name in files:
+                try:
+                    mtime = max(mtime,os.path.getmtime(os.path.join(root,name)))
+                except OSError:
+                    #the file is removed
+                    continue
+    return mtime
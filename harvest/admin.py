@@ -1,7 +1,9 @@
+from datetime import timedelta
+
 from django.contrib import admin
 
 from harvest.models import (
-    Job, JobLog,Process
+    Job, JobLog,Process,StateStatistic
 )
 from borg.admin import site
 from harvest.jobstates import JobState,JobStateOutcome,Failed,Completed,CompletedWithWarning
@@ -14,7 +16,7 @@ def harvest(modeladmin, request, queryset):
 harvest.short_description = "Harvest and update selected outputs"
 
 class JobAdmin(admin.ModelAdmin):
-    readonly_fields = ("id","batch_id","_publish","job_type", "state","job_action" ,"previous_state", "_message","retry_times","last_execution_end_time", "created", "launched", "finished","sync_status","job_logs")
+    readonly_fields = ("id","batch_id","_publish","job_type", "state","job_action" ,"previous_state", "_message","retry_times","last_execution_end_time","next_retry_at","lease_owner","lease_expiry", "created", "launched", "finished","sync_status","job_logs")
     list_display = ("id","batch_id", "_publish","job_type", "state", "created", "launched", "finished","job_action","sync_status","job_logs")
     search_fields = ["publish__name","batch_id","id"]
     actions = None
@@ -190,9 +192,47 @@ class ProcessAdmin(admin.ModelAdmin):
     class Media:
         js = ('/static/js/admin-model-readonly.js',)
 
+class StateStatisticAdmin(admin.ModelAdmin):
+    readonly_fields = ("id","publish","input","state","samples","_p50","_p95","_max","refreshed")
+    list_display = ("id","publish","input","state","samples","_p50","_p95","_max","refreshed")
+    list_filter = ("state",)
+    search_fields = ["publish__name","input__name"]
+    ordering = ("-p95",)
+    actions = None
+
+    def _duration(self,seconds):
+        if seconds is None:
+            return ''
+        return str(timedelta(seconds=int(round(seconds))))
+
+    def _p50(self,o):
+        return self._duration(o.p50)
+    _p50.short_description = "P50"
+    _p50.admin_order_field = "p50"
+
+    def _p95(self,o):
+        return self._duration(o.p95)
+    _p95.short_description = "P95"
+    _p95.admin_order_field = "p95"
+
+    def _max(self,o):
+        return self._duration(o.max)
+    _max.short_description = "Max"
+    _max.admin_order_field = "max"
+
+    def has_add_permission(self,request):
+        return False
+
+    def has_delete_permission(self,request,obj=None):
+        return False
+
+    class Media:
+        js = ('/static/js/admin-model-readonly.js',)
+
 site.register(Job, JobAdmin)
 #site.register(FailingJob, FailingJobAdmin)
 site.register(RunningJob, RunningJobAdmin)
 site.register(EffectiveJob, EffectiveJobAdmin)
 site.register(JobLog, JobLogAdmin)
 site.register(Process, ProcessAdmin)
+site.register(StateStatistic, StateStatisticAdmin)
@@ -0,0 +1,106 @@
+import os
+import errno
+import hashlib
+import logging
+
+from borg_utils.borg_config import BorgConfiguration
+
+logger = logging.getLogger(__name__)
+
+class DumpStore(object):
+    """
+    A content addressed store of the full data dumps.
+    The key of a dump is the hash of the table's content, structure, name and the dump compression,
+    so a job whose published table is unchanged reuses the previous dump by a hard link instead of dumping the table again.
+    The dump files of the jobs are hard links of the store files; a store file is removed by clean after all the jobs linking to it are deleted.
+    """
+    def __init__(self,store_dir=None):
+        self.store_dir = store_dir or os.path.join(BorgConfiguration.FULL_DATA_DUMP_DIR,".store")
+
+    _structure_sql = """SELECT string_agg(a.attname || ' ' || format_type(a.atttypid,a.atttypmod),',' ORDER BY a.attnum) FROM pg_attribute a WHERE a.attrelid = '"{0}"."{1}"'::regclass AND a.attnum > 0 AND NOT a.attisdropped
+UNION ALL
+SELECT string_agg(pg_get_indexdef(i.indexrelid),';' ORDER BY pg_get_indexdef(i.indexrelid)) FROM pg_index i WHERE i.indrelid = '"{0}"."{1}"'::regclass
+UNION ALL
+SELECT string_agg(pg_get_constraintdef(c.oid),';' ORDER BY pg_get_constraintdef(c.oid)) FROM pg_constraint c WHERE c.conrelid = '"{0}"."{1}"'::regclass"""
+    #the sums of the four 32 bits slices of the md5_rowhash; the sums don't depend on the order of the rows and have a fixed size
+    _content_sql = """SELECT count(*),coalesce(sum(('x' || substr(md5_rowhash,1,8))::bit(32)::int),0),coalesce(sum(('x' || substr(md5_rowhash,9,8))::bit(32)::int),0),
+coalesce(sum(('x' || substr(md5_rowhash,17,8))::bit(32)::int),0),coalesce(sum(('x' || substr(md5_rowhash,25,8))::bit(32)::int),0) FROM \"{0}\".\"{1}\""""
+
+    def content(self,cursor,schema,table_name):
+        """
+        return the digest of the content of the table, which is computed from the md5_rowhash of the rows in one scan without sorting
+        """
+        cursor.execute(self._content_sql.format(schema,table_name))
+        return hashlib.md5("|".join([str(v) for v in cursor.fetchone()])).hexdigest()
+
+    def key(self,cursor,schema,table_name,dump_schema,compression,content=None):
+        """
+        return the key of the dump of the table in schema, which is dumped as dump_schema.table_name
+        content: the content digest of the table if it is known, otherwise it is computed from the table
+        """
+        m = hashlib.md5()
+        m.update("{0}.{1}|{2}\n".format(dump_schema,table_name,compression))
+        cursor.execute(self._structure_sql.format(schema,table_name))
+        for row in cursor.fetchall():
+            m.update("{0}\n".format(row[0] or ""))
+        m.update("{0}\n".format(content or self.content(cursor,schema,table_name)))
+        return m.hexdigest()
+
+    def _paths(self,key):
+        path = os.path.join(self.store_dir,key + ".db")
+        return (path,path + ".md5")
+
+    def reuse(self,key,dump_file):
+        """
+        link the stored dump into the dump file
+        return the md5 of the dump, or None if the dump is not stored
+        """
+        store_file,md5_file = self._paths(key)
+        if not os.path.exists(store_file) or not os.path.exists(md5_file):
+            return None
+        try:
+            with open(md5_file,"rb") as f:
+                md5 = f.read().strip()
+            if os.path.exists(dump_file):
+                os.remove(dump_file)
+            os.link(store_file,dump_file)
+            return md5
+        except (OSError,IOError) as ex:
+            logger.warning("Failed to reuse the stored dump '{0}'. {1}".format(store_file,ex))
+            return None
+
+    def add(self,key,dump_file,md5):
+        """
+        add the dump file into the store
+        """
+        store_file,md5_file = self._paths(key)
+        try:
+            if not os.path.exists(self.store_dir):
+                os.makedirs(self.store_dir)
+            with open(md5_file + ".tmp","wb") as f:
+                f.write(md5)
+            os.rename(md5_file + ".tmp",md5_file)
+            os.link(dump_file,store_file)
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                logger.warning("Failed to add the dump '{0}' into the store. {1}".format(dump_file,ex))
+
+    def clean(self):
+        """
+        remove the stored dumps which are not linked by any job
+        return the number of removed dumps
+        """
+        if not os.path.exists(self.store_dir):
+            return 0
+        removed = 0
+        for f in os.listdir(self.store_dir):
+            if not f.endswith(".db"):
+                continue
+            store_file = os.path.join(self.store_dir,f)
+            if os.stat(store_file).st_nlink > 1:
+                continue
+            os.remove(store_file)
+            if os.path.exists(store_file + ".md5"):
+                os.remove(store_file + ".md5")
+            removed += 1
+        return removed
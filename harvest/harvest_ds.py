@@ -4,15 +4,24 @@ import time
 import threading
 import logging
 import traceback
+import ctypes
+import ctypes.util
+import struct
+import select
+import errno
 
 from datetime import datetime
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
+from django.db import transaction,connection
 
 from borg_utils.resource_status import ResourceStatus
+from borg_utils.jobintervals import JobInterval
+from borg_utils.borg_config import BorgConfiguration
+from borg_utils.utils import path_mtime
 
-from tablemanager.models import Input
+from tablemanager.models import Input,Publish
 
 logger = logging.getLogger(__name__)
 
@@ -22,29 +31,50 @@ class HarvestDatasource(object):
         self._check_interval = check_interval
         self._async = async
 
-    def _harvest_ds_time(self):
+    @staticmethod
+    def ds_modify_time(input):
+        """
+        return the latest modify time of the input's datasource files, or None if any file doesn't exist
+        the modify time of a directory datasource is the latest modify time of the files in it
+        """
         modify_time = None
         new_modify_time = None
-        counter = 0
-        reload_style_counter = 0
-        delete_style_counter = 0
-        for i in Input.objects.filter(foreign_table__isnull=True):
-            new_modify_time = None
-            for ds in i.datasource or []:
-                if os.path.exists(ds):
-                    modify_time = datetime.utcfromtimestamp(os.path.getmtime(ds)).replace(tzinfo=pytz.UTC)
-                    if new_modify_time:
-                        if new_modify_time < modify_time:
-                            new_modify_time = modify_time
-                    else:
+        for ds in input.datasource or []:
+            if os.path.exists(ds):
+                modify_time = datetime.utcfromtimestamp(path_mtime(ds)).replace(tzinfo=pytz.UTC)
+                if new_modify_time:
+                    if new_modify_time < modify_time:
                         new_modify_time = modify_time
                 else:
-                    new_modify_time = None
-                    break
+                    new_modify_time = modify_time
+            else:
+                new_modify_time = None
+                break
+        return new_modify_time
+
+    @staticmethod
+    def update_ds_modify_time(inputs):
+        """
+        update the ds_modify_time of the changed inputs in one transaction.
+        return the changed inputs
+        """
+        changed_inputs = []
+        for i in inputs:
+            new_modify_time = HarvestDatasource.ds_modify_time(i)
             if not new_modify_time or i.ds_modify_time != new_modify_time:
                 i.ds_modify_time = new_modify_time
-                i.save(update_fields=["ds_modify_time"])
-                counter += 1
+                changed_inputs.append(i)
+        if changed_inputs:
+            with transaction.atomic():
+                for i in changed_inputs:
+                    Input.objects.filter(pk=i.pk).update(ds_modify_time=i.ds_modify_time)
+        return changed_inputs
+
+    def _harvest_ds_time(self):
+        counter = 0
+        reload_style_counter = 0
+        delete_style_counter = 0
+        counter = len(HarvestDatasource.update_ds_modify_time(Input.objects.filter(foreign_table__isnull=True)))
         return (counter,reload_style_counter,delete_style_counter)
 
     def _repeated_harvest(self):
@@ -76,5 +106,254 @@ class HarvestDatasource(object):
             #one time job
             return self._harvest_ds_time()
 
+class Inotify(object):
+    """
+    A minimal inotify binding through ctypes, used to watch the directories of the datasource files.
+    """
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+
+    WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+    _event_header = struct.Struct("iIII")
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise Exception("Can't find libc")
+        self._libc = ctypes.CDLL(libc_name,use_errno=True)
+        if not hasattr(self._libc,"inotify_init1"):
+            raise Exception("inotify is not supported")
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int,ctypes.c_char_p,ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int,ctypes.c_int]
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(),os.strerror(ctypes.get_errno()))
+
+    def add_watch(self,path,mask=WATCH_MASK):
+        wd = self._libc.inotify_add_watch(self.fd,path.encode("utf-8") if isinstance(path,unicode) else path,mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(),"{0}: {1}".format(os.strerror(ctypes.get_errno()),path))
+        return wd
+
+    def rm_watch(self,wd):
+        self._libc.inotify_rm_watch(self.fd,wd)
+
+    def read_events(self,timeout):
+        """
+        wait up to timeout seconds, return the list of (wd,mask,name) events
+        """
+        readable = select.select([self.fd],[],[],timeout)[0]
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd,65536)
+        except OSError as ex:
+            if ex.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        pos = 0
+        while pos + self._event_header.size <= len(data):
+            wd,mask,cookie,length = self._event_header.unpack_from(data,pos)
+            pos += self._event_header.size
+            name = data[pos:pos + length].rstrip("\0")
+            pos += length
+            events.append((wd,mask,name))
+        return events
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except:
+            pass
+
+class DatasourceWatcher(object):
+    """
+    Watch the directories of the file based datasources with inotify, and update the ds_modify_time of the changed inputs
+    within seconds, instead of checking all the datasources once a day.
+
+    The changes are debounced: the changed inputs are collected until no more change happens in 'debounce' seconds
+    (or 'max_delay' seconds have passed), then their ds_modify_time is updated in one transaction,
+    and the jobs of the realtime publishes whose inputs are changed are created.
+    A datasource which is a directory, such as a FileGDB, is watched itself too, because the writes inside it don't change its parent directory.
+    The watched directories are refreshed every 'refresh_interval' seconds to pick up the new and changed inputs.
+    If inotify is not available, fall back to checking all the datasources every 'refresh_interval' seconds.
+    """
+    def __init__(self,debounce=None,max_delay=None,refresh_interval=None):
+        self._debounce = debounce or BorgConfiguration.DS_WATCH_DEBOUNCE
+        self._max_delay = max_delay or BorgConfiguration.DS_WATCH_MAX_DELAY
+        self._refresh_interval = refresh_interval or BorgConfiguration.DS_WATCH_REFRESH_INTERVAL
+        self._inotify = None
+        #wd -> directory
+        self._watches = {}
+        #directory -> wd
+        self._watched_dirs = {}
+        #(directory,file name without extension) -> set of input ids
+        self._files = {}
+        #directory datasource -> set of input ids
+        self._ds_dirs = {}
+
+    def _file_key(self,path):
+        directory,name = os.path.split(path)
+        return (directory,os.path.splitext(name)[0])
+
+    def _refresh(self):
+        """
+        rebuild the file to input map, and watch the new directories and unwatch the unused directories
+        """
+        files = {}
+        ds_dirs = {}
+        for i in Input.objects.filter(foreign_table__isnull=True).only("id","source"):
+            for ds in i.datasource or []:
+                if ds.startswith("/"):
+                    files.setdefault(self._file_key(ds),set()).add(i.id)
+                    if os.path.isdir(ds):
+                        ds_dirs.setdefault(ds.rstrip("/"),set()).add(i.id)
+        self._files = files
+        self._ds_dirs = ds_dirs
+
+        directories = set([k[0] for k in files.keys()]).union(ds_dirs.keys())
+        for directory in directories:
+            if directory in self._watched_dirs:
+                continue
+            try:
+                wd = self._inotify.add_watch(directory)
+            except OSError as ex:
+                logger.warning("Failed to watch the directory '{0}'. {1}".format(directory,ex))
+                continue
+            self._watches[wd] = directory
+            self._watched_dirs[directory] = wd
+
+        for directory,wd in self._watched_dirs.items():
+            if directory not in directories:
+                self._inotify.rm_watch(wd)
+                del self._watched_dirs[directory]
+                del self._watches[wd]
+
+        logger.info("Watching {0} directories for the changes of {1} datasource files and {2} datasource directories".format(len(self._watched_dirs),len(files),len(ds_dirs)))
+
+    def _flush(self,input_ids):
+        """
+        update the ds_modify_time of the changed inputs, and create the jobs of the affected realtime publishes
+        """
+        changed_inputs = HarvestDatasource.update_ds_modify_time(Input.objects.filter(id__in=input_ids))
+        if not changed_inputs:
+            return
+        logger.info("The datasources of {0} inputs have been changed: {1}".format(len(changed_inputs),[i.name for i in changed_inputs]))
+
+        changed_ids = set([i.id for i in changed_inputs])
+        for p in Publish.objects.filter(interval=JobInterval.Realtime.name):
+            try:
+                if changed_ids.intersection([i.id for i in p.inputs]):
+                    break
+            except:
+                continue
+        else:
+            return
+
+        from harvest.jobstatemachine import JobStatemachine
+        try:
+            counter = JobStatemachine.create_jobs(JobInterval.Realtime)
+            logger.info("{0} realtime jobs are created".format(counter))
+        except:
+            logger.error("Failed to create realtime jobs.{0}{1}".format(os.linesep,traceback.format_exc()))
+
+    def _poll(self):
+        while True:
+            try:
+                counter = HarvestDatasource(True,0).harvest()
+                logger.info("{} datasources have been changed.".format(counter[0]))
+            except:
+                logger.error("Failed to havest datasource's last modify time.{0}{1}".format(os.linesep,traceback.format_exc()))
+            time.sleep(self._refresh_interval)
+
+    def run(self):
+        try:
+            self._inotify = Inotify()
+        except Exception as ex:
+            logger.warning("inotify is not available, check the datasources every {0} seconds instead. {1}".format(self._refresh_interval,ex))
+            self._poll()
+            return
+
+        try:
+            self._refresh()
+            #pick up the changes happened before watching
+            HarvestDatasource(True,0).harvest()
+            next_refresh_time = time.time() + self._refresh_interval
+            pending = set()
+            first_change_time = None
+            last_change_time = None
+            while True:
+                now = time.time()
+                if pending:
+                    timeout = max(0,min(last_change_time + self._debounce,first_change_time + self._max_delay) - now)
+                else:
+                    timeout = max(0,next_refresh_time - now)
+
+                for wd,mask,name in self._inotify.read_events(timeout):
+                    input_ids = None
+                    if mask & Inotify.IN_Q_OVERFLOW:
+                        #events are lost, check all the watched datasources
+                        input_ids = set().union(*(self._files.values() + self._ds_dirs.values()))
+                    elif mask & Inotify.IN_IGNORED:
+                        #the directory is removed or unmounted, watch it again in the next refresh
+                        directory = self._watches.pop(wd,None)
+                        if directory:
+                            self._watched_dirs.pop(directory,None)
+                    elif wd in self._watches:
+                        directory = self._watches[wd]
+                        if name:
+                            input_ids = set(self._files.get((directory,os.path.splitext(name.decode("utf-8","replace"))[0])) or [])
+                        else:
+                            #the directory itself is changed
+                            input_ids = set().union(*[v for k,v in self._files.items() if k[0] == directory])
+                        #any change inside a directory datasource changes the datasource
+                        input_ids.update(self._ds_dirs.get(directory) or [])
+
+                    if input_ids:
+                        pending.update(input_ids)
+                        last_change_time = time.time()
+                        first_change_time = first_change_time or last_change_time
+
+                if pending:
+                    now = time.time()
+                    if now >= last_change_time + self._debounce or now >= first_change_time + self._max_delay:
+                        try:
+                            self._flush(pending)
+                        except:
+                            logger.error("Failed to update the datasource's last modify time.{0}{1}".format(os.linesep,traceback.format_exc()))
+                        finally:
+                            connection.close()
+                        pending = set()
+                        first_change_time = None
+                        last_change_time = None
 
+                if time.time() >= next_refresh_time:
+                    try:
+                        self._refresh()
+                    except:
+                        logger.error("Failed to refresh the watched datasources.{0}{1}".format(os.linesep,traceback.format_exc()))
+                    finally:
+                        connection.close()
+                    next_refresh_time = time.time() + self._refresh_interval
+        finally:
+            self._inotify.close()
 
+    def start(self):
+        t = threading.Thread(name="watch_ds",target=self.run)
+        t.setDaemon(True)
+        t.start()
+        return t
@@ -1,8 +1,12 @@
 import subprocess
 import logging
+import gzip
+import hashlib
+import tempfile
 import sys,traceback,os
 import shutil
 import re
+import threading
 from io import open
 
 import hglib
@@ -18,9 +22,11 @@ from django.template.loader import render_to_string
 from django.conf import settings
 
 from tablemanager.models import Publish,Workspace
-from harvest.models import Job,JobLog
+from harvest.models import Job,JobLog,InputLog
+from harvest.dumpstore import DumpStore
 from borg_utils.singleton import SingletonMetaclass,Singleton
 from borg_utils.borg_config import BorgConfiguration
+from borg_utils.hg_pool import open_repository
 from borg_utils.utils import file_md5
 from borg_utils.resource_status import ResourceStatus
 from borg_utils.jobintervals import JobInterval
@@ -28,6 +34,9 @@ from harvest.jobstates import JobStateOutcome,JobState,Failed,Completed,Complete
 
 logger = logging.getLogger(__name__)
 
+#jobs can run concurrently in worker threads, serialize the access to the state repository.
+repository_lock = threading.RLock()
+
 class HarvestStateOutcome(JobStateOutcome):
     """
     Declare all possible harvest job state outcome
@@ -52,6 +61,30 @@ class HarvestState(JobState):
             HarvestStateOutcome.cancelled_by_custodian : PostFailed,
         }
 
+    @staticmethod
+    def get_job(job,job_id):
+        """
+        return the job with job_id.
+        use the job in the running job index if it is leased by the current process, otherwise query the database,
+        because the job can be run by other harvest nodes.
+        """
+        running_jobs = getattr(job,"running_jobs",None)
+        j = running_jobs.leased(job_id) if running_jobs else None
+        return j or Job.objects.get(pk=job_id)
+
+    @staticmethod
+    def get_running_jobs_using_input(job,input_table,batch_id):
+        """
+        return the unfinished jobs which belong to the batch and use the input.
+        the jobs are always queried from the database, because they can be run by other harvest nodes;
+        the jobs leased by the current process are replaced by the same objects in the running job index of the current run.
+        """
+        jobs = [j for j in Job.objects.filter(batch_id = batch_id).exclude(state__in = [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name]) if input_table.id in [i.id for i in j.inputs]]
+        running_jobs = getattr(job,"running_jobs",None)
+        if running_jobs:
+            jobs = [running_jobs.leased(j.id) or j for j in jobs]
+        return jobs
+
 class Waiting(HarvestState):
     """
     Job will be on this state after job is created and before cron job can execute it,
@@ -88,7 +121,7 @@ class Waiting(HarvestState):
                     else:
                         #execute failed
                         try:
-                            j = Job.objects.get(pk = o.job_id)
+                            j = self.get_job(job,o.job_id)
                             if j.state in [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name]:
                                 #failed job already finished. current job can execute
                                 pass
@@ -102,11 +135,9 @@ class Waiting(HarvestState):
                 elif o.job_batch_id:
                     #input is already executed by the job belonging to different job batch,
                     dependent_jobs = []
-                    for j in Job.objects.filter(batch_id = o.job_batch_id).exclude(state__in = [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name]):
-                        for i in j.inputs:
-                            if i.id == o.id:
-                                #input is used by other running jobs, the current job will continue to wait
-                                dependent_jobs.append({"id":j.id,"batch_id":j.batch_id, "publish":j.publish.table_name, "state": j.state})
+                    for j in self.get_running_jobs_using_input(job,o,o.job_batch_id):
+                        #input is used by other running jobs, the current job will continue to wait
+                        dependent_jobs.append({"id":j.id,"batch_id":j.batch_id, "publish":j.publish.table_name, "state": j.state})
 
                     if dependent_jobs:
                         #still have some running harvest job dependents on the inputed data. the current job must wait until all dependent job finished.
@@ -130,7 +161,7 @@ class Waiting(HarvestState):
                     else:
                         #executed failed
                         try:
-                            j = Job.objects.get(pk = o.job_id)
+                            j = self.get_job(job,o.job_id)
                             if j.state in [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name]:
                                 #failed job already cancelled. current job can execute
                                 pass
@@ -194,6 +225,8 @@ class ImportAndNormalizeState(HarvestState):
     The state is a abstract super class for all import and normalize states
     """
     _abstract = True
+    #log the execution time of each input to collect the duration statistics per input
+    _log_input_duration = False
 
     def _input_tables(self,job,previous_state):
         """
@@ -237,7 +270,7 @@ class ImportAndNormalizeState(HarvestState):
                     else:
                         #failed by other job, check whether the failed job is still running or finished.
                         try:
-                            j = Job.objects.get(pk=o.job_id)
+                            j = self.get_job(job,o.job_id)
                             if j.state in [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name]:
                                 #failed job has been failed or completed, current job can execute again
                                 pass
@@ -263,6 +296,7 @@ class ImportAndNormalizeState(HarvestState):
                         break
             #execute
             try:
+                start_time = timezone.now()
                 result = self._execute(job,previous_state,o)
                 if result and result[0] != JobStateOutcome.succeed:
                     #failed
@@ -273,6 +307,8 @@ class ImportAndNormalizeState(HarvestState):
                     #update the status in input table to prevent other job execute it again
                     o.job_status = True
                     o.job_message = result[1] if result and result[1] else 'Succeed'
+                    if self._log_input_duration:
+                        InputLog(job_id=job.id,input_id=o.id,state=self.name,start_time=start_time,end_time=timezone.now()).save()
             except KeyboardInterrupt:
                 result = (HarvestStateOutcome.shutdown, self.get_exception_message())
                 #update the status in input table to prevent other job execute it again
@@ -308,6 +344,7 @@ class Importing(ImportAndNormalizeState):
     """
     _name = "Importing"
     _interactive_if_failed = False
+    _log_input_duration = True
 
     @classmethod
     def transition_dict(cls):
@@ -362,6 +399,7 @@ class GeneratingRowID(ImportAndNormalizeState):
     """
     _name = "Generating RowID"
     _interactive_if_failed = True
+    _log_input_duration = True
 
     @classmethod
     def transition_dict(cls):
@@ -453,36 +491,37 @@ class GenerateLayerAccessRule(HarvestState):
             #no need to update geoserver
             return (JobStateOutcome.succeed, None)
 
-        workspaces = Workspace.objects.filter(publish_channel=job.publish.workspace.publish_channel).order_by('name')
-
-        # Generate user data SQL through template
-        latest_data = render_to_string("layers.properties", {"workspaces": workspaces})
-        old_data = None
-        output_filename = os.path.join(BorgConfiguration.BORG_STATE_REPOSITORY,job.publish.workspace.publish_channel.name, "layers.properties")
-        #create dir if required
-        if os.path.exists(output_filename):
-            with open(output_filename,"rb") as output_file:
-                old_data = output_file.read()
-        elif not os.path.exists(os.path.dirname(output_filename)):
-            os.makedirs(os.path.dirname(output_filename))
-
-        if old_data and old_data == latest_data:
-            #layer access rule not changed
-            return (JobStateOutcome.succeed, None)
-
-        # Write output layer access rule, commit + push
-        with open(output_filename, "wb") as output:
-            output.write(latest_data)
-
-        # Try and commit to repository, if no changes then continue
-        hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
-        try:
-            hg.commit(include=[output_filename],addremove=True, user=BorgConfiguration.BORG_STATE_USER, message="{} - layer access rules updated".format(job.publish.job_batch_id))
-        except hglib.error.CommandError as e:
-            if e.out != "nothing changed\n":
-                return (HarvestStateOutcome.failed, self.get_exception_message())
-        finally:
-            hg.close()
+        with repository_lock:
+            workspaces = Workspace.objects.filter(publish_channel=job.publish.workspace.publish_channel).order_by('name')
+
+            # Generate user data SQL through template
+            latest_data = render_to_string("layers.properties", {"workspaces": workspaces})
+            old_data = None
+            output_filename = os.path.join(BorgConfiguration.BORG_STATE_REPOSITORY,job.publish.workspace.publish_channel.name, "layers.properties")
+            #create dir if required
+            if os.path.exists(output_filename):
+                with open(output_filename,"rb") as output_file:
+                    old_data = output_file.read()
+            elif not os.path.exists(os.path.dirname(output_filename)):
+                os.makedirs(os.path.dirname(output_filename))
+
+            if old_data and old_data == latest_data:
+                #layer access rule not changed
+                return (JobStateOutcome.succeed, None)
+
+            # Write output layer access rule, commit + push
+            with open(output_filename, "wb") as output:
+                output.write(latest_data)
+
+            # Try and commit to repository, if no changes then continue
+            hg = open_repository()
+            try:
+                hg.commit(include=[output_filename],addremove=True, user=BorgConfiguration.BORG_STATE_USER, message="{} - layer access rules updated".format(job.publish.job_batch_id))
+            except hglib.error.CommandError as e:
+                if e.out != "nothing changed\n":
+                    return (HarvestStateOutcome.failed, self.get_exception_message())
+            finally:
+                hg.close()
 
         return (JobStateOutcome.succeed, None)
 
@@ -498,7 +537,7 @@ class DumpFullData(HarvestState):
         """
         self.database = settings.DATABASES["default"]
         self.env = os.environ.copy()
-        self.dump_cmd = [BorgConfiguration.DATA_DUMP, "-h", self.database["HOST"], "-d", self.database["NAME"], "-U", self.database["USER"], "-b", "-E", "utf-8", "-F", "c","-Z","1", "-w", "-O"]
+        self.dump_cmd = [BorgConfiguration.DATA_DUMP, "-h", self.database["HOST"], "-d", self.database["NAME"], "-U", self.database["USER"], "-b", "-E", "utf-8", "-F", "c", "-w", "-O"]
         if 'PASSWORD' in self.database and  self.database['PASSWORD'].strip():
             self.env["PGPASSWORD"] = self.database["PASSWORD"]
         self.env["PGSSLMODE"] = "allow"
@@ -521,6 +560,8 @@ class DumpFullData(HarvestState):
         """
         if 'data' in job.metadict:
             del job.metadict['data']
+        if 'delta' in job.metadict:
+            del job.metadict['delta']
 
         #create the dir if required
         if not os.path.exists(job.dump_dir):
@@ -529,28 +570,186 @@ class DumpFullData(HarvestState):
 
         file_name = job.publish.table_name + ".db"
         dump_file = os.path.join(job.dump_dir,file_name)
-        cmd = self.dump_cmd + ["-t", job.publish.workspace.publish_data_schema + "." + job.publish.table_name, "-f", dump_file]
+        compression = job.publish.workspace.publish_channel.dump_compression or "1"
+        cmd = self.dump_cmd + ["-Z", compression, "-t", job.publish.workspace.publish_data_schema + "." + job.publish.table_name]
 
         cursor=connection.cursor()
-        if not previous_state.is_error_state:
-            #table with same name maybe published by previous job. drop it if have.
-            cursor.execute('drop table if exists "{0}"."{1}" cascade'.format(job.publish.workspace.publish_data_schema,job.publish.table_name))
-        #move table to publish schema for dump
-        cursor.execute('alter table "{0}"."{1}" set schema {2}'.format(job.publish.workspace.schema,job.publish.table_name,job.publish.workspace.publish_data_schema))
-        try:
-            #import ipdb;ipdb.set_trace()
-            output = subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=subprocess.PIPE, env=self.env).communicate()
-            logger.debug("execute ({0})\nstdin:{1}\nstdout:{2}".format(cmd,output[0],output[1]))
-        finally:
-            #move table back to original schema
-            cursor.execute('alter table "{0}"."{1}" set schema "{2}"'.format(job.publish.workspace.publish_data_schema,job.publish.table_name,job.publish.workspace.schema))
+        store = DumpStore()
+        diffs = self._latest_diffs(job,cursor)
+        content = self._unchanged_content(job,cursor,diffs) or store.content(cursor,job.publish.workspace.schema,job.publish.table_name)
+        key = store.key(cursor,job.publish.workspace.schema,job.publish.table_name,job.publish.workspace.publish_data_schema,compression,content)
+        md5 = store.reuse(key,dump_file)
+        if md5:
+            logger.info("The data of publish({0}) is unchanged, reuse the stored dump".format(job.publish.name))
+            output = ""
+        elif BorgConfiguration.DATA_DUMP_METHOD == "copy":
+            #dump a copy of the table in the publish data schema, the published table is only read
+            self._copy_table(cursor,job.publish.workspace.schema,job.publish.workspace.publish_data_schema,job.publish.table_name)
+            try:
+                md5,output = self._dump(cmd,dump_file)
+                logger.debug("execute ({0})\nstderr:{1}".format(cmd,output))
+            finally:
+                cursor.execute('drop table if exists "{0}"."{1}" cascade'.format(job.publish.workspace.publish_data_schema,job.publish.table_name))
+            if not output.strip():
+                store.add(key,dump_file,md5)
+        else:
+            if not previous_state.is_error_state:
+                #table with same name maybe published by previous job. drop it if have.
+                cursor.execute('drop table if exists "{0}"."{1}" cascade'.format(job.publish.workspace.publish_data_schema,job.publish.table_name))
+            #move table to publish schema for dump
+            cursor.execute('alter table "{0}"."{1}" set schema {2}'.format(job.publish.workspace.schema,job.publish.table_name,job.publish.workspace.publish_data_schema))
+            try:
+                #import ipdb;ipdb.set_trace()
+                md5,output = self._dump(cmd,dump_file)
+                logger.debug("execute ({0})\nstderr:{1}".format(cmd,output))
+            finally:
+                #move table back to original schema
+                cursor.execute('alter table "{0}"."{1}" set schema "{2}"'.format(job.publish.workspace.publish_data_schema,job.publish.table_name,job.publish.workspace.schema))
+            if not output.strip():
+                store.add(key,dump_file,md5)
 
-        if output[1].strip() :
-            return (HarvestStateOutcome.failed,output[1])
+        if output.strip() :
+            return (HarvestStateOutcome.failed,output)
         else:
-            job.metadict['data'] = {"file":"{}{}".format(BorgConfiguration.MASTER_PATH_PREFIX, dump_file),"md5":file_md5(dump_file)}
+            job.metadict['data'] = {"file":"{}{}".format(BorgConfiguration.MASTER_PATH_PREFIX, dump_file),"md5":md5,"content":content}
+            if diffs:
+                job.metadict['data']['diff_time'] = diffs[0][0].isoformat()
+            delta = self._dump_delta(job,cursor,diffs)
+            if delta:
+                job.metadict['delta'] = delta
             return (HarvestStateOutcome.succeed,None)
 
+    def _copy_table(self,cursor,schema,copy_schema,table_name):
+        """
+        Copy the table into copy_schema in one transaction, with the same indexes and constraints, which are built after the data is copied.
+        Only an AccessShare lock is held on the table, so the table can be read and published by other jobs while it is dumped.
+        """
+        cursor.execute("""SELECT c.relname,pg_get_indexdef(i.indexrelid),d.conname,pg_get_constraintdef(d.oid)
+FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid LEFT JOIN pg_constraint d ON d.conindid = i.indexrelid AND d.conrelid = i.indrelid
+WHERE i.indrelid = '"{0}"."{1}"'::regclass""".format(schema,table_name))
+        indexes = cursor.fetchall()
+        cursor.execute("SELECT conname,pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = '\"{0}\".\"{1}\"'::regclass AND contype = 'c'".format(schema,table_name))
+        checks = cursor.fetchall()
+
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute('drop table if exists "{0}"."{1}" cascade'.format(copy_schema,table_name))
+            cursor.execute('create table "{0}"."{2}" (like "{1}"."{2}")'.format(copy_schema,schema,table_name))
+            cursor.execute('insert into "{0}"."{2}" select * from "{1}"."{2}"'.format(copy_schema,schema,table_name))
+            for index_name,index_def,constraint_name,constraint_def in indexes:
+                if constraint_name:
+                    cursor.execute('alter table "{0}"."{1}" add constraint "{2}" {3}'.format(copy_schema,table_name,constraint_name,constraint_def))
+                else:
+                    cursor.execute('create {3}index "{2}" on "{0}"."{1}"{4}'.format(
+                        copy_schema,table_name,index_name,"unique " if index_def.startswith("CREATE UNIQUE") else "",index_def[index_def.index(" USING "):]))
+            for constraint_name,constraint_def in checks:
+                cursor.execute('alter table "{0}"."{1}" add constraint "{2}" {3}'.format(copy_schema,table_name,constraint_name,constraint_def))
+            cursor.execute("COMMIT")
+        except:
+            cursor.execute("ROLLBACK")
+            raise
+
+    chunk_size = 1024 * 1024
+    def _dump(self,cmd,dump_file):
+        """
+        Run pg_dump and write its output into the dump file; the md5 is computed while the dump is written,
+        so the dump file is not read again.
+        return (md5,error output)
+        """
+        md5 = hashlib.md5()
+        errorFile = tempfile.TemporaryFile()
+        try:
+            pobj = subprocess.Popen(cmd,stdout=subprocess.PIPE,stderr=errorFile, env=self.env)
+            with open(dump_file,"wb") as f:
+                for chunk in iter(lambda: pobj.stdout.read(self.chunk_size),b""):
+                    f.write(chunk)
+                    md5.update(chunk)
+            pobj.wait()
+            errorFile.seek(0)
+            output = errorFile.read()
+            if pobj.returncode != 0 and not output.strip():
+                output = "pg_dump failed with exit code {0}".format(pobj.returncode)
+            return (md5.hexdigest(),output)
+        finally:
+            errorFile.close()
+
+    def _latest_diffs(self,job,cursor):
+        """
+        return the latest two (difftime,full) rows of the publish's diff table
+        """
+        p = job.publish
+        cursor.execute("SELECT to_regclass('\"{0}\".\"{1}\"')".format(p.workspace.schema,p.diff_table_name))
+        if not cursor.fetchone()[0]:
+            return []
+        cursor.execute("SELECT difftime,\"full\" FROM \"{0}\".\"{1}\" ORDER BY difftime DESC LIMIT 2".format(p.workspace.schema,p.diff_table_name))
+        return cursor.fetchall()
+
+    def _previous_job(self,job,diffs):
+        """
+        return the previous successful job if it dumped the data right after the previous publish, otherwise return None
+        """
+        if len(diffs) < 2:
+            return None
+        previous_job = Job.objects.filter(publish=job.publish,state__in=[Completed.instance().name,CompletedWithWarning.instance().name],id__lt=job.id).order_by("-id").first()
+        if not previous_job or previous_job.metadict.get("data",{}).get("diff_time") != diffs[1][0].isoformat():
+            return None
+        return previous_job
+
+    def _unchanged_content(self,job,cursor,diffs):
+        """
+        return the content digest of the data dumped by the previous job
+        if the latest publish is an incremental publish without any inserted or deleted rows, otherwise return None.
+        """
+        if len(diffs) < 2 or diffs[0][1]:
+            return None
+        p = job.publish
+        cursor.execute("SELECT inserts IS NULL AND deletes IS NULL FROM \"{0}\".\"{1}\" ORDER BY difftime DESC LIMIT 1".format(p.workspace.schema,p.diff_table_name))
+        if not cursor.fetchone()[0]:
+            return None
+        previous_job = self._previous_job(job,diffs)
+        return previous_job.metadict.get("data",{}).get("content") if previous_job else None
+
+    def _dump_delta(self,job,cursor,diffs):
+        """
+        Dump the rows changed by the latest incremental publish into a gzipped sql file,
+        which deletes the deleted rowhashes and copies the inserted rows into the table.
+        The delta can only be applied to the data dumped by the previous successful job,
+        so it is dumped only if the previous job dumped the data right after the previous publish.
+        The table in the delta file is not schema qualified; the slave applies it with its own search path.
+        return the delta information or None if no delta is dumped
+        """
+        p = job.publish
+        if len(diffs) < 2 or diffs[0][1]:
+            #the latest publish is a full publish
+            return None
+        previous_job = self._previous_job(job,diffs)
+        if not previous_job:
+            return None
+
+        diff_sql = "SELECT {0} FROM \"{1}\".\"{2}\" ORDER BY difftime DESC LIMIT 1".format("{0}",p.workspace.schema,p.diff_table_name)
+        cursor.execute(diff_sql.format("coalesce(array_length(inserts,1),0),coalesce(array_length(deletes,1),0),array_to_string(deletes,',')"))
+        inserts,deletes,deleted_hashes = cursor.fetchone()
+
+        delta_file = os.path.join(job.dump_dir,p.table_name + ".delta.sql.gz")
+        with gzip.open(delta_file,"wb") as f:
+            f.write("BEGIN;\n")
+            if deletes:
+                f.write("DELETE FROM \"{0}\" WHERE md5_rowhash = ANY('{{{1}}}'::varchar[]);\n".format(p.table_name,deleted_hashes))
+            if inserts:
+                f.write("COPY \"{0}\" FROM stdin;\n".format(p.table_name))
+                cursor.copy_expert("COPY (SELECT * FROM \"{0}\".\"{1}\" WHERE md5_rowhash IN (SELECT unnest(inserts) FROM ({2}) a)) TO STDOUT".format(
+                    p.workspace.schema,p.table_name,diff_sql.format("inserts")),f)
+                f.write("\\.\n")
+            f.write("COMMIT;\n")
+
+        return {
+            "file":"{}{}".format(BorgConfiguration.MASTER_PATH_PREFIX, delta_file),
+            "md5":file_md5(delta_file),
+            "base_job_id":previous_job.id,
+            "inserts":inserts,
+            "deletes":deletes,
+        }
+
 class UpdateCatalogService(HarvestState):
     """
     The state is to update meta data on catalog service.
@@ -605,24 +804,25 @@ class SubmitToVersionControl(HarvestState):
             json.dump(job.metadict, output, indent=4)
 
         # Try and add file to repository, if no changes then continue
-        hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
-        try:
-            hg.add(files=[file_name])
+        with repository_lock:
+            hg = open_repository()
+            try:
+                hg.add(files=[file_name])
 
-            #remove meta json file and empty gwc json file
-            files =[p.output_filename_abs(action) for action in ['meta','empty_gwc'] ]
-            files =[ f for f in files if os.path.exists(f)]
-            if files:
-                hg.remove(files=files)
+                #remove meta json file and empty gwc json file
+                files =[p.output_filename_abs(action) for action in ['meta','empty_gwc'] ]
+                files =[ f for f in files if os.path.exists(f)]
+                if files:
+                    hg.remove(files=files)
 
-            files.append(file_name)
+                files.append(file_name)
 
-            hg.commit(include=files,addremove=True, user=BorgConfiguration.BORG_STATE_USER, message="{} - updated {}.{}".format(p.job_batch_id, p.workspace.name, p.name))
-        except hglib.error.CommandError as e:
-            if e.out != "nothing changed\n":
-                return (HarvestStateOutcome.failed, self.get_exception_message())
-        finally:
-            hg.close()
+                hg.commit(include=files,addremove=True, user=BorgConfiguration.BORG_STATE_USER, message="{} - updated {}.{}".format(p.job_batch_id, p.workspace.name, p.name))
+            except hglib.error.CommandError as e:
+                if e.out != "nothing changed\n":
+                    return (HarvestStateOutcome.failed, self.get_exception_message())
+            finally:
+                hg.close()
 
         return (HarvestStateOutcome.succeed, None)
 
@@ -649,18 +849,27 @@ class PostCompleted(HarvestState):
         3. set publish's "job_end_time"
         4. set job's "finised"
         """
-        if previous_state != Waiting.instance():
+        if previous_state != Waiting.instance() and hasattr(job,"push_result"):
+            #the changes have been pushed together with other jobs' changes by RepositoryPushCoalescer
+            pushed,error = job.push_result
+            delattr(job,"push_result")
+            if error:
+                return (HarvestStateOutcome.failed, error)
+            elif not pushed:
+                logger.warning("push (job_id={0}, job_batch_id={1}, publish={2}) to repository failed.".format(job.id,job.batch_id,job.publish.name))
+        elif previous_state != Waiting.instance():
             #push the changes to repository
             #import ipdb;ipdb.set_trace()
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
-            try:
-                if not hg.push(ssh=BorgConfiguration.BORG_STATE_SSH):
-                    logger.warning("push (job_id={0}, job_batch_id={1}, publish={2}) to repository failed.".format(job.id,job.batch_id,job.publish.name))
+            with repository_lock:
+                hg = open_repository()
+                try:
+                    if not hg.push(ssh=BorgConfiguration.BORG_STATE_SSH):
+                        logger.warning("push (job_id={0}, job_batch_id={1}, publish={2}) to repository failed.".format(job.id,job.batch_id,job.publish.name))
 
-            except hglib.error.CommandError:
-                return (HarvestStateOutcome.failed, self.get_exception_message())
-            finally:
-                hg.close()
+                except hglib.error.CommandError:
+                    return (HarvestStateOutcome.failed, self.get_exception_message())
+                finally:
+                    hg.close()
 
         with transaction.atomic():
             p = job.publish
@@ -685,6 +894,55 @@ class PostCompleted(HarvestState):
         else:
             return (HarvestStateOutcome.succeed,None)
 
+class RepositoryPushCoalescer(object):
+    """
+    Gather the jobs which are going to push their changes to the state repository in 'Post Completed',
+    and push all the gathered changes once instead of once per job.
+    The push result is set to each gathered job, and 'Post Completed' uses it instead of pushing again.
+    """
+    def __init__(self):
+        self._jobs = []
+        self._lock = threading.Lock()
+
+    def should_defer(self,job):
+        """
+        return True if the job is going to push its changes and should wait for the coalesced push
+        """
+        return job.state == PostCompleted.instance().name and job.previous_state != Waiting.instance().name and not hasattr(job,"push_result")
+
+    def defer(self,job):
+        with self._lock:
+            self._jobs.append(job)
+
+    def push(self):
+        """
+        push the changes of all the gathered jobs once.
+        return the gathered jobs with the push result
+        """
+        with self._lock:
+            jobs = self._jobs
+            self._jobs = []
+
+        if not jobs:
+            return jobs
+
+        logger.info("Push the changes of {0} jobs to the repository".format(len(jobs)))
+        with repository_lock:
+            hg = None
+            try:
+                hg = open_repository()
+                push_result = (hg.push(ssh=BorgConfiguration.BORG_STATE_SSH),None)
+            except:
+                push_result = (False,JobState.get_exception_message())
+            finally:
+                if hg:
+                    hg.close()
+
+        for j in jobs:
+            j.push_result = push_result
+
+        return jobs
+
 class PostFailed(HarvestState):
     """
     The state is a intermediate state and exists for post processing.
@@ -5,6 +5,8 @@ import logging
 from tablemanager.models import Publish,Input,Normalise
 from harvest.models import Job
 from harvest.jobstates import Completed,CompletedWithWarning
+from harvest.dumpstore import DumpStore
+from borg_utils.file_digest import clean_file_digests
 
 class HarvestJobCleaner(object):
     """
@@ -58,6 +60,14 @@ class HarvestJobCleaner(object):
             deleted_jobs += 1
             self.logger.debug("Delete outdated job({0})".format(j.pk))
 
+        removed_dumps = DumpStore().clean()
+        if removed_dumps:
+            self.logger.info("{0} stored dumps which are not used by any job have been removed.".format(removed_dumps))
+
+        removed_digests = clean_file_digests()
+        if removed_digests:
+            self.logger.info("{0} cached file digests of the removed files have been removed.".format(removed_digests))
+
         if deleted_jobs == 1:
             self.logger.info("{0} outdated job has been deleted.".format(deleted_jobs))
         elif deleted_jobs > 1:
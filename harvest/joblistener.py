@@ -0,0 +1,71 @@
+import select
+import time
+import logging
+
+import psycopg2
+import psycopg2.extensions
+from django.db import connection
+
+from harvest.jobstates import JobState
+
+logger = logging.getLogger(__name__)
+
+class JobListener(object):
+    """
+    Listen to the job notifications sent by the database when a job is created or a user action is requested.
+    The notifications are sent by the trigger 'harvest_job_notify' on the job table.
+    """
+    channel = "harvest_job"
+
+    def __init__(self):
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None or self._conn.closed:
+            #use a dedicated connection, because the listen session must not be closed or reused by django
+            self._conn = psycopg2.connect(**connection.get_connection_params())
+            self._conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            cursor = self._conn.cursor()
+            try:
+                cursor.execute("LISTEN {0}".format(self.channel))
+            finally:
+                cursor.close()
+        return self._conn
+
+    def wait(self,timeout):
+        """
+        Block until some job notifications are received or timeout.
+        Return the ids of the notified jobs; return an empty list if timeout.
+        If the database can't be listened, sleep until timeout.
+        """
+        end_time = time.time() + timeout
+        try:
+            conn = self._connect()
+            while True:
+                conn.poll()
+                if conn.notifies:
+                    job_ids = [n.payload for n in conn.notifies]
+                    del conn.notifies[:]
+                    return job_ids
+
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return []
+                select.select([conn],[],[],remaining)
+        except (KeyboardInterrupt,SystemExit):
+            raise
+        except:
+            logger.error("Failed to listen to the job notifications.{0}".format(JobState.get_exception_message()))
+            self.close()
+            remaining = end_time - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+            return []
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except:
+                pass
+            self._conn = None
@@ -0,0 +1,137 @@
+import logging
+import os
+
+from harvest.models import StateStatistic
+from harvest.harveststates import Importing
+from harvest.jobstatistics import JobStatistics
+
+logger = logging.getLogger(__name__)
+
+class JobOrdering(object):
+    """
+    The order in which the ready jobs are dispatched by the JobScheduler.
+    A job is dispatched only after its dependencies are released, so the ordering only decides which ready job runs first;
+    the job id is always the last sort key, so jobs with the same key run in creation order.
+    """
+    _orderings = {}
+    name = None
+
+    def prepare(self,jobs):
+        """
+        Called once with all the jobs of the current run, before any job is dispatched.
+        """
+        pass
+
+    def key(self,job):
+        """
+        return the sort key of the job; the job with the smallest key is dispatched first.
+        """
+        return ()
+
+    @staticmethod
+    def orderings():
+        return sorted(JobOrdering._orderings.keys())
+
+    @staticmethod
+    def get_ordering(name):
+        """
+        return a new ordering instance with the name
+        """
+        try:
+            return JobOrdering._orderings[name]()
+        except KeyError:
+            raise Exception("Unknown job ordering '{0}', available orderings are {1}".format(name,JobOrdering.orderings()))
+
+    @staticmethod
+    def register(cls):
+        JobOrdering._orderings[cls.name] = cls
+        return cls
+
+@JobOrdering.register
+class IdOrdering(JobOrdering):
+    """
+    Dispatch the jobs in creation order.
+    """
+    name = "id"
+
+@JobOrdering.register
+class PriorityOrdering(JobOrdering):
+    """
+    Dispatch the jobs in the order of their publish priority, the same order in which they are created.
+    """
+    name = "priority"
+
+    def key(self,job):
+        return (job.publish.priority if job.publish else None,)
+
+@JobOrdering.register
+class CostOrdering(JobOrdering):
+    """
+    Shortest job first.
+    The cost of a job is the sum of the p50 durations of its remaining states, from the state statistics of its publish;
+    if the publish has no statistic yet, the cost is estimated from the importing statistics or the file size of its inputs.
+    A job whose cost is unknown is dispatched first, so its statistics are collected as early as possible.
+    """
+    name = "cost"
+    #bytes per second, used to estimate the importing time of the inputs without statistics
+    import_throughput = 10 * 1024 * 1024
+
+    def prepare(self,jobs):
+        publish_ids = set([j.publish_id for j in jobs])
+        self._publish_statistics = {}
+        self._input_statistics = {}
+        for s in StateStatistic.objects.filter(publish_id__in=publish_ids):
+            self._publish_statistics[(s.publish_id,s.state)] = s.p50
+        for s in StateStatistic.objects.filter(input__isnull=False,state=Importing.instance().name):
+            self._input_statistics[s.input_id] = s.p50
+        self._costs = {}
+
+    def _input_cost(self,input):
+        if input.id in self._input_statistics:
+            return self._input_statistics[input.id]
+        size = 0
+        for ds in input.datasource or []:
+            if os.path.isfile(ds):
+                size += os.path.getsize(ds)
+        return size / float(self.import_throughput)
+
+    def cost(self,job):
+        if job.id not in self._costs:
+            cost = 0
+            states = JobStatistics.remaining_states(job.state)
+            durations = [self._publish_statistics.get((job.publish_id,state.name)) for state in states]
+            if any([d is not None for d in durations]):
+                cost = sum([d for d in durations if d is not None])
+            elif Importing.instance() in states:
+                try:
+                    cost = sum([self._input_cost(i) for i in job.inputs])
+                except:
+                    logger.error("Can't estimate the importing cost of job(id={0}).".format(job.id))
+            self._costs[job.id] = cost
+        return self._costs[job.id]
+
+    def key(self,job):
+        return (self.cost(job),)
+
+@JobOrdering.register
+class FairShareOrdering(JobOrdering):
+    """
+    Dispatch the jobs of the workspaces in turn, so a workspace with lots of jobs can't hold up the others.
+    The nth job of each workspace is dispatched before the (n + 1)th job of any workspace.
+    """
+    name = "fair_share"
+
+    def prepare(self,jobs):
+        self._turns = {}
+        workspace_jobs = {}
+        for j in sorted(jobs,key=lambda j:j.id):
+            try:
+                workspace_id = j.publish.workspace_id if j.publish else None
+            except:
+                workspace_id = None
+            turn = workspace_jobs.get(workspace_id,0)
+            workspace_jobs[workspace_id] = turn + 1
+            self._turns[j.id] = turn
+
+    def key(self,job):
+        return (self._turns.get(job.id,0),)
@@ -0,0 +1,225 @@
+import logging
+import threading
+import heapq
+
+from harvest.models import Process
+from harvest.jobstates import JobState
+from harvest.harveststates import Waiting,Normalizing
+from harvest.jobordering import JobOrdering
+
+logger = logging.getLogger(__name__)
+
+class RunningJobIndex(object):
+    """
+    An in-memory index of the unfinished jobs in the current run, built once per run.
+    It maps job id to job and input id to the jobs using the input.
+    The indexed jobs are the same objects run by the scheduler, but the jobs are claimed with leases, and any job of the run can be run by other harvest nodes;
+    so the state of an indexed job is only up to date while the job is leased by the current process, the other jobs must be checked against the database.
+    """
+    def __init__(self):
+        self._jobs = {}
+        self._input_jobs = {}
+
+    def add(self,job,nodes):
+        self._jobs[job.id] = job
+        for node_type,node_id in nodes:
+            if node_type == "input":
+                self._input_jobs.setdefault(node_id,[]).append(job)
+
+    def leased(self,job_id):
+        """
+        return the job with job_id if it is leased by the current process, otherwise None.
+        """
+        j = self._jobs.get(job_id)
+        return j if j and getattr(j,"lease_owner",None) == Process.current_node else None
+
+    def jobs_using_input(self,input_id):
+        """
+        return the jobs which use the input
+        """
+        return self._input_jobs.get(input_id,[])
+
+class JobScheduler(object):
+    """
+    Dispatch the unfinished jobs based on the dependencies between them.
+
+    The dependency graph is built up front from the publish, inputs and normalises used by each job:
+    a job depends on the previous job (ordered by id) which uses the same publish, input or normalise.
+    A job is dispatched only after all the jobs it depends on have released the shared objects, so the shared
+    input is imported only once, and a job never enters 'Waiting' just to find out that its dependencies are still in use.
+
+    A dependency is released
+    1. when the parent job is finished, or
+    2. when the parent job belongs to the same batch, shares only inputs and normalises with the job,
+       and has passed the 'Normalizing' state; the job will use the imported and normalised data directly.
+
+    The ready jobs are dispatched in the order decided by the job ordering, see JobOrdering.
+
+    The deferred jobs, which are waiting for their next retry time or a user action, are never dispatched in the current run;
+    they are only added to the dependency graph to block the jobs depending on them.
+
+    The scheduler is thread safe, and can be shared by multiple worker threads.
+    """
+    def __init__(self,jobs,ordering=None,deferred_jobs=None):
+        deferred_jobs = deferred_jobs or []
+        self._deferred = set([j.id for j in deferred_jobs])
+        jobs = list(jobs) + list(deferred_jobs)
+        self._jobs = dict([(j.id,j) for j in jobs])
+        #job id -> {parent job id : strict}; a strict dependency is released only when the parent job is finished
+        self._parents = dict([(j.id,{}) for j in jobs])
+        self._children = dict([(j.id,set()) for j in jobs])
+        #heap of (ordering key,job id)
+        self._ready = []
+        self._queued = set()
+        self._dispatched = set()
+        self._running = 0
+        self._shutdown = False
+        self._condition = threading.Condition()
+
+        self._index = RunningJobIndex()
+        last_jobs = {}
+        for j in sorted(jobs,key=lambda j:j.id):
+            nodes = self._dependent_nodes(j)
+            self._index.add(j,nodes)
+            #the job states use the index to check the dependent jobs in memory
+            j.running_jobs = self._index
+            for node in nodes:
+                parent = last_jobs.get(node)
+                last_jobs[node] = j
+                if parent is None:
+                    continue
+                strict = node[0] == "publish" or parent.batch_id != j.batch_id
+                self._parents[j.id][parent.id] = self._parents[j.id].get(parent.id,False) or strict
+                self._children[parent.id].add(j.id)
+
+        self._ordering = ordering if isinstance(ordering,JobOrdering) else JobOrdering.get_ordering(ordering or "id")
+        self._ordering.prepare([j for j in jobs if j.id not in self._deferred])
+
+        for j in jobs:
+            if self._is_ready(j.id):
+                self._push(j.id)
+
+    @staticmethod
+    def _dependent_nodes(job):
+        """
+        return the publish, inputs and normalises used by the job
+        """
+        nodes = [("publish",job.publish_id)]
+        try:
+            nodes += [("input",i.id) for i in job.inputs]
+            nodes += [("normalise",n.id) for n in job.normalises]
+        except:
+            #can't resolve the dependencies, the job only depends on the previous job of the same publish
+            logger.error("Can't resolve the dependencies of job(id={0}).{1}".format(job.id,JobState.get_exception_message()))
+        return nodes
+
+    @staticmethod
+    def _is_released(parent,strict):
+        """
+        return True if the parent job has released the shared objects.
+        """
+        state = JobState.get_jobstate(parent.state)
+        if state.is_end_state:
+            return True
+        elif strict:
+            return False
+
+        if state.is_error_state:
+            state = state._normal_state()
+        return Normalizing.instance().is_upstate(state)
+
+    def _is_ready(self,job_id):
+        if job_id in self._dispatched or job_id in self._deferred:
+            return False
+        for parent_id,strict in self._parents[job_id].iteritems():
+            if not self._is_released(self._jobs[parent_id],strict):
+                return False
+        return True
+
+    def _push(self,job_id):
+        if job_id in self._queued:
+            return
+        self._queued.add(job_id)
+        heapq.heappush(self._ready,(self._ordering.key(self._jobs[job_id]),job_id))
+
+    def _release_children(self,job):
+        for child_id in self._children[job.id]:
+            if self._is_ready(child_id):
+                self._push(child_id)
+
+    def has_dependencies(self,job):
+        """
+        return True if the job depends on other jobs in the current run
+        """
+        return len(self._parents[job.id]) > 0
+
+    def resume_immediately(self,job):
+        """
+        return True if the job was waiting for its dependencies and should be resumed without waiting for the retry interval;
+        the dependencies have already been released when the job is dispatched.
+        """
+        return self.has_dependencies(job) and job.state == Waiting._failed_state.instance().name
+
+    def next_job(self):
+        """
+        return the next job which is ready to run.
+        block until a job is ready, return None if all the runnable jobs have been dispatched or shutdown is requested.
+        """
+        with self._condition:
+            while not self._shutdown and not self._ready and self._running > 0:
+                self._condition.wait()
+
+            if self._shutdown or not self._ready:
+                self._condition.notify_all()
+                return None
+
+            job_id = heapq.heappop(self._ready)[1]
+            self._queued.discard(job_id)
+            self._dispatched.add(job_id)
+            self._running += 1
+            return self._jobs[job_id]
+
+    def job_progressed(self,job):
+        """
+        Called after the job moved to another state; dispatch the jobs whose dependencies are released.
+        """
+        with self._condition:
+            self._release_children(job)
+            self._condition.notify_all()
+
+    def job_stopped(self,job):
+        """
+        Called when the job stops running in the current run.
+        """
+        with self._condition:
+            self._running -= 1
+            self._release_children(job)
+            self._condition.notify_all()
+
+    def resubmit(self,job):
+        """
+        Dispatch the job again in the current run.
+        """
+        with self._condition:
+            self._dispatched.discard(job.id)
+            self._push(job.id)
+            self._condition.notify_all()
+
+    def shutdown(self):
+        """
+        Stop dispatching jobs.
+        """
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+    @property
+    def is_shutdown(self):
+        return self._shutdown
+
+    @property
+    def blocked_jobs(self):
+        """
+        return the jobs which are not dispatched in the current run because of their unreleased dependencies.
+        """
+        return [self._jobs[job_id] for job_id in sorted(self._jobs.keys()) if job_id not in self._dispatched and job_id not in self._deferred]
@@ -2,8 +2,12 @@ import logging
 import json
 from datetime import timedelta,datetime
 import time
+import threading
+import random
+import traceback
 
-from django.db import transaction,models
+from django.db import transaction,models,connection
+from django.db.models import Q
 from django.utils import timezone
 from django.conf import settings
 from django.core.files import File
@@ -11,12 +15,37 @@ from django.core.files import File
 from tablemanager.models import Publish, Workspace
 from harvest.models import Job,JobLog
 from harvest.jobstates import JobStateOutcome,Failed,Completed,JobState,CompletedWithWarning
-from harvest.harveststates import HarvestStateOutcome,Waiting
+from harvest.harveststates import HarvestStateOutcome,Waiting,RepositoryPushCoalescer
+from harvest.jobscheduler import JobScheduler
 from borg_utils.jobintervals import JobInterval
 from borg_utils.borg_config import BorgConfiguration
 
 logger = logging.getLogger(__name__)
 
+class JobLeaseKeeper(threading.Thread):
+    """
+    Renew the leases of the jobs claimed by the current process periodically, until stopped.
+    """
+    def __init__(self):
+        super(JobLeaseKeeper,self).__init__(name="harvest-lease-keeper")
+        self.daemon = True
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = max(BorgConfiguration.JOB_LEASE_TIME / 3,1)
+        try:
+            while not self._stop_event.wait(interval):
+                try:
+                    Job.renew_leases()
+                except:
+                    logger.error("Failed to renew the job leases.{0}".format(JobState.get_exception_message()))
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
 class JobStatemachine(object):
     @staticmethod
     def create_job_by_name(publish_name,job_interval=JobInterval.Manually,job_batch_id=None):
@@ -187,34 +216,189 @@ class JobStatemachine(object):
             raise Exception("Job is on the state {0} instead of required state {1}".format(job.state, required_state_name))
 
     @staticmethod
-    def run_all_jobs(first_run=True):
+    def run_all_jobs(first_run=True,workers=None,ordering=None):
         """
-        run all jobs sequentially
+        run all jobs.
+        The jobs are dispatched by a JobScheduler based on the dependencies between them, and the ready jobs are dispatched in the order of 'ordering';
+        if workers is 1, run the jobs sequentially in the current thread, otherwise run them by a bounded pool of worker threads.
         """
-        succeed_jobs = 0
-        failed_jobs = 0
-        ignored_jobs = 0
-        error_jobs = 0
-        is_shutdown = False
-        for j in Job.objects.exclude(state__in = [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name]).order_by('id'):
+        workers = workers or BorgConfiguration.HARVEST_WORKERS
+        ordering = ordering or BorgConfiguration.JOB_ORDERING
+        statistics = [0,0,0,0]
+        statistics_lock = threading.Lock()
+        unfinished_jobs = Job.objects.exclude(state__in = [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name])
+        due_filter = JobStatemachine._due_filter(first_run)
+        jobs = list(unfinished_jobs.filter(due_filter).order_by('id'))
+        #the jobs which are not due still hold the objects they use, load them only to block their dependent jobs.
+        deferred_jobs = list(unfinished_jobs.exclude(due_filter).defer("message","metadata").order_by('id'))
+        scheduler = JobScheduler(jobs,ordering,deferred_jobs)
+        #push the changes of all the jobs in the current run once, instead of once per job.
+        push_coalescer = RepositoryPushCoalescer()
+
+        def _run_jobs():
+            while True:
+                j = scheduler.next_job()
+                if j is None:
+                    break
+                try:
+                    try:
+                        if not j.acquire_lease():
+                            #the job is claimed by other harvest node.
+                            logger.debug("job(id={0}) is running on other harvest node.".format(j.id))
+                            continue
+                    except:
+                        logger.error("Failed to claim the job(id={0}). {1}".format(j.id,traceback.format_exc()))
+                        continue
+                    try:
+                        #the job may be changed by other harvest node before claimed.
+                        try:
+                            j.refresh_from_db()
+                        except:
+                            #the job may be deleted
+                            logger.error("Failed to reload the job(id={0}). {1}".format(j.id,traceback.format_exc()))
+                            continue
+                        if hasattr(j,"_metadict"):
+                            delattr(j,"_metadict")
+                        is_shutdown,outcome = JobStatemachine._run_job_in_batch(j,first_run or scheduler.resume_immediately(j),scheduler,push_coalescer)
+                    finally:
+                        try:
+                            j.release_lease()
+                        except:
+                            #the lease expires by itself
+                            logger.error("Failed to release the lease of the job(id={0}). {1}".format(j.id,traceback.format_exc()))
+                finally:
+                    scheduler.job_stopped(j)
+                if outcome is not None:
+                    with statistics_lock:
+                        statistics[outcome] += 1
+                if is_shutdown:
+                    scheduler.shutdown()
+
+        def _worker():
             try:
-                is_shutdown = not JobStatemachine.run(j,first_run)
-                if j.state in ["Completed","CompletedWithWarning"]:
-                    if j.launched is None:
-                        ignored_jobs += 1
-                    else:
-                        succeed_jobs += 1
-                elif j.state == "Failed":
-                    failed_jobs += 1
-                else:
-                    error_jobs += 1
-            except:
-                logger.error("job(id={0},name={1}) runs into a exception{2}".format(j.id,j.publish.name,JobState.get_exception_message()))
-                error_jobs += 1
-            if is_shutdown:
-                break
+                _run_jobs()
+            finally:
+                #each worker thread has its own db connection, close it before the thread exits.
+                connection.close()
+
+        workers = min(workers,len(jobs))
+        lease_keeper = JobLeaseKeeper()
+        lease_keeper.start()
+        try:
+            while True:
+                JobStatemachine._run_workers(_run_jobs,_worker,workers,scheduler)
+                if scheduler.is_shutdown:
+                    #the gathered jobs stay in 'Post Completed' and will push their changes in the next run.
+                    break
+                #push the changes of the gathered jobs once, and let them finish 'Post Completed' with the push result;
+                #their dependent jobs can run then.
+                pushed_jobs = push_coalescer.push()
+                if not pushed_jobs:
+                    break
+                for j in pushed_jobs:
+                    scheduler.resubmit(j)
+        finally:
+            lease_keeper.stop()
+
+        blocked_jobs = scheduler.blocked_jobs
+        if blocked_jobs:
+            logger.info("{0} jobs are waiting for their dependent jobs: {1}".format(len(blocked_jobs),[j.id for j in blocked_jobs]))
+        if deferred_jobs:
+            logger.debug("{0} jobs are waiting for their next retry time or user action: {1}".format(len(deferred_jobs),[j.id for j in deferred_jobs]))
+
+        return [scheduler.is_shutdown,tuple(statistics)]
 
-        return [is_shutdown,(succeed_jobs,failed_jobs,ignored_jobs,error_jobs)]
+    @staticmethod
+    def _due_filter(first_run):
+        """
+        return the filter of the jobs which should run now:
+        the jobs with a pending user action, and the jobs not waiting for user action whose retry time has passed.
+        'Waiting Failed' jobs are always due, they are resumed as soon as their dependencies are released.
+        """
+        interactive_states = [s.name for s in JobState.all_jobstates() if s.is_interactive_state]
+        if first_run:
+            due_filter = Q()
+        else:
+            due_filter = Q(next_retry_at__isnull=True) | Q(next_retry_at__lte=timezone.now()) | Q(state=Waiting._failed_state.instance().name)
+        return (due_filter & ~Q(state__in=interactive_states)) | Q(user_action__isnull=False)
+
+    @staticmethod
+    def _next_retry_time(job,state):
+        """
+        return the time after which the job at the state can be retried, or None if the job is not waiting for retry.
+        The retry interval is doubled with each retry, up to MAX_RETRY_INTERVAL, and randomized between half and the full interval
+        to spread the retries of the jobs failed at the same time; 'Waiting Failed' jobs are always retried after RETRY_INTERVAL.
+        """
+        if not state.is_error_state or state.is_interactive_state:
+            return None
+        elif state == Waiting._failed_state.instance():
+            interval = BorgConfiguration.RETRY_INTERVAL
+        else:
+            interval = min(BorgConfiguration.RETRY_INTERVAL * (2 ** min(max(job.retry_times - 1,0),16)),BorgConfiguration.MAX_RETRY_INTERVAL)
+            interval = interval / 2.0 + random.uniform(0,interval / 2.0)
+        return timezone.now() + timedelta(seconds=interval)
+
+    @staticmethod
+    def _run_workers(run_jobs,worker,workers,scheduler):
+        """
+        run the dispatched jobs in the current thread if workers is 1, otherwise run them by a pool of worker threads.
+        """
+        if workers <= 1:
+            run_jobs()
+            return
+
+        logger.info("Run jobs with {0} workers".format(workers))
+        threads = [threading.Thread(target=worker,name="harvest-worker-{0}".format(i)) for i in range(workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        try:
+            #join with a timeout, otherwise KeyboardInterrupt can't be delivered to the main thread.
+            while any([t.is_alive() for t in threads]):
+                for t in threads:
+                    t.join(1)
+        except (KeyboardInterrupt,SystemExit):
+            #stop dispatching new jobs and wait for the running jobs to finish their current state.
+            scheduler.shutdown()
+            for t in threads:
+                t.join()
+            raise
+
+    @staticmethod
+    def _run_job_in_batch(j,first_run,scheduler,push_coalescer=None):
+        """
+        run a job as part of run_all_jobs.
+        The job is run state by state, and the scheduler is notified after each transition to dispatch the released jobs as soon as possible.
+        If the job is going to push its changes to the state repository, it stops and waits for the coalesced push.
+        return (is_shutdown,outcome), outcome is the index of succeed, failed, ignored and error jobs in the statistics, or None if the job is waiting for the coalesced push.
+        """
+        try:
+            is_shutdown = False
+            while True:
+                if push_coalescer and push_coalescer.should_defer(j):
+                    push_coalescer.defer(j)
+                    return (is_shutdown,None)
+                state = j.state
+                is_shutdown = not JobStatemachine.run(j,first_run,True)
+                scheduler.job_progressed(j)
+                if is_shutdown or j.state == state:
+                    break
+                current_state = JobState.get_jobstate(j.state)
+                if current_state.is_end_state or current_state.is_error_state or current_state.is_interactive_state:
+                    break
+
+            if j.state in ["Completed","CompletedWithWarning"]:
+                if j.launched is None:
+                    return (is_shutdown,2)
+                else:
+                    return (is_shutdown,0)
+            elif j.state == "Failed":
+                return (is_shutdown,1)
+            else:
+                return (is_shutdown,3)
+        except:
+            logger.error("job(id={0},name={1}) runs into a exception{2}".format(j.id,j.publish.name,JobState.get_exception_message()))
+            return (False,3)
 
     @staticmethod
     def run_job(job_id,step=False):
@@ -262,7 +446,15 @@ class JobStatemachine(object):
             elif current_state.is_error_state:
                 #wait the configured interval before continue
                 try:
-                    if not first_run and job.last_execution_end_time and timezone.now() < job.last_execution_end_time + timedelta(seconds=BorgConfiguration.RETRY_INTERVAL):
+                    if first_run:
+                        next_retry_time = None
+                    elif job.next_retry_at:
+                        next_retry_time = job.next_retry_at
+                    elif job.last_execution_end_time:
+                        next_retry_time = job.last_execution_end_time + timedelta(seconds=BorgConfiguration.RETRY_INTERVAL)
+                    else:
+                        next_retry_time = None
+                    if next_retry_time and timezone.now() < next_retry_time:
                         #early than the next execution time. can not run this time
                         return True
                     else:
@@ -362,20 +554,21 @@ class JobStatemachine(object):
                 pass
 
             job.last_execution_end_time = timezone.now()
+            job.next_retry_at = JobStatemachine._next_retry_time(job,JobState.get_jobstate(job.state))
             job.message = state_result[1]
             json_data = json.dumps(job.metadict)
             if job.metadata:
                 json_data = json.dumps(job.metadict)
                 if job.metadata == json_data:
-                    job.save(update_fields=['previous_state','state','message','retry_times','last_execution_end_time','user_action'])
+                    job.save(update_fields=['previous_state','state','message','retry_times','last_execution_end_time','next_retry_at','user_action'])
                 else:
                     job.metadata = json_data
-                    job.save(update_fields=['previous_state','state','message','retry_times','last_execution_end_time','user_action','metadata'])
+                    job.save(update_fields=['previous_state','state','message','retry_times','last_execution_end_time','next_retry_at','user_action','metadata'])
             elif job.metadict:
                 job.metadata = json.dumps(job.metadict)
-                job.save(update_fields=['previous_state','state','message','retry_times','last_execution_end_time','user_action','metadata'])
+                job.save(update_fields=['previous_state','state','message','retry_times','last_execution_end_time','next_retry_at','user_action','metadata'])
             else:
-                job.save(update_fields=['previous_state','state','message','retry_times','last_execution_end_time','user_action'])
+                job.save(update_fields=['previous_state','state','message','retry_times','last_execution_end_time','next_retry_at','user_action'])
 
             if log:
                 log.save()
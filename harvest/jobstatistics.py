@@ -0,0 +1,145 @@
+import logging
+from datetime import timedelta
+
+from django.db import connection,transaction
+from django.utils import timezone
+
+from harvest.models import Job,JobLog,InputLog,StateStatistic
+from harvest.jobstates import JobState,JobStateOutcome,Failed,Completed,CompletedWithWarning
+from harvest.harveststates import HarvestStateOutcome
+from borg_utils.borg_config import BorgConfiguration
+
+logger = logging.getLogger(__name__)
+
+class JobStatistics(object):
+    """
+    Maintain the rolling duration statistics of the harvest states, and estimate the completion time of the running batches.
+    The statistics are calculated from the latest STATE_STATISTIC_SAMPLES successful executions,
+    per publish from the job logs, and per input from the input logs.
+    """
+    _publish_statistic_sql = """
+INSERT INTO {statistic} (publish_id,input_id,state,samples,p50,p95,max,refreshed)
+SELECT publish_id,NULL,state,count(*),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY duration),
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY duration),
+    max(duration),now()
+FROM (
+    SELECT b.publish_id,a.state,extract(epoch FROM a.end_time - a.start_time) AS duration,
+        row_number() OVER (PARTITION BY b.publish_id,a.state ORDER BY a.end_time DESC) AS seq
+    FROM {joblog} a JOIN {job} b ON a.job_id = b.id
+    WHERE b.publish_id IS NOT NULL AND a.start_time IS NOT NULL AND a.end_time IS NOT NULL AND a.outcome IN %s
+) c
+WHERE seq <= %s
+GROUP BY publish_id,state
+"""
+
+    _input_statistic_sql = """
+INSERT INTO {statistic} (publish_id,input_id,state,samples,p50,p95,max,refreshed)
+SELECT NULL,input_id,state,count(*),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY duration),
+    percentile_cont(0.95) WITHIN GROUP (ORDER BY duration),
+    max(duration),now()
+FROM (
+    SELECT a.input_id,a.state,extract(epoch FROM a.end_time - a.start_time) AS duration,
+        row_number() OVER (PARTITION BY a.input_id,a.state ORDER BY a.end_time DESC) AS seq
+    FROM {inputlog} a
+) b
+WHERE seq <= %s
+GROUP BY input_id,state
+"""
+
+    @staticmethod
+    def refresh():
+        """
+        Recalculate all the statistics.
+        return the number of statistics
+        """
+        tables = {
+            "statistic":StateStatistic._meta.db_table,
+            "joblog":JobLog._meta.db_table,
+            "job":Job._meta.db_table,
+            "inputlog":InputLog._meta.db_table,
+        }
+        outcomes = (JobStateOutcome.succeed,JobStateOutcome.warning,HarvestStateOutcome.up_to_date)
+        with transaction.atomic():
+            cursor = connection.cursor()
+            try:
+                cursor.execute("DELETE FROM {statistic}".format(**tables))
+                cursor.execute(JobStatistics._publish_statistic_sql.format(**tables),[outcomes,BorgConfiguration.STATE_STATISTIC_SAMPLES])
+                cursor.execute(JobStatistics._input_statistic_sql.format(**tables),[BorgConfiguration.STATE_STATISTIC_SAMPLES])
+            finally:
+                cursor.close()
+
+        return StateStatistic.objects.count()
+
+    @staticmethod
+    def remaining_states(job_state):
+        """
+        return the normal states which a job at job_state still needs to go through, including job_state itself.
+        """
+        state = JobState.get_jobstate(job_state)
+        if state.is_error_state:
+            state = state._normal_state()
+        states = []
+        while state and not state.is_end_state and state not in states:
+            states.append(state)
+            try:
+                state = state.next_state(JobStateOutcome.succeed)
+            except ValueError:
+                break
+        return states
+
+    @staticmethod
+    def estimate_batch(batch_id,workers=None):
+        """
+        Estimate the completion time of the unfinished jobs in a batch.
+        The remaining duration of a job is the sum of the p50 durations of its remaining states,
+        the p50 of all publishes is used if the publish has no statistic for a state.
+        The batch completes after the longest job, or after all the remaining work is shared by the workers.
+        """
+        workers = workers or BorgConfiguration.HARVEST_WORKERS
+        jobs = list(Job.objects.filter(batch_id=batch_id).exclude(state__in = [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name]).order_by('id'))
+
+        statistics = {}
+        for s in StateStatistic.objects.filter(publish_id__in=[j.publish_id for j in jobs]):
+            statistics[(s.publish_id,s.state)] = s.p50
+
+        default_statistics = {}
+        for state,p50 in StateStatistic.objects.filter(publish__isnull=False).values_list("state","p50"):
+            default_statistics.setdefault(state,[]).append(p50)
+        for state,durations in default_statistics.items():
+            durations.sort()
+            default_statistics[state] = durations[len(durations) / 2]
+
+        now = timezone.now()
+        job_estimates = []
+        for j in jobs:
+            remaining_seconds = 0
+            for state in JobStatistics.remaining_states(j.state):
+                remaining_seconds += statistics.get((j.publish_id,state.name),default_statistics.get(state.name,0))
+            job_estimates.append({
+                "id":j.id,
+                "publish":j.publish.name if j.publish else None,
+                "state":j.state,
+                "remaining_seconds":remaining_seconds,
+            })
+
+        total_seconds = sum([e["remaining_seconds"] for e in job_estimates])
+        longest_seconds = max([e["remaining_seconds"] for e in job_estimates]) if job_estimates else 0
+        remaining_seconds = max(longest_seconds,total_seconds / float(workers))
+
+        return {
+            "batch_id":batch_id,
+            "workers":workers,
+            "unfinished_jobs":len(jobs),
+            "remaining_seconds":remaining_seconds,
+            "estimated_completion_time":timezone.localtime(now + timedelta(seconds=remaining_seconds)).strftime("%Y-%m-%d %H:%M:%S"),
+            "jobs":job_estimates,
+        }
+
+    @staticmethod
+    def running_batches():
+        """
+        return the batch ids of the unfinished jobs
+        """
+        return list(Job.objects.exclude(state__in = [Failed.instance().name,Completed.instance().name,CompletedWithWarning.instance().name]).order_by("batch_id").values_list("batch_id",flat=True).distinct())
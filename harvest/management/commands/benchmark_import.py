@@ -0,0 +1,83 @@
+import time
+import logging
+
+from django.core.management.base import BaseCommand,CommandError
+from django.db import connection
+from optparse import make_option
+
+from tablemanager.models import Input,ImportEngine
+from borg_utils.borg_config import BorgConfiguration
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Benchmark the import engines against the inputs; the data is imported into a scratch schema, the input tables are untouched'
+    args = '<input name> [<input name> ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--engines',
+            action='store',
+            dest='engines',
+            default=",".join([o[0] for o in ImportEngine.options]),
+            help='The comma separated import engines to benchmark; default is all the engines'
+        ),
+        make_option(
+            '--repeat',
+            action='store',
+            dest='repeat',
+            default=3,
+            help='The number of times each input is imported by each engine; default is 3'
+        ),
+        make_option(
+            '--rowid',
+            action='store_true',
+            dest='rowid',
+            default=None,
+            help='Also generate the rowid, and compare populating the rowid after the import (update) with populating it during the import (load)'
+        ),
+        make_option(
+            '--schema',
+            action='store',
+            dest='schema',
+            default="benchmark_" + BorgConfiguration.INPUT_SCHEMA,
+            help='The scratch schema to import the data into'
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError("Missing input names")
+
+        engines = [e.strip() for e in options["engines"].split(",") if e.strip()]
+        for engine in engines:
+            if engine not in [o[0] for o in ImportEngine.options]:
+                raise CommandError("Unknown import engine '{0}'".format(engine))
+        repeat = int(options["repeat"])
+        schema = options["schema"]
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute("CREATE SCHEMA IF NOT EXISTS \"{0}\"".format(schema))
+            for name in args:
+                input = Input.objects.get(name=name)
+                input.generate_rowid = bool(options["rowid"])
+                for engine in engines:
+                    input.import_engine = engine
+                    for rowid_method in (["update","load"] if options["rowid"] else [None]):
+                        durations = []
+                        for i in range(repeat):
+                            begin_time = time.time()
+                            input.invoke(cursor,schema,validation=False,with_rowid=rowid_method == "load")
+                            if rowid_method == "update":
+                                input._populate_rowid(cursor,schema)
+                            durations.append(time.time() - begin_time)
+                        cursor.execute("SELECT count(1),pg_total_relation_size('\"{0}\".\"{1}\"') FROM \"{0}\".\"{1}\"".format(schema,input.name))
+                        rows,size = cursor.fetchone()
+                        self.stdout.write("{0}\t{1}{2}\trows={3}\tsize={4}\tmin={5:.2f}s\tavg={6:.2f}s\tmax={7:.2f}s".format(
+                            input.name,engine,"/rowid by {0}".format(rowid_method) if rowid_method else "",rows,size,min(durations),sum(durations) / len(durations),max(durations)))
+                input.drop(cursor,schema)
+        finally:
+            cursor.close()
+
+        return 0
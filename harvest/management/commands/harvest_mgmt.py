@@ -12,9 +12,12 @@ from django.core.exceptions import ObjectDoesNotExist
 
 from borg_utils.jobintervals import JobInterval
 from harvest.jobstatemachine import JobStatemachine
-from harvest.models import Process
+from harvest.models import Process,Job
 from harvest.jobcleaner import HarvestJobCleaner
-from harvest.harvest_ds import HarvestDatasource
+from harvest.harvest_ds import HarvestDatasource,DatasourceWatcher
+from harvest.joblistener import JobListener
+from harvest.jobstatistics import JobStatistics
+from harvest.jobordering import JobOrdering
 
 logger = logging.getLogger(__name__)
 
@@ -58,9 +61,10 @@ class RepeatedJob(object):
     def execute(self,time):
         raise NotImplementedError("Not Implemented")
 
-    def run(self,now):
+    def run(self,now,force=False):
         """
         Try to run the job.
+        If force is True, run the job immediately even if it is before the next scheduled time.
         Return the next scheduled time
         """
         if self._process is None:
@@ -87,7 +91,7 @@ class RepeatedJob(object):
             except:
                 raise 
 
-        if now < p.next_scheduled_time:
+        if not force and now < p.next_scheduled_time:
             #before next scheduled time
             #logger.info("No need to run job ({})".format(self.name))
             return p.next_scheduled_time
@@ -166,7 +170,8 @@ class HarvestJob(RepeatedJob):
 
     @property
     def name(self):
-        return "harvest"
+        #jobs are claimed with leases, so each harvest node can run its own harvest process.
+        return "harvest@{}".format(Process.current_server)
 
     @property
     def desc(self):
@@ -178,7 +183,7 @@ class HarvestJob(RepeatedJob):
 
     def execute(self,time):
         try:
-            return JobStatemachine.run_all_jobs(self._first_run)
+            return JobStatemachine.run_all_jobs(self._first_run,self._options["workers"] if self._options else None,self._options["job_ordering"] if self._options else None)
         finally:
             self._first_run = False
 
@@ -214,9 +219,26 @@ class CleanJob(RepeatedJob):
     def execute(self,time):
         return HarvestJobCleaner(self._options["expire_days"],self._options["min_jobs"]).clean()
 
+class StatisticsJob(RepeatedJob):
+    @property
+    def name(self):
+        return "refresh_statistics"
+
+    @property
+    def desc(self):
+        return "Refresh the duration statistics of harvest states"
+
+    @property
+    def last_message(self):
+        return "{} state statistics have been refreshed."
+
+    def execute(self,time):
+        return JobStatistics.refresh()
+
 @atexit.register
 def shutdown():
         Process.objects.filter(server=Process.current_server,pid=Process.current_pid).update(status="shutdown")
+        Job.release_leases()
         logger.info("Harvest management process exit.server={}, pid={}".format(Process.current_server,Process.current_pid))
 
 class Command(BaseCommand):
@@ -246,6 +268,14 @@ class Command(BaseCommand):
             help='Enable checking datasource feature'
         ),
 
+        make_option(
+            '--watch-ds',
+            action='store_true',
+            dest='watch_ds',
+            default=None,
+            help='Watch the datasource files with inotify, and update the inputs within seconds after their datasources are changed'
+        ),
+
         make_option(
             '--clean-job-now',
             action='store_true',
@@ -273,6 +303,25 @@ class Command(BaseCommand):
             dest='min_jobs',
             help='The specified number of successful jobs should be kept in the system for each publish; default is 1'
         ),
+        make_option(
+            '--refresh-statistics',
+            action='store_true',
+            dest='refresh_statistics',
+            default=None,
+            help='Enable refreshing the duration statistics of harvest states hourly'
+        ),
+        make_option(
+            '--workers',
+            action='store',
+            dest='workers',
+            help='The number of harvest jobs which can run concurrently; default is HARVEST_WORKERS in settings'
+        ),
+        make_option(
+            '--job-ordering',
+            action='store',
+            dest='job_ordering',
+            help='The order in which the ready harvest jobs are run: {0}; default is JOB_ORDERING in settings'.format(", ".join(JobOrdering.orderings()))
+        ),
     )
 
     def handle(self, *args, **options):
@@ -287,12 +336,26 @@ class Command(BaseCommand):
 
         #add run jobs;
         if options["run_job"]:
-            jobs.append(HarvestJob(JobInterval.Minutely))
+            if options['workers']:
+                try:
+                    options['workers'] = int(options['workers'])
+                    if options['workers'] <= 0:
+                        options['workers'] = None
+                except:
+                    options['workers'] = None
+            if options['job_ordering']:
+                #fail fast on an unknown ordering
+                JobOrdering.get_ordering(options['job_ordering'])
+            jobs.append(HarvestJob(JobInterval.Minutely,options))
 
         #check datasource
         if options["check_ds"]:
             jobs.append(CheckDsJob(JobInterval.Daily))
 
+        #refresh state statistics
+        if options["refresh_statistics"]:
+            jobs.append(StatisticsJob(JobInterval.Hourly))
+
         #clean outdated jobs
         if options["clean_job"] or options["clean_job_now"]:
             if options['expire_days']:
@@ -321,27 +384,46 @@ class Command(BaseCommand):
             if options["clean_job"]:
                 jobs.append(CleanJob(JobInterval.Daily,options))
 
+        #watch datasource
+        if options["watch_ds"]:
+            if jobs:
+                DatasourceWatcher().start()
+            else:
+                #no repeated jobs to run, watch the datasources in the current thread
+                DatasourceWatcher().run()
+                return
+
         if not jobs:
             #no repeated jobs to run
             return
 
+        #wake up the harvest job immediately when a job is created or a user action is requested; the scheduled run is a fallback.
+        listener = JobListener() if options["run_job"] else None
+
         #begin to run jobs
         next_run_time = None
         min_next_run_time = None
         now = None
+        notified_jobs = None
         while(True):
             min_next_run_time = None
             now = timezone.now()
             RepeatedJob.job_batch_id = JobInterval.Daily.job_batch_id(now)
             for job in jobs:
-                next_run_time = job.run(now)
+                next_run_time = job.run(now,force=bool(notified_jobs) and isinstance(job,HarvestJob))
                 if min_next_run_time:
                     min_next_run_time = next_run_time if next_run_time < min_next_run_time else min_next_run_time
                 else:
                     min_next_run_time = next_run_time
 
+            notified_jobs = None
             sleep_times = (min_next_run_time - timezone.now()).total_seconds()
             if sleep_times > 0:
                 logger.info("sleep until {}".format(timezone.localtime(min_next_run_time)))
-                time.sleep(sleep_times)
+                if listener:
+                    notified_jobs = listener.wait(sleep_times)
+                    if notified_jobs:
+                        logger.info("Wake up to run the notified jobs {}".format(notified_jobs))
+                else:
+                    time.sleep(sleep_times)
 
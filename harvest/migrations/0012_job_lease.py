@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harvest', '0011_auto_20160621_1402'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='lease_expiry',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='lease_owner',
+            field=models.CharField(editable=False, max_length=128, null=True),
+        ),
+        migrations.AlterField(
+            model_name='process',
+            name='name',
+            field=models.CharField(editable=False, max_length=128),
+        ),
+    ]
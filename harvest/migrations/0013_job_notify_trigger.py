@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+#notify the harvest process when a job is created or a user action is requested
+CREATE_JOB_NOTIFY_TRIGGER = """
+CREATE OR REPLACE FUNCTION harvest_job_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR (NEW.user_action IS NOT NULL AND NEW.user_action IS DISTINCT FROM OLD.user_action) THEN
+        PERFORM pg_notify('harvest_job', NEW.id::text);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS harvest_job_notify ON harvest_job;
+CREATE TRIGGER harvest_job_notify AFTER INSERT OR UPDATE OF user_action ON harvest_job FOR EACH ROW EXECUTE PROCEDURE harvest_job_notify();
+"""
+
+DROP_JOB_NOTIFY_TRIGGER = """
+DROP TRIGGER IF EXISTS harvest_job_notify ON harvest_job;
+DROP FUNCTION IF EXISTS harvest_job_notify();
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harvest', '0012_job_lease'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_JOB_NOTIFY_TRIGGER,DROP_JOB_NOTIFY_TRIGGER),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 10:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0038_foreigntable_table_md5_support'),
+        ('harvest', '0013_job_notify_trigger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InputLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(editable=False, max_length=64)),
+                ('start_time', models.DateTimeField(editable=False)),
+                ('end_time', models.DateTimeField(editable=False)),
+                ('input', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='tablemanager.Input')),
+                ('job', models.ForeignKey(editable=False, on_delete=django.db.models.deletion.CASCADE, to='harvest.Job')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StateStatistic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(editable=False, max_length=64)),
+                ('samples', models.PositiveIntegerField(editable=False)),
+                ('p50', models.FloatField(editable=False)),
+                ('p95', models.FloatField(editable=False)),
+                ('max', models.FloatField(editable=False)),
+                ('refreshed', models.DateTimeField(editable=False)),
+                ('input', models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='tablemanager.Input')),
+                ('publish', models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='tablemanager.Publish')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='statestatistic',
+            unique_together=set([('publish', 'input', 'state')]),
+        ),
+    ]
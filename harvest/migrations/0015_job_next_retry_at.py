@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 15:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harvest', '0014_inputlog_statestatistic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='next_retry_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -3,22 +3,24 @@ import socket
 import json
 from datetime import timedelta
 
-from django.db import models
+from django.db import models,connection
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
 from borg_utils.borg_config import BorgConfiguration
 
-from tablemanager.models import Publish
+from tablemanager.models import Publish,Input
 from harvest.jobstates import JobState
 from borg_utils.jobintervals import JobInterval
 
 class Process(models.Model):
     current_server=socket.getfqdn()
     current_pid=os.getpid()
+    #identify the current process among all harvest nodes
+    current_node="{0}:{1}".format(current_server,current_pid)
 
-    name = models.CharField(max_length=32,null=False,editable=False)
+    name = models.CharField(max_length=128,null=False,editable=False)
     desc = models.CharField(max_length=256,null=False,editable=False)
     server = models.CharField(max_length=64,null=False,editable=False)
     pid = models.IntegerField(null=False,editable=False)
@@ -79,6 +81,7 @@ class Job(models.Model):
     user_action = models.CharField(max_length=32,null=True,editable=False)
     retry_times = models.PositiveIntegerField(null=False,editable=False,default=0)
     last_execution_end_time = models.DateTimeField(default=timezone.now, editable=False,null=True)
+    next_retry_at = models.DateTimeField(null=True,editable=False,db_index=True)
     previous_state = models.CharField(max_length=64, null=True, editable=False)
     message = models.TextField(max_length=512, null = True, editable=False)
     created = models.DateTimeField(default=timezone.now, editable=False)
@@ -86,6 +89,8 @@ class Job(models.Model):
     finished = models.DateTimeField(null=True, blank=True, editable=False)
     job_type = models.CharField(max_length=32,default='Monthly',editable=False,null=False)
     metadata = models.TextField(null = True, editable=False)
+    lease_owner = models.CharField(max_length=128,null=True,editable=False)
+    lease_expiry = models.DateTimeField(null=True,editable=False,db_index=True)
 
     @property
     def normaltables(self):
@@ -136,6 +141,56 @@ class Job(models.Model):
         else:
             return None
 
+    def acquire_lease(self):
+        """
+        Try to claim the job for the current process.
+        The job can be claimed if it is not leased, leased by the current process, or its lease is expired.
+        Return True if claimed; otherwise return False
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+UPDATE {0} SET lease_owner = %s, lease_expiry = now() + %s * interval '1 second'
+WHERE id = (SELECT id FROM {0} WHERE id = %s AND (lease_owner IS NULL OR lease_owner = %s OR lease_expiry < now()) FOR UPDATE SKIP LOCKED)
+RETURNING lease_expiry
+""".format(Job._meta.db_table),[Process.current_node,BorgConfiguration.JOB_LEASE_TIME,self.pk,Process.current_node])
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+
+        if row:
+            self.lease_owner = Process.current_node
+            self.lease_expiry = row[0]
+            return True
+        else:
+            return False
+
+    def release_lease(self):
+        """
+        Release the lease held by the current process.
+        """
+        Job.objects.filter(pk=self.pk,lease_owner=Process.current_node).update(lease_owner=None,lease_expiry=None)
+        self.lease_owner = None
+        self.lease_expiry = None
+
+    @staticmethod
+    def renew_leases():
+        """
+        Extend the leases held by the current process.
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute("UPDATE {0} SET lease_expiry = now() + %s * interval '1 second' WHERE lease_owner = %s".format(Job._meta.db_table),[BorgConfiguration.JOB_LEASE_TIME,Process.current_node])
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def release_leases():
+        """
+        Release all the leases held by the current process.
+        """
+        Job.objects.filter(lease_owner=Process.current_node).update(lease_owner=None,lease_expiry=None)
+
     def __str__(self):
         return str(self.pk)
 
@@ -174,3 +229,37 @@ class JobLog(models.Model):
 
     def __str__(self):
         return "Log {0}".format(self.pk)
+
+
+class InputLog(models.Model):
+    """
+    The execution log of an input in a import state, used to collect the duration statistics per input.
+    """
+    job = models.ForeignKey(Job,null=False,editable=False)
+    input = models.ForeignKey(Input,null=False,editable=False)
+    state = models.CharField(max_length=64, editable=False)
+    start_time = models.DateTimeField(editable=False)
+    end_time = models.DateTimeField(editable=False)
+
+    def __str__(self):
+        return "Input Log {0}".format(self.pk)
+
+
+class StateStatistic(models.Model):
+    """
+    The rolling duration statistics(in seconds) of a harvest state, per publish or per input.
+    """
+    publish = models.ForeignKey(Publish,null=True,editable=False)
+    input = models.ForeignKey(Input,null=True,editable=False)
+    state = models.CharField(max_length=64, editable=False)
+    samples = models.PositiveIntegerField(editable=False)
+    p50 = models.FloatField(editable=False)
+    p95 = models.FloatField(editable=False)
+    max = models.FloatField(editable=False)
+    refreshed = models.DateTimeField(editable=False)
+
+    def __str__(self):
+        return "{0}:{1}".format(self.publish or self.input,self.state)
+
+    class Meta:
+        unique_together = [['publish','input','state']]
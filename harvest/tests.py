@@ -1,3 +1,265 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import pytz
+from datetime import datetime
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from harvest.models import Process
+from harvest.jobscheduler import JobScheduler,RunningJobIndex
+from harvest.jobordering import JobOrdering,CostOrdering,FairShareOrdering
+from harvest.jobstatemachine import JobStatemachine
+from harvest.harvest_ds import HarvestDatasource
+from harvest.jobstates import Completed
+from harvest.harveststates import Waiting,Importing,Normalizing,Publishing,DumpFullData
+from borg_utils.borg_config import BorgConfiguration
 
 # Create your tests here.
+
+class _Object(object):
+    def __init__(self,id,**kwargs):
+        self.id = id
+        for k,v in kwargs.items():
+            setattr(self,k,v)
+
+class _Job(object):
+    """
+    A job which provides the attributes used by the scheduler and the orderings, without database.
+    """
+    def __init__(self,id,publish_id,batch_id=1,state=Waiting,inputs=None,normalises=None,workspace_id=None):
+        self.id = id
+        self.publish_id = publish_id
+        self.publish = _Object(publish_id,workspace_id=workspace_id,priority=publish_id)
+        self.batch_id = batch_id
+        self.state = state.instance().name
+        self.inputs = inputs or []
+        self.normalises = normalises or []
+        self.retry_times = 0
+
+class JobSchedulerTest(SimpleTestCase):
+    def _run(self,scheduler,job,state):
+        """
+        dispatch the job and stop it at the state
+        """
+        self.assertIs(scheduler.next_job(),job)
+        job.state = state.instance().name
+        scheduler.job_stopped(job)
+
+    def test_independent_jobs(self):
+        jobs = [_Job(1,1,inputs=[_Object(1)]),_Job(2,2,inputs=[_Object(2)])]
+        scheduler = JobScheduler(jobs)
+        self.assertIs(scheduler.next_job(),jobs[0])
+        self.assertIs(scheduler.next_job(),jobs[1])
+
+    def test_same_publish_is_strict(self):
+        jobs = [_Job(1,1),_Job(2,1)]
+        scheduler = JobScheduler(jobs)
+        self.assertTrue(scheduler.has_dependencies(jobs[1]))
+        #the dependency on the same publish is released only when the parent job is finished
+        self._run(scheduler,jobs[0],Publishing)
+        self.assertIsNone(scheduler.next_job())
+        self.assertEqual(scheduler.blocked_jobs,[jobs[1]])
+
+        scheduler = JobScheduler(jobs)
+        self._run(scheduler,jobs[0],Completed)
+        self.assertIs(scheduler.next_job(),jobs[1])
+
+    def test_shared_input_in_same_batch(self):
+        input = _Object(1)
+        jobs = [_Job(1,1,inputs=[input]),_Job(2,2,inputs=[input])]
+        #the input is still being imported
+        scheduler = JobScheduler(jobs)
+        self._run(scheduler,jobs[0],Importing)
+        self.assertIsNone(scheduler.next_job())
+
+        #the parent job has passed 'Normalizing', the imported input can be used
+        scheduler = JobScheduler(jobs)
+        self._run(scheduler,jobs[0],Publishing)
+        self.assertIs(scheduler.next_job(),jobs[1])
+
+    def test_shared_input_in_failed_state(self):
+        input = _Object(1)
+        jobs = [_Job(1,1,inputs=[input]),_Job(2,2,inputs=[input])]
+        scheduler = JobScheduler(jobs)
+        self._run(scheduler,jobs[0],Publishing._failed_state)
+        self.assertIs(scheduler.next_job(),jobs[1])
+
+    def test_shared_input_in_different_batch_is_strict(self):
+        input = _Object(1)
+        jobs = [_Job(1,1,batch_id=1,inputs=[input]),_Job(2,2,batch_id=2,inputs=[input])]
+        scheduler = JobScheduler(jobs)
+        self._run(scheduler,jobs[0],Publishing)
+        self.assertIsNone(scheduler.next_job())
+
+    def test_dependency_chain(self):
+        jobs = [_Job(1,1),_Job(2,1),_Job(3,1)]
+        scheduler = JobScheduler(jobs)
+        self._run(scheduler,jobs[0],Completed)
+        self._run(scheduler,jobs[1],Completed)
+        self.assertIs(scheduler.next_job(),jobs[2])
+
+    def test_deferred_job_blocks_dependent_jobs(self):
+        deferred_job = _Job(1,1,state=Importing._failed_state)
+        jobs = [_Job(2,1),_Job(3,2)]
+        scheduler = JobScheduler(jobs,deferred_jobs=[deferred_job])
+        self.assertIs(scheduler.next_job(),jobs[1])
+        scheduler.job_stopped(jobs[1])
+        self.assertIsNone(scheduler.next_job())
+        self.assertEqual(scheduler.blocked_jobs,[jobs[0]])
+
+    def test_shutdown(self):
+        jobs = [_Job(1,1),_Job(2,2)]
+        scheduler = JobScheduler(jobs)
+        scheduler.shutdown()
+        self.assertIsNone(scheduler.next_job())
+        self.assertTrue(scheduler.is_shutdown)
+
+class RunningJobIndexTest(SimpleTestCase):
+    def test_leased(self):
+        input = _Object(1)
+        jobs = [_Job(1,1,inputs=[input]),_Job(2,2,inputs=[input]),_Job(3,3,inputs=[input])]
+        jobs[0].lease_owner = Process.current_node
+        jobs[1].lease_owner = "{0}:0".format(Process.current_server)
+        JobScheduler(jobs)
+        index = jobs[0].running_jobs
+        self.assertIsInstance(index,RunningJobIndex)
+        self.assertEqual(index.jobs_using_input(input.id),jobs)
+        self.assertIs(index.leased(1),jobs[0])
+        #the job leased by other harvest node, or not leased, must be checked against the database
+        self.assertIsNone(index.leased(2))
+        self.assertIsNone(index.leased(3))
+        self.assertIsNone(index.leased(4))
+
+class JobOrderingTest(SimpleTestCase):
+    def _order(self,ordering,jobs):
+        return [j.id for j in sorted(jobs,key=lambda j:(ordering.key(j),j.id))]
+
+    def test_get_ordering(self):
+        self.assertIsInstance(JobOrdering.get_ordering("cost"),CostOrdering)
+        self.assertIsInstance(JobOrdering.get_ordering("fair_share"),FairShareOrdering)
+        self.assertRaises(Exception,JobOrdering.get_ordering,"unknown")
+
+    def test_fair_share(self):
+        jobs = [_Job(1,1,workspace_id=1),_Job(2,2,workspace_id=1),_Job(3,3,workspace_id=1),_Job(4,4,workspace_id=2),_Job(5,5,workspace_id=2),_Job(6,6,workspace_id=3)]
+        ordering = FairShareOrdering()
+        ordering.prepare(jobs)
+        self.assertEqual(self._order(ordering,jobs),[1,4,6,2,5,3])
+
+    def test_fair_share_in_scheduler(self):
+        jobs = [_Job(1,1,workspace_id=1),_Job(2,2,workspace_id=1),_Job(3,3,workspace_id=2)]
+        scheduler = JobScheduler(jobs,"fair_share")
+        self.assertEqual([scheduler.next_job().id for i in range(3)],[1,3,2])
+
+    def _cost_ordering(self,publish_statistics,input_statistics=None):
+        #the statistics are loaded from the database by prepare
+        ordering = CostOrdering()
+        ordering._publish_statistics = publish_statistics
+        ordering._input_statistics = input_statistics or {}
+        ordering._costs = {}
+        return ordering
+
+    def test_cost_from_publish_statistics(self):
+        jobs = [_Job(1,1,state=Importing),_Job(2,2,state=Importing)]
+        ordering = self._cost_ordering({
+            (1,Importing.instance().name):100,(1,Publishing.instance().name):50,
+            (2,Importing.instance().name):10,(2,Publishing.instance().name):5,
+        })
+        self.assertEqual(ordering.cost(jobs[0]),150)
+        self.assertEqual(ordering.cost(jobs[1]),15)
+        self.assertEqual(self._order(ordering,jobs),[2,1])
+
+    def test_cost_of_remaining_states(self):
+        statistics = {(1,Importing.instance().name):100,(1,DumpFullData.instance().name):20}
+        #the job has already passed 'Importing'
+        jobs = [_Job(1,1,state=Importing),_Job(2,1,state=Publishing),_Job(3,1,state=DumpFullData._failed_state)]
+        ordering = self._cost_ordering(statistics)
+        self.assertEqual(ordering.cost(jobs[0]),120)
+        self.assertEqual(ordering.cost(jobs[1]),20)
+        self.assertEqual(ordering.cost(jobs[2]),20)
+
+    def test_cost_from_input_statistics(self):
+        jobs = [_Job(1,1,state=Importing,inputs=[_Object(1,datasource=None),_Object(2,datasource=None)]),_Job(2,2,state=Importing,inputs=[_Object(3,datasource=None)])]
+        ordering = self._cost_ordering({},{1:30,2:40,3:50})
+        self.assertEqual(ordering.cost(jobs[0]),70)
+        self.assertEqual(ordering.cost(jobs[1]),50)
+        self.assertEqual(self._order(ordering,jobs),[2,1])
+
+    def test_unknown_cost_first(self):
+        jobs = [_Job(1,1,state=Importing),_Job(2,2,state=Importing)]
+        ordering = self._cost_ordering({(1,Importing.instance().name):10})
+        self.assertEqual(self._order(ordering,jobs),[2,1])
+
+class RetryTimeTest(SimpleTestCase):
+    def _retry_interval(self,retry_times,state):
+        job = _Job(1,1)
+        job.retry_times = retry_times
+        begin_time = timezone.now()
+        retry_time = JobStatemachine._next_retry_time(job,state.instance())
+        end_time = timezone.now()
+        if retry_time is None:
+            return None
+        return ((retry_time - end_time).total_seconds(),(retry_time - begin_time).total_seconds())
+
+    def test_not_waiting_for_retry(self):
+        self.assertIsNone(self._retry_interval(1,Publishing))
+        #the custodian needs to interfere
+        self.assertIsNone(self._retry_interval(1,Normalizing._failed_state))
+
+    def test_waiting_failed(self):
+        for retry_times in (1,5,100):
+            min_interval,max_interval = self._retry_interval(retry_times,Waiting._failed_state)
+            self.assertLessEqual(min_interval,BorgConfiguration.RETRY_INTERVAL)
+            self.assertGreaterEqual(max_interval,BorgConfiguration.RETRY_INTERVAL)
+
+    def test_backoff_bounds(self):
+        for retry_times in range(0,40):
+            interval = min(BorgConfiguration.RETRY_INTERVAL * (2 ** max(retry_times - 1,0)),BorgConfiguration.MAX_RETRY_INTERVAL)
+            for i in range(20):
+                min_interval,max_interval = self._retry_interval(retry_times,DumpFullData._failed_state)
+                #randomized between half and the full interval
+                self.assertGreaterEqual(max_interval,interval / 2.0)
+                self.assertLessEqual(min_interval,interval)
+                self.assertLessEqual(min_interval,BorgConfiguration.MAX_RETRY_INTERVAL)
+
+    def test_backoff_grows(self):
+        intervals = [self._retry_interval(retry_times,Importing._failed_state) for retry_times in (1,2,3)]
+        #the minimum of the next interval is the maximum of the previous interval
+        for previous,following in zip(intervals,intervals[1:]):
+            self.assertLessEqual(previous[0],following[1])
+
+class DatasourceModifyTimeTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_file(self):
+        ds = os.path.join(self.tmp_dir,"test.shp")
+        with open(ds,"wb") as f:
+            f.write("test")
+        os.utime(ds,(1000000,1000000))
+        self.assertEqual(HarvestDatasource.ds_modify_time(_Object(1,datasource=[ds])),datetime(1970,1,12,13,46,40,tzinfo=pytz.UTC))
+        self.assertIsNone(HarvestDatasource.ds_modify_time(_Object(1,datasource=[ds,os.path.join(self.tmp_dir,"missing.shp")])))
+
+    def test_write_inside_directory(self):
+        ds = os.path.join(self.tmp_dir,"test.gdb")
+        os.mkdir(ds)
+        table = os.path.join(ds,"a00000001.gdbtable")
+        with open(table,"wb") as f:
+            f.write("test")
+        os.utime(table,(1000000,1000000))
+        os.utime(ds,(1000000,1000000))
+        input = _Object(1,datasource=[ds])
+        modify_time = HarvestDatasource.ds_modify_time(input)
+
+        #rewrite the file in place, the modify time of the directory is not changed
+        with open(table,"r+b") as f:
+            f.write("TEST")
+        os.utime(table,(2000000,2000000))
+        self.assertEqual(os.path.getmtime(ds),1000000)
+        new_modify_time = HarvestDatasource.ds_modify_time(input)
+        self.assertGreater(new_modify_time,modify_time)
+        self.assertEqual(new_modify_time,datetime(1970,1,24,3,33,20,tzinfo=pytz.UTC))
@@ -2,7 +2,6 @@ import os
 import json
 import logging
 import itertools
-import hglib
 import re
 import requests
 from datetime import datetime
@@ -21,6 +20,7 @@ from django.conf import settings
 from tablemanager.models import Workspace,Publish
 from wmsmanager.models import WmsLayer
 from borg_utils.borg_config import BorgConfiguration
+from borg_utils.hg_pool import open_repository
 from borg_utils.resource_status import ResourceStatus,ResourceStatusMixin,ResourceAction
 from borg_utils.transaction import TransactionMixin
 from borg_utils.signals import refresh_select_choices
@@ -317,7 +317,7 @@ class LayerGroup(models.Model,ResourceStatusMixin,TransactionMixin):
             with open(json_file, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #remove other related json files
             json_files = [ self.json_filename_abs(action) for action in [ 'empty_gwc' ] ]
@@ -375,7 +375,7 @@ class LayerGroup(models.Model,ResourceStatusMixin,TransactionMixin):
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #remove other related json files
             json_files = [ self.json_filename_abs(action) for action in [ 'empty_gwc' ] ]
@@ -421,7 +421,7 @@ class LayerGroup(models.Model,ResourceStatusMixin,TransactionMixin):
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_filename],addremove=True, user="borgcollector", message="Empty GWC of layer group {}.{}".format(self.workspace.name, self.name))
             increase_committed_changes()
                 
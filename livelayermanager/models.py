@@ -4,7 +4,6 @@ import json
 import logging
 import shutil
 import os
-import hglib
 from datetime import datetime
 import requests
 
@@ -20,6 +19,7 @@ from django.core.exceptions import ValidationError
 
 from tablemanager.models import Workspace
 from borg_utils.borg_config import BorgConfiguration
+from borg_utils.hg_pool import open_repository
 from borg_utils.resource_status import ResourceStatus,ResourceStatusMixin,ResourceAction
 from borg_utils.transaction import TransactionMixin
 from borg_utils.db_util import DbUtil
@@ -229,7 +229,7 @@ class Datasource(BorgModel,ResourceStatusMixin,TransactionMixin):
             with open(json_file, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_file],addremove=True, user="borgcollector", message="Unpublish live store {}.{}".format(self.workspace.name, self.name))
             increase_committed_changes()
                 
@@ -283,7 +283,7 @@ class Datasource(BorgModel,ResourceStatusMixin,TransactionMixin):
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_filename],addremove=True, user="borgcollector", message="Update live store {}.{}".format(self.workspace.name, self.name))
             increase_committed_changes()
                 
@@ -565,7 +565,7 @@ class Layer(BorgModel,ResourceStatusMixin,TransactionMixin,SpatialTableMixin):
             with open(json_file, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #remove other related json files
             json_files = [ self.json_filename_abs(action) for action in [ 'empty_gwc' ] ]
@@ -615,7 +615,7 @@ class Layer(BorgModel,ResourceStatusMixin,TransactionMixin,SpatialTableMixin):
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #remove other related json files
             json_files = [ self.json_filename_abs(action) for action in [ 'empty_gwc' ] ]
@@ -659,7 +659,7 @@ class Layer(BorgModel,ResourceStatusMixin,TransactionMixin,SpatialTableMixin):
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_filename],addremove=True, user="borgcollector", message="Empty GWC of live layer {}.{}".format(self.datasource.workspace.name, self.kmi_name))
             increase_committed_changes()
                 
@@ -954,7 +954,7 @@ class SqlViewLayer(BorgModel,ResourceStatusMixin,TransactionMixin,SpatialTableMi
             with open(json_file, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #remove other related json files
             json_files = [ self.json_filename_abs(action) for action in [ 'empty_gwc' ] ]
@@ -1005,7 +1005,7 @@ class SqlViewLayer(BorgModel,ResourceStatusMixin,TransactionMixin,SpatialTableMi
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #remove other related json files
             json_files = [ self.json_filename_abs(action) for action in [ 'empty_gwc' ] ]
@@ -1049,7 +1049,7 @@ class SqlViewLayer(BorgModel,ResourceStatusMixin,TransactionMixin,SpatialTableMi
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_filename],addremove=True, user="borgcollector", message="Empty GWC of live layer {}.{}".format(self.datasource.workspace.name, self.kmi_name))
             increase_committed_changes()
                 
@@ -1,6 +1,5 @@
 import logging
 import json
-import hglib
 import os
 import traceback
 import pytz
@@ -14,6 +13,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.template.loader import render_to_string
 
 from borg_utils.borg_config import BorgConfiguration
+from borg_utils.hg_pool import open_repository
 from rolemanager.models import Role,User,UserRoleStatus,UserRoleSyncStatus,SyncLog
 from tablemanager.models import PublishChannel
 
@@ -105,7 +105,7 @@ class UserRoleSyncUtil(object):
         sync_log.commit_status = UserRoleSyncStatus.FAILED
         sync_log.push_status = UserRoleSyncStatus.NOT_EXECUTED
 
-        hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+        hg = open_repository()
         try:
             changed = force
             if not changed:
@@ -476,11 +476,11 @@ class InputAdmin(VersionAdmin,JobFields):
         if (obj and hasattr(obj,"data_source")) or "data_source" in request.POST:
             if (obj.data_source.type if obj else DataSource.objects.get(pk=int(request.POST.get("data_source"))).type) == DatasourceType.DATABASE:
                 if hasattr(obj,"foreign_table") if obj else "foreign_table" in request.POST:
-                    base_fields = ["name","data_source","foreign_table","generate_rowid","source"]
+                    base_fields = ["name","data_source","foreign_table","generate_rowid","import_engine","import_mode","import_workers","spatial_partition","change_detection","source"]
                 else:
                     base_fields = ["name","data_source","foreign_table"]
             else:
-                base_fields = ["name","data_source","generate_rowid","source"]
+                base_fields = ["name","data_source","generate_rowid","import_engine","import_mode","import_workers","spatial_partition","change_detection","source"]
         else:
             base_fields = ["name","data_source"]
 
@@ -632,9 +632,9 @@ class PublishAdmin(VersionAdmin,JobFields):
 
     def get_fields(self, request, obj=None):
         if obj and obj.is_normal:
-            base_fields = ['name','workspace','interval','status','input_table','dependents','priority','sql','create_extra_index_sql']
+            base_fields = ['name','workspace','interval','status','input_table','dependents','priority','publish_mode','sql','create_extra_index_sql']
         else:
-            base_fields = ['name','workspace','interval','status','input_table','dependents','priority','sql','create_extra_index_sql',"create_cache_layer","server_cache_expire","client_cache_expire"]
+            base_fields = ['name','workspace','interval','status','input_table','dependents','priority','publish_mode','sql','create_extra_index_sql',"create_cache_layer","server_cache_expire","client_cache_expire"]
         return base_fields + list(self.get_readonly_fields(request, obj))
 
     def _workspace(self,o):
@@ -0,0 +1,190 @@
+import re
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _fetchall(cursor,sql):
+    sql_result = cursor.execute(sql)
+    return sql_result.fetchall() if sql_result else cursor.fetchall()
+
+class ChangeDetector(object):
+    """
+    The strategy to detect whether the data of a foreign table is changed since the last import.
+
+    signature returns a dict describing the current state of the remote table; the signature is saved into the input's
+    importing info after each import, and the table is changed if the current signature is different from the saved one.
+    The signature is computed through the foreign data wrapper, so a cheap strategy should let the remote server
+    do the work with aggregates which can be pushed down, instead of pulling all the rows over the wire.
+    """
+    _detectors = {}
+    name = None
+    title = None
+    #True if the detector needs the change_detection_column of the foreign table
+    column_required = False
+
+    def signature(self,foreign_table,cursor,schema,previous=None):
+        """
+        return the signature of the foreign table.
+        previous is the saved signature, which can be used to cache the expensive part of the signature.
+        """
+        raise NotImplementedError("The method 'signature' is not implemented.")
+
+    def is_changed(self,previous,current):
+        """
+        return True if the table is changed.
+        """
+        return previous != current
+
+    @staticmethod
+    def options():
+        return tuple([(name,ChangeDetector._detectors[name].title) for name in sorted(ChangeDetector._detectors.keys())])
+
+    @staticmethod
+    def get_detector(name):
+        """
+        return a new detector instance with the name
+        """
+        try:
+            return ChangeDetector._detectors[name]()
+        except KeyError:
+            raise Exception("Unknown change detection strategy '{0}', available strategies are {1}".format(name,sorted(ChangeDetector._detectors.keys())))
+
+    @staticmethod
+    def register(cls):
+        ChangeDetector._detectors[cls.name] = cls
+        return cls
+
+@ChangeDetector.register
+class Md5Detector(ChangeDetector):
+    """
+    The row count and the md5 of the whole table; every check scans the whole remote table.
+    """
+    name = "md5"
+    title = "Whole table md5"
+
+    def signature(self,foreign_table,cursor,schema,previous=None):
+        return {
+            "row_count":_fetchall(cursor,foreign_table.ROW_COUNT_SQL.format(schema,foreign_table.name))[0][0],
+            "table_md5":_fetchall(cursor,foreign_table.TABLE_MD5_SQL.format(schema,foreign_table.name))[0][0],
+        }
+
+@ChangeDetector.register
+class ChunkedMd5Detector(ChangeDetector):
+    """
+    Split the table into chunks by the key range of the change detection column, which should be an indexed integer key.
+    Each check gets the row count and the key range of every chunk, which the remote server can answer from the key index,
+    and verifies the md5 of some chunks in turn; the md5 of the other chunks is reused from the previous signature.
+    The chunks are verified in turn so that all the chunks are verified within the foreign table's change_detection_checks checks,
+    whatever the size of the table.
+    Inserts and deletes are detected immediately; an update which doesn't change any key is detected within a full round of the chunks.
+    """
+    name = "chunked_md5"
+    title = "Chunked md5 by key range"
+    column_required = True
+    chunk_size = 100000
+
+    @staticmethod
+    def chunks_per_check(chunks,checks):
+        """
+        return the number of chunks to verify in each check, so all the chunks are verified within 'checks' checks
+        """
+        return int(math.ceil(float(chunks) / max(checks or 1,1)))
+
+    CHUNKS_SQL = "SELECT floor(\"{2}\" / {3}) AS chunk,count(*),min(\"{2}\"),max(\"{2}\") FROM \"{0}\".\"{1}\" GROUP BY 1 ORDER BY 1"
+    CHUNK_MD5_SQL = "SELECT md5(string_agg(md5(CAST(t.* as text)),',' ORDER BY t.\"{2}\")) FROM (SELECT * FROM \"{0}\".\"{1}\" WHERE \"{2}\" >= {3} AND \"{2}\" < {4}) as t"
+
+    def signature(self,foreign_table,cursor,schema,previous=None):
+        column = foreign_table.change_detection_column
+        chunks = {}
+        for chunk,count,min_key,max_key in _fetchall(cursor,self.CHUNKS_SQL.format(schema,foreign_table.name,column,self.chunk_size)):
+            chunks[str(int(chunk))] = [count,str(min_key),str(max_key),None]
+
+        previous_chunks = (previous or {}).get("chunks") or {}
+        next_chunk = (previous or {}).get("next_chunk") or 0
+        names = sorted(chunks.keys(),key=lambda c:int(c))
+        if names:
+            #the chunks to verify in this check
+            chunks_per_check = self.chunks_per_check(len(names),foreign_table.change_detection_checks)
+            verify_chunks = set([names[(next_chunk + i) % len(names)] for i in range(min(chunks_per_check,len(names)))])
+            next_chunk = (next_chunk + len(verify_chunks)) % len(names)
+        else:
+            verify_chunks = set()
+            next_chunk = 0
+
+        if previous and (set(previous_chunks.keys()) != set(names) or any([previous_chunks[name][:3] != chunks[name][:3] for name in names])):
+            #rows are inserted or deleted, no need to verify the md5
+            return {
+                "chunks":chunks,
+                "next_chunk":next_chunk,
+            }
+
+        for name in names:
+            chunk = chunks[name]
+            previous_chunk = previous_chunks.get(name)
+            if name not in verify_chunks and previous_chunk:
+                #the chunk has the same row count and key range, reuse the md5
+                chunk[3] = previous_chunk[3]
+            else:
+                begin_key = int(name) * self.chunk_size
+                chunk[3] = _fetchall(cursor,self.CHUNK_MD5_SQL.format(schema,foreign_table.name,column,begin_key,begin_key + self.chunk_size))[0][0]
+
+        return {
+            "chunks":chunks,
+            "next_chunk":next_chunk,
+        }
+
+    def is_changed(self,previous,current):
+        return (previous or {}).get("chunks") != current.get("chunks")
+
+@ChangeDetector.register
+class StatDetector(ChangeDetector):
+    """
+    The modification counters of the remote table in the remote server's pg_stat_user_tables;
+    only supported by a postgres_fdw foreign table whose sql has the 'schema' and 'table' options.
+    The counters are read through a foreign table of pg_stat_user_tables, created on demand for the foreign server.
+    The counters are reset if the remote statistics are reset, which causes one unnecessary import.
+    """
+    name = "stat"
+    title = "Remote table statistics"
+
+    _option_re = re.compile(r"(?P<key>schema_name|schema|table_name|table)\s+'(?P<value>[^']+)'",re.IGNORECASE)
+
+    STAT_TABLE_SQL = "CREATE FOREIGN TABLE IF NOT EXISTS \"{0}\".\"{1}\" (schemaname name,relname name,n_tup_ins bigint,n_tup_upd bigint,n_tup_del bigint) SERVER {2} OPTIONS (schema_name 'pg_catalog', table_name 'pg_stat_user_tables')"
+    STAT_SQL = "SELECT n_tup_ins,n_tup_upd,n_tup_del FROM \"{0}\".\"{1}\" WHERE schemaname = '{2}' AND relname = '{3}'"
+
+    def _remote_table(self,foreign_table):
+        options = dict([(m.group("key").lower().replace("_name",""),m.group("value")) for m in self._option_re.finditer(foreign_table.sql)])
+        return (options.get("schema") or "public",options.get("table") or foreign_table.name)
+
+    def signature(self,foreign_table,cursor,schema,previous=None):
+        remote_schema,remote_table = self._remote_table(foreign_table)
+        stat_table = "{0}_pg_stat_user_tables".format(foreign_table.server.name)
+        cursor.execute(self.STAT_TABLE_SQL.format(schema,stat_table,foreign_table.server.name))
+        rows = _fetchall(cursor,self.STAT_SQL.format(schema,stat_table,remote_schema,remote_table))
+        if not rows:
+            raise Exception("The statistics of the remote table '{0}.{1}' is not found.".format(remote_schema,remote_table))
+        return {
+            "inserts":rows[0][0],
+            "updates":rows[0][1],
+            "deletes":rows[0][2],
+        }
+
+@ChangeDetector.register
+class ColumnDetector(ChangeDetector):
+    """
+    The row count and the max value of the change detection column, such as a last updated timestamp maintained by the remote application;
+    the remote server can answer both from the index of the column.
+    """
+    name = "column"
+    title = "Max value of a column and row count"
+    column_required = True
+
+    COLUMN_SQL = "SELECT count(*),max(\"{2}\") FROM \"{0}\".\"{1}\""
+
+    def signature(self,foreign_table,cursor,schema,previous=None):
+        row = _fetchall(cursor,self.COLUMN_SQL.format(schema,foreign_table.name,foreign_table.change_detection_column))[0]
+        return {
+            "row_count":row[0],
+            "max":str(row[1]) if row[1] is not None else None,
+        }
@@ -318,5 +318,5 @@ class PublishForm(GeoserverSettingForm,BorgModelForm):
 
     class Meta:
         model = Publish
-        fields = ('name','workspace','interval','status','input_table','dependents','priority','sql','create_extra_index_sql')
+        fields = ('name','workspace','interval','status','input_table','dependents','priority','publish_mode','sql','create_extra_index_sql')
 
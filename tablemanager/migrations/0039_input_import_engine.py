@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 16:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0038_foreigntable_table_md5_support'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='input',
+            name='import_engine',
+            field=models.CharField(choices=[('ogr2ogr', 'ogr2ogr'), ('gdal', 'GDAL python bindings')], default='ogr2ogr', help_text='The engine used to import the data source; the GDAL engine opens the data source once and streams the features by COPY', max_length=16),
+        ),
+    ]
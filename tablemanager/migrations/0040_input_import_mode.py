@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 16:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0039_input_import_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='input',
+            name='import_mode',
+            field=models.CharField(choices=[('overwrite', 'Overwrite'), ('incremental', 'Incremental')], default='overwrite', help_text='Overwrite: reload the whole table; Incremental: load into a staging table and apply only the inserted and deleted rows to the input table', max_length=16),
+        ),
+    ]
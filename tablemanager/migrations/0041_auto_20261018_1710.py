@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 17:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0040_input_import_mode'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='input',
+            name='import_mode',
+            field=models.CharField(choices=[('overwrite', 'Overwrite'), ('incremental', 'Incremental'), ('swap', 'Swap')], default='overwrite', help_text='Overwrite: reload the whole table; Incremental: load into a staging table and apply only the inserted and deleted rows to the input table; Swap: load into an unlogged staging table and replace the input table with it', max_length=16),
+        ),
+    ]
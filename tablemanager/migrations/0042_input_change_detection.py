@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 18:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0041_auto_20261018_1710'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='input',
+            name='change_detection',
+            field=models.CharField(choices=[('mtime', 'Modify time'), ('content', 'Content hash')], default='mtime', help_text='How the harvest job detects the changes of a file data source; Content hash: re-import only if the content of the data source files is changed', max_length=16),
+        ),
+    ]
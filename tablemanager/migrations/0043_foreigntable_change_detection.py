@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 18:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0042_input_change_detection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foreigntable',
+            name='change_detection',
+            field=models.CharField(choices=[('chunked_md5', 'Chunked md5 by key range'), ('column', 'Max value of a column and row count'), ('md5', 'Whole table md5'), ('stat', 'Remote table statistics')], default='md5', help_text='The strategy to check whether the remote table is changed', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='foreigntable',
+            name='change_detection_column',
+            field=models.CharField(blank=True, help_text='The indexed integer key column for the chunked md5 strategy, or the last updated column for the column strategy', max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='foreigntable',
+            name='table_md5_support',
+            field=models.BooleanField(default=True, help_text='If true, the change detection strategy is used to check whether the data source is up to date; otherwise the data source is imported by every harvest job.'),
+        ),
+    ]
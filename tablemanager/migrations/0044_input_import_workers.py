@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 19:20
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0043_foreigntable_change_detection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='input',
+            name='import_workers',
+            field=models.PositiveSmallIntegerField(default=1, help_text='The number of loaders which import the data source concurrently; if more than 1, the member layers of a union layer are imported in parallel and merged'),
+        ),
+    ]
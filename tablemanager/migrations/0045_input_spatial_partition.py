@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 19:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0044_input_import_workers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='input',
+            name='spatial_partition',
+            field=models.BooleanField(default=False, help_text='If true and import_workers is more than 1, split the extent of the data source into tiles, and import the tiles in parallel with spatial filters'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 20:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0045_input_spatial_partition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publish',
+            name='publish_mode',
+            field=models.CharField(choices=[('full', 'Full'), ('incremental', 'Incremental')], default='full', help_text='Full: recreate the published table; Incremental: apply only the inserted and deleted rows, compared by md5_rowhash, to the published table', max_length=16),
+        ),
+    ]
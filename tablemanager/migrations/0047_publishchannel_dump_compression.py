@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 21:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0046_publish_publish_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publishchannel',
+            name='dump_compression',
+            field=models.CharField(default='1', help_text="The compression of the full data dumps, passed to pg_dump -Z: a level from 0 to 9, or 'method:level' such as 'zstd:3' if supported by pg_dump", max_length=32),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.7 on 2026-10-18 21:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tablemanager', '0047_publishchannel_dump_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foreigntable',
+            name='change_detection_checks',
+            field=models.PositiveSmallIntegerField(default=10, help_text="The chunked md5 strategy verifies all the chunks within this number of checks; an update which doesn't change any key is detected within this number of checks"),
+        ),
+    ]
@@ -12,6 +12,9 @@ import time
 import signal
 import sys
 import json
+import copy
+import hashlib
+import math
 import StringIO
 import codecs
 import traceback
@@ -36,20 +39,23 @@ from django.conf import settings
 from django.utils.safestring import SafeText
 from django.template.loader import render_to_string
 
-import hglib
 from codemirror import CodeMirrorTextarea
 from sqlalchemy import create_engine
 
-from borg_utils.gdal import detect_epsg
+from borg_utils.gdal import detect_epsg,IntrospectionCache
+from borg_utils.file_digest import datasource_digest
+from tablemanager.changedetection import ChangeDetector,Md5Detector
+from borg_utils.ogr_import import OgrDataset,OgrImportCancelled
 from borg_utils.spatial_table import SpatialTableMixin
 from borg_utils.borg_config import BorgConfiguration
+from borg_utils.hg_pool import open_repository
 from borg_utils.jobintervals import JobInterval
 from borg_utils.resource_status import ResourceStatus,ResourceStatusMixin
 from borg_utils.db_util import defaultDbUtil
 from borg_utils.hg_batch_push import try_set_push_owner, try_clear_push_owner, increase_committed_changes, try_push_to_repository
 from borg_utils.signals import refresh_select_choices
 from borg_utils.models import BorgModel,SQLField
-from borg_utils.utils import file_md5
+from borg_utils.utils import file_md5,path_mtime
 
 logger = logging.getLogger(__name__)
 
@@ -198,6 +204,44 @@ class DatasourceType(object):
         (MUDMAP,MUDMAP)
     )
 
+class ImportEngine(object):
+    OGR2OGR = "ogr2ogr"
+    GDAL = "gdal"
+
+    options = (
+        (OGR2OGR,"ogr2ogr"),
+        (GDAL,"GDAL python bindings")
+    )
+
+class ImportMode(object):
+    OVERWRITE = "overwrite"
+    INCREMENTAL = "incremental"
+    SWAP = "swap"
+
+    options = (
+        (OVERWRITE,"Overwrite"),
+        (INCREMENTAL,"Incremental"),
+        (SWAP,"Swap")
+    )
+
+class PublishMode(object):
+    FULL = "full"
+    INCREMENTAL = "incremental"
+
+    options = (
+        (FULL,"Full"),
+        (INCREMENTAL,"Incremental")
+    )
+
+class ChangeDetection(object):
+    MTIME = "mtime"
+    CONTENT = "content"
+
+    options = (
+        (MTIME,"Modify time"),
+        (CONTENT,"Content hash")
+    )
+
 @python_2_unicode_compatible
 class DataSource(BorgModel):
     """
@@ -361,7 +405,10 @@ class ForeignTable(BorgModel):
     name = models.SlugField(max_length=255, unique=True, help_text="The name of foreign table", validators=[validate_slug])
     server = models.ForeignKey(DataSource,limit_choices_to={"type":DatasourceType.DATABASE})
     sql = SQLField(default="CREATE FOREIGN TABLE \"{{schema}}\".\"{{self.name}}\" (<columns>) SERVER {{self.server.name}} OPTIONS (schema '<schema>', table '<table>');")
-    table_md5_support = models.BooleanField(null=False, default=True, help_text="If true, table md5 is used to check whether the data source is up to date.")
+    table_md5_support = models.BooleanField(null=False, default=True, help_text="If true, the change detection strategy is used to check whether the data source is up to date; otherwise the data source is imported by every harvest job.")
+    change_detection = models.CharField(max_length=32, choices=ChangeDetector.options(), default=Md5Detector.name, help_text="The strategy to check whether the remote table is changed")
+    change_detection_column = models.CharField(max_length=64, null=True, blank=True, help_text="The indexed integer key column for the chunked md5 strategy, or the last updated column for the column strategy")
+    change_detection_checks = models.PositiveSmallIntegerField(default=10, help_text="The chunked md5 strategy verifies all the chunks within this number of checks; an update which doesn't change any key is detected within this number of checks")
     last_modify_time = models.DateTimeField(auto_now=False,auto_now_add=True,editable=False,null=False)
 
     ROW_COUNT_SQL = "SELECT COUNT(*) FROM \"{0}\".\"{1}\";"
@@ -405,6 +452,9 @@ class ForeignTable(BorgModel):
         except :
             raise ValidationError("Sql contains non ascii character.")
 
+        if self.change_detector.column_required and not self.change_detection_column:
+            raise ValidationError("The change detection column is required by the strategy '{0}'.".format(self.change_detection))
+
         name = "test_" + self.name
         try:
             self.drop(cursor,schema,name)
@@ -442,6 +492,17 @@ class ForeignTable(BorgModel):
         else:
             return cursor.fetchone()[0]
 
+    @property
+    def change_detector(self):
+        return ChangeDetector.get_detector(self.change_detection)
+
+    @in_schema("public", db_url=settings.FDW_URL)
+    def change_signature(self,cursor,schema,previous=None):
+        """
+        return the current change signature of the table, computed by the change detection strategy
+        """
+        return self.change_detector.signature(self,cursor,schema,previous)
+
     def delete(self,using=None):
         logger.info('Delete {0}:{1}'.format(type(self),self.name))
         if try_set_push_owner("foreign_table"):
@@ -523,6 +584,11 @@ class Input(JobFields,SpatialTableMixin):
     generate_rowid = models.BooleanField(null=False, default=False, help_text="If true, a _rowid column will be added and filled with row data's hash value")
     source = DatasourceField(help_text="GDAL VRT definition in xml", unique=True)
     advanced_options = models.CharField(max_length=128, null=True, editable=False,blank=True,help_text="Advanced ogr2ogr options")
+    import_engine = models.CharField(max_length=16, choices=ImportEngine.options, default=ImportEngine.OGR2OGR, help_text="The engine used to import the data source; the GDAL engine opens the data source once and streams the features by COPY")
+    import_mode = models.CharField(max_length=16, choices=ImportMode.options, default=ImportMode.OVERWRITE, help_text="Overwrite: reload the whole table; Incremental: load into a staging table and apply only the inserted and deleted rows to the input table; Swap: load into an unlogged staging table and replace the input table with it")
+    import_workers = models.PositiveSmallIntegerField(default=1, help_text="The number of loaders which import the data source concurrently; if more than 1, the member layers of a union layer are imported in parallel and merged")
+    spatial_partition = models.BooleanField(default=False, help_text="If true and import_workers is more than 1, split the extent of the data source into tiles, and import the tiles in parallel with spatial filters")
+    change_detection = models.CharField(max_length=16, choices=ChangeDetection.options, default=ChangeDetection.MTIME, help_text="How the harvest job detects the changes of a file data source; Content hash: re-import only if the content of the data source files is changed")
     info = models.TextField(editable=False)
     spatial_info = models.TextField(max_length=512,editable=False,null=True,blank=True)
     create_table_sql = models.TextField(null=True, editable=False)
@@ -614,6 +680,16 @@ class Input(JobFields,SpatialTableMixin):
         self._vrt.flush()
         return self._vrt
 
+    @property
+    def introspection_key(self):
+        """
+        The key of the cached introspection result of the vrt; None if the data source is not file based.
+        """
+        try:
+            return IntrospectionCache.fingerprint(self.vrt.name,self.datasource)
+        except:
+            return None
+
     @property
     def info_dict(self):
         """
@@ -735,36 +811,40 @@ class Input(JobFields,SpatialTableMixin):
                     elif job.job_type == JobInterval.Triggered.name:
                         return False
                     elif job.batch_id:
-                        if "row_count" in self.importing_dict:
-                            if self.foreign_table.table_row_count() != self.importing_dict["row_count"]:
-                                #inputing table has different number of rows with inputed table
-                                self.importing_info = None
-                                self.save(update_fields=['importing_info'])
-                                return False
-                        if self.foreign_table.table_md5_support and "table_md5" in self.importing_dict :
-                            if self.foreign_table.table_md5() == self.importing_dict["table_md5"]:
-                                self.importing_dict["check_job_id"] = job.id
-                                self.importing_dict["check_batch_id"] = job.batch_id
-                                self.importing_info = json.dumps(self.importing_dict)
-                                self.save(update_fields=['importing_info'])
-                                return True
-                            else:
-                                self.importing_info = None
-                                self.save(update_fields=['importing_info'])
-                                return False
-                        else:
+                        previous = self.change_signature
+                        if not self.foreign_table.table_md5_support or previous is None:
+                            return False
+                        signature = self.foreign_table.change_signature(previous=previous)
+                        if self.foreign_table.change_detector.is_changed(previous,signature):
+                            self.importing_info = None
+                            self.save(update_fields=['importing_info'])
                             return False
+                        else:
+                            #save the signature, which may contain the state cached by the strategy
+                            self.importing_dict["change_signature"] = {"strategy":self.foreign_table.change_detection,"signature":signature}
+                            self.importing_dict["check_job_id"] = job.id
+                            self.importing_dict["check_batch_id"] = job.batch_id
+                            self.importing_info = json.dumps(self.importing_dict)
+                            self.save(update_fields=['importing_info'])
+                            return True
                     else:
                         return False
                 else:
                     mod_time = None
                     result = True
-                    if job and job.batch_id:
+                    if job and job.batch_id and self.change_detection == ChangeDetection.CONTENT and "content_digest" in self.importing_dict:
+                        #check for harvest, compare the content of the data source files
+                        digest = self.content_digest
+                        if digest is None:
+                            result = None
+                        elif digest != self.importing_dict["content_digest"]:
+                            return False
+                    elif job and job.batch_id:
                         #check for harvest, should always check.
                         for ds in self.datasource or []:
                             if os.path.exists(ds):
                                 #data source is a file
-                                if self.job_run_time <= datetime.utcfromtimestamp(os.path.getmtime(ds)).replace(tzinfo=pytz.UTC):
+                                if self.job_run_time <= datetime.utcfromtimestamp(path_mtime(ds)).replace(tzinfo=pytz.UTC):
                                     return False
                             else:
                                 result = None
@@ -782,20 +862,44 @@ class Input(JobFields,SpatialTableMixin):
 
         return False
 
-    def _populate_rowid(self,cursor,schema):
+    @property
+    def change_signature(self):
+        """
+        return the change signature of the foreign table saved by the last import,
+        or None if it was not computed by the current change detection strategy.
+        """
+        saved = self.importing_dict.get("change_signature")
+        if saved:
+            return saved["signature"] if saved.get("strategy") == self.foreign_table.change_detection else None
+        elif self.foreign_table.change_detection == Md5Detector.name and "row_count" in self.importing_dict and "table_md5" in self.importing_dict:
+            #saved by the previous version
+            return {"row_count":self.importing_dict["row_count"],"table_md5":self.importing_dict["table_md5"]}
+        else:
+            return None
+
+    @property
+    def content_digest(self):
+        """
+        return the content digest of the data source files, or None if the data source is not a file.
+        """
+        return datasource_digest(self.datasource)
+
+    def _populate_rowid(self,cursor,schema,table_name=None):
         """
         generate the rowid for input table
         if the input table is not required to generate rowid, return directly.
         otherwise,do the follwoing things:
         1. add a rowid column, and set rowid as primary key
-        2. construnct the sql to update the rowid.
+        2. construnct the sql to update the rowid of the rows which have no rowid;
+           only the inserted rows have no rowid after an incremental import.
         3. execute the sql.
         """
         if not self.generate_rowid:
             return
+        table_name = table_name or self.name
 
         #check whether rowid column exists or not
-        sql = "SELECT count(1) FROM pg_attribute a JOIN pg_class b ON a.attrelid = b.oid JOIN pg_namespace c ON b.relnamespace = c.oid WHERE a.attname='{2}' AND b.relname='{1}' AND c.nspname='{0}' ".format(schema,self.name,self.rowid_column)
+        sql = "SELECT count(1) FROM pg_attribute a JOIN pg_class b ON a.attrelid = b.oid JOIN pg_namespace c ON b.relnamespace = c.oid WHERE a.attname='{2}' AND b.relname='{1}' AND c.nspname='{0}' ".format(schema,table_name,self.rowid_column)
         sql_result = cursor.execute(sql)
         column_exists = None
         if sql_result:
@@ -806,24 +910,19 @@ class Input(JobFields,SpatialTableMixin):
         #add rowid column if required
         if not column_exists:
             #add column
-            sql = "ALTER TABLE {0}.{1} ADD COLUMN {2} text".format(schema,self.name,self.rowid_column)
+            sql = "ALTER TABLE {0}.{1} ADD COLUMN {2} text".format(schema,table_name,self.rowid_column)
             cursor.execute(sql)
 
         #construct the update sql
-        sql = "SELECT a.attname FROM pg_attribute a JOIN pg_class b ON a.attrelid = b.oid JOIN pg_namespace c ON b.relnamespace = c.oid WHERE a.attnum > 0 AND a.attname != '{2}' AND b.relname='{1}' AND c.nspname='{0}' ".format(schema,self.name,self.rowid_column)
-        sql_result = cursor.execute(sql)
-        input_table_columns = None
-        if sql_result:
-            input_table_columns = ",".join([x[0] for x in sql_result.fetchall()])
-        else:
-            input_table_columns = ",".join([x[0] for x in cursor.fetchall()])
-        sql = "UPDATE \"{0}\".\"{1}\" set {2} = md5(CAST(({3}) AS text))".format(schema,self.name,self.rowid_column,input_table_columns)
+        #the same columns in the same order as the rowid populated while loading the data
+        input_table_columns = ",".join(["\"{0}\"".format(c[0]) for c in self._table_columns(cursor,schema,table_name)])
+        sql = "UPDATE \"{0}\".\"{1}\" set {2} = {3} WHERE {2} IS NULL".format(schema,table_name,self.rowid_column,self._rowid_expression(input_table_columns))
         cursor.execute(sql)
 
         #set the rowid as the unique key
         #first check whether the unique key exists or not
-        constraint_name = "{0}_index_{1}".format(self.name,self.rowid_column)
-        sql = "SELECT count(1) FROM pg_constraint a JOIN pg_class b ON a.conrelid = b.oid JOIN pg_namespace c ON b.relnamespace = c.oid WHERE a.conname='{2}' AND b.relname='{1}' AND c.nspname='{0}' ".format(schema,self.name,constraint_name)
+        constraint_name = self._rowid_constraint_name(table_name)
+        sql = "SELECT count(1) FROM pg_constraint a JOIN pg_class b ON a.conrelid = b.oid JOIN pg_namespace c ON b.relnamespace = c.oid WHERE a.conname='{2}' AND b.relname='{1}' AND c.nspname='{0}' ".format(schema,table_name,constraint_name)
         sql_result = cursor.execute(sql)
         constraint_exists = None
         if sql_result:
@@ -832,11 +931,63 @@ class Input(JobFields,SpatialTableMixin):
             constraint_exists = (cursor.fetchone())[0]
         if not constraint_exists:
             #unique key does not exist
-            sql = "ALTER TABLE \"{0}\".\"{1}\" ADD CONSTRAINT {3} UNIQUE ({2})".format(schema,self.name,self.rowid_column,constraint_name)
+            sql = "ALTER TABLE \"{0}\".\"{1}\" ADD CONSTRAINT {3} UNIQUE ({2})".format(schema,table_name,self.rowid_column,constraint_name)
             cursor.execute(sql)
 
+    @staticmethod
+    def _rowid_expression(columns):
+        """
+        return the sql expression of the rowid, the hash of the columns
+        """
+        return "md5(CAST(({0}) AS text))".format(columns)
+
+    def _rowid_constraint_name(self,table_name):
+        return "{0}_index_{1}".format(table_name,self.rowid_column)
+
+    def _add_rowid_constraint(self,cursor,schema,table_name):
+        cursor.execute("ALTER TABLE \"{0}\".\"{1}\" ADD CONSTRAINT {3} UNIQUE ({2})".format(schema,table_name,self.rowid_column,self._rowid_constraint_name(table_name)))
+
+    def _copy_with_rowid(self,cursor,schema,source_table,table_name,unlogged=False):
+        """
+        Create the table from the source table with the rowid populated in one pass,
+        then build the indexes of the source table and the rowid unique key on the table once.
+        The rowid is the same as the rowid populated by _populate_rowid.
+        The serial default of the fid column is recreated with a sequence owned by the table, because the sequence of the source table
+        is dropped with the source table.
+        """
+        column_names = [c[0] for c in self._table_columns(cursor,schema,source_table)]
+        columns = ",".join(["\"{0}\"".format(c) for c in column_names])
+        fid = self._fid_column
+        fid_serial = fid in column_names and self._fetchall(cursor,"SELECT pg_get_serial_sequence('\"{0}\".\"{1}\"','{2}')".format(schema,source_table,fid))[0][0]
+        indexes = self._fetchall(cursor,"""SELECT c.relname,pg_get_indexdef(i.indexrelid),d.conname,pg_get_constraintdef(d.oid)
+FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid LEFT JOIN pg_constraint d ON d.conindid = i.indexrelid AND d.conrelid = i.indrelid
+WHERE i.indrelid = '"{0}"."{1}"'::regclass""".format(schema,source_table))
+
+        cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(schema,table_name))
+        cursor.execute("CREATE {4}TABLE \"{0}\".\"{1}\" AS SELECT {3},{5} AS {2} FROM \"{0}\".\"{6}\"".format(
+            schema,table_name,self.rowid_column,columns,"UNLOGGED " if unlogged else "",self._rowid_expression(columns),source_table))
+        if fid_serial:
+            sequence = "{0}_{1}_seq".format(table_name,fid)
+            cursor.execute("DROP SEQUENCE IF EXISTS \"{0}\".\"{1}\"".format(schema,sequence))
+            cursor.execute("CREATE SEQUENCE \"{0}\".\"{1}\" OWNED BY \"{0}\".\"{2}\".\"{3}\"".format(schema,sequence,table_name,fid))
+            cursor.execute("SELECT setval('\"{0}\".\"{1}\"',coalesce(max(\"{3}\"),0) + 1,false) FROM \"{0}\".\"{2}\"".format(schema,sequence,table_name,fid))
+            cursor.execute("ALTER TABLE \"{0}\".\"{1}\" ALTER COLUMN \"{2}\" SET DEFAULT nextval('\"{0}\".\"{3}\"')".format(schema,table_name,fid,sequence))
+
+        for index_name,index_def,constraint_name,constraint_def in indexes:
+            name = constraint_name or index_name
+            name = table_name + name[len(source_table):] if name.startswith(source_table) else "{0}_{1}".format(table_name,name)
+            if constraint_name:
+                cursor.execute("ALTER TABLE \"{0}\".\"{1}\" ADD CONSTRAINT \"{2}\" {3}".format(schema,table_name,name,constraint_def))
+            else:
+                cursor.execute("CREATE {3}INDEX \"{2}\" ON \"{0}\".\"{1}\"{4}".format(
+                    schema,table_name,name,"UNIQUE " if index_def.startswith("CREATE UNIQUE") else "",index_def[index_def.index(" USING "):]))
+        self._add_rowid_constraint(cursor,schema,table_name)
+
     @in_schema(BorgConfiguration.INPUT_SCHEMA)
     def populate_rowid(self,cursor,schema):
+        if self.importing_dict.get("rowid_loaded"):
+            #the rowid was populated while loading the data, no row is without rowid
+            return
         self._populate_rowid(cursor,schema)
 
     @in_schema(BorgConfiguration.TEST_INPUT_SCHEMA + "," + BorgConfiguration.BORG_SCHEMA)
@@ -888,16 +1039,29 @@ class Input(JobFields,SpatialTableMixin):
         return the data source's layer name
         """
         if hasattr(self, "_layer_name"): return self._layer_name
-        output = subprocess.check_output(["ogrinfo", "-q", "-ro","-so","-al", self.vrt.name], stderr=subprocess.STDOUT)
-        if output.find("ERROR") > -1:
-            raise Exception(output)
+        cache_key = self.introspection_key
+        cached = IntrospectionCache.get(cache_key)
+        if cached and cached.get("layer_name"):
+            self._layer_name = cached["layer_name"]
+            return self._layer_name
+        if self.import_engine == ImportEngine.GDAL:
+            dataset = OgrDataset(self.vrt.name)
+            try:
+                self._layer_name = dataset.layer_name
+            finally:
+                dataset.close()
         else:
-            m = self._layer_name_re.search(output)
-            if m:
-                self._layer_name = m.group("layerName")
+            output = subprocess.check_output(["ogrinfo", "-q", "-ro","-so","-al", self.vrt.name], stderr=subprocess.STDOUT)
+            if output.find("ERROR") > -1:
+                raise Exception(output)
             else:
-                raise Exception("Failed to find layer name")
-            return self._layer_name
+                m = self._layer_name_re.search(output)
+                if m:
+                    self._layer_name = m.group("layerName")
+                else:
+                    raise Exception("Failed to find layer name")
+        IntrospectionCache.update(cache_key,layer_name=self._layer_name)
+        return self._layer_name
 
     def insert_fields(self):
         origin_source = self.source
@@ -1026,8 +1190,33 @@ class Input(JobFields,SpatialTableMixin):
         """
         set the data source's information dictionary
         if database is not None, read the information from table;
-        if database is None, read the information from data source;
-        """
+        if database is None, read the information from data source; the information of a file based data source is cached
+        until the vrt or the source files are changed. The information includes the layer name, geometry type, feature count, extent and fields.
+        """
+        if not (database and table):
+            cache_key = self.introspection_key
+            cached = IntrospectionCache.get(cache_key)
+            if cached and cached.get("info"):
+                info = cached["info"]
+            elif self.import_engine == ImportEngine.GDAL:
+                dataset = OgrDataset(self.vrt.name)
+                try:
+                    info = dataset.info()
+                finally:
+                    dataset.close()
+            else:
+                info = None
+
+            if info:
+                self.info = info
+                try:
+                    delattr(self,"_info_dict")
+                except:
+                    pass
+                m = Input._layer_name_re.search(info)
+                IntrospectionCache.update(cache_key,info=info,layer_name=m.group("layerName") if m else None)
+                return
+
         if database and table:
             cmd = ["ogrinfo", "-ro", "-so", database, table]
         else:
@@ -1052,44 +1241,122 @@ class Input(JobFields,SpatialTableMixin):
             self.info = Input._layer_name_re.sub("Layer name: {0}\n".format(self.get_layer_name()),output[0],count=1)
         else:
             self.info = output[0]
+            m = Input._layer_name_re.search(self.info)
+            IntrospectionCache.update(cache_key,info=self.info,layer_name=m.group("layerName") if m else None)
 
-    def invoke(self ,cursor,schema,job_id=None):
+    def invoke(self ,cursor,schema,job_id=None,validation=None,table_name=None,unlogged=False,with_rowid=False):
         """
-        Use ogr2ogr to copy the VRT source defined in Input into the harvest DB.
+        Copy the VRT source defined in Input into the harvest DB with the configured import engine.
         Pre-save hook for Input.
 
         can be invoked by havest or user maintain action
+        validation: import part of the data to validate the data source; default is True if job_id is None
+        table_name: the table to import the data into; default is the input's table
+        unlogged: create the table as an unlogged table
+        with_rowid: populate the rowid while loading the data, if the input requires rowid.
+            ogr2ogr and the GDAL engine populate the rowid by a trigger while copying the features;
+            the parallel loaders load the data into an unlogged table first, and the table is created from it with the rowid in one pass.
+            Either way every row is written once into the table, instead of being rewritten by updating the rowid after the import.
 
         Return True if import successfully; False if import process is terminated.
         """
-        validation = not job_id
-        # Make sure DB is GIS enabled and then load using ogr2ogr
-        database = "PG:dbname='{NAME}' host='{HOST}' port='{PORT}'  user='{USER}' password='{PASSWORD}'".format(**settings.DATABASES["default"])
-        table = "{0}.{1}".format(schema,self.name)
-        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
-        if validation:
-            cmd = ["ogr2ogr", "-overwrite", "-gt", "1", "-preserve_fid", "-skipfailures", "--config", "PG_USE_COPY", "YES",
-                "-f", "PostgreSQL", database, self.vrt.name, "-nln", table, "-nlt", "PROMOTE_TO_MULTI", self.layer]
+        if validation is None:
+            validation = not job_id
+        table_name = table_name or self.name
+        with_rowid = with_rowid and self.generate_rowid and not validation
+
+        if self.import_engine == ImportEngine.GDAL:
+            result = self._invoke_gdal(cursor,schema,job_id,validation,table_name,unlogged,with_rowid)
+            if with_rowid and result and result[0]:
+                self.importing_dict["rowid_loaded"] = True
+            return result
+
+        if not validation and self.import_workers > 1 and self._union_members():
+            loader = self._invoke_union
+        elif not validation and self.import_workers > 1 and self.spatial_partition and self._source_tiles():
+            loader = self._invoke_tiles
+        else:
+            loader = self._invoke_ogr2ogr
+
+        if with_rowid and loader == self._invoke_ogr2ogr:
+            result = self._invoke_ogr2ogr(cursor,schema,job_id,validation,table_name,unlogged,rowid_column=self.rowid_column)
+            if result[0]:
+                #no need to populate the rowid after the import
+                self.importing_dict["rowid_loaded"] = True
+            return result
+        elif with_rowid:
+            load_table = "{0}_load".format(table_name)
+            try:
+                result = loader(cursor,schema,job_id,validation,load_table,True)
+                if result[0]:
+                    self._copy_with_rowid(cursor,schema,load_table,table_name,unlogged)
+                    #no need to populate the rowid after the import
+                    self.importing_dict["rowid_loaded"] = True
+                return result
+            finally:
+                cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(schema,load_table))
         else:
-            cmd = ["ogr2ogr", "-overwrite", "-gt", "20000", "-preserve_fid", "-skipfailures", "--config", "PG_USE_COPY", "YES",
-                "-f", "PostgreSQL", database, self.vrt.name, "-nln", table, "-nlt", "PROMOTE_TO_MULTI", self.layer]
+            return loader(cursor,schema,job_id,validation,table_name,unlogged)
+
+    @property
+    def _ogr_database(self):
+        return "PG:dbname='{NAME}' host='{HOST}' port='{PORT}'  user='{USER}' password='{PASSWORD}'".format(**settings.DATABASES["default"])
+
+    def _ogr2ogr_cmd(self,vrt_file,layer,schema,table_name,validation,unlogged=False,srid=None,group_transactions=20000,append=False):
+        """
+        return the ogr2ogr command to copy the layer of the vrt file into the table
+        append: append the features into the existing table instead of recreating it
+        """
+        table = "{0}.{1}".format(schema,table_name)
+        cmd = ["ogr2ogr", "-append" if append else "-overwrite", "-gt", "1" if validation else str(group_transactions), "-preserve_fid", "-skipfailures", "--config", "PG_USE_COPY", "YES",
+            "-f", "PostgreSQL", self._ogr_database, vrt_file, "-nln", table, "-nlt", "PROMOTE_TO_MULTI", layer]
+
+        if unlogged:
+            cmd += ["-lco", "UNLOGGED=ON"]
 
         if self.advanced_options:
             cmd += self.advanced_options.split()
 
-        logger.info("Try to detect spatial refernce system")
-        srid = detect_epsg(self.vrt.name)
         if srid:
             cmd += ['-a_srs', srid]
+        return cmd
+
+    def _invoke_ogr2ogr(self,cursor,schema,job_id,validation,table_name,unlogged=False,rowid_column=None):
+        """
+        Use ogr2ogr to copy the VRT source defined in Input into the harvest DB.
+        rowid_column: populate the rowid column while loading the data.
+            ogr2ogr creates the empty table first, the rowid column and a trigger populating it are added,
+            and then the features are appended into the table; the rowid unique key is built after the data is loaded.
+
+        Return the same result as invoke
+        """
+        # Make sure DB is GIS enabled and then load using ogr2ogr
+        database = self._ogr_database
+        table = "{0}.{1}".format(schema,table_name)
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+
+        logger.info("Try to detect spatial refernce system")
+        srid = detect_epsg(self.vrt.name,self.introspection_key)
+        cmd = self._ogr2ogr_cmd(self.vrt.name,self.layer,schema,table_name,validation,unlogged,srid,append=bool(rowid_column))
         #logger.info(" ".join(cmd))
         cancelled = False
         outputFile = None
         errorFile = None
         output = None
-        rows_sql = "SELECT count(1) FROM \"{0}\".\"{1}\"".format(schema,self.name)
+        rows_sql = "SELECT count(1) FROM \"{0}\".\"{1}\"".format(schema,table_name)
         try:
             #drop the current table first
-            cursor.execute("drop table if exists \"{0}.{1}\" CASCADE;".format(schema,self.name))
+            cursor.execute("drop table if exists \"{0}.{1}\" CASCADE;".format(schema,table_name))
+
+            if rowid_column:
+                #create the empty table, and add the rowid column populated by a trigger
+                try:
+                    subprocess.check_output(self._ogr2ogr_cmd(self.vrt.name,self.layer,schema,table_name,validation,unlogged,srid) + ["-where","1 = 0"],stderr=subprocess.STDOUT)
+                except subprocess.CalledProcessError as ex:
+                    raise Exception(ex.output or "Failed to create table '{}.{}', Check the datasource".format(schema,table_name))
+                columns = [c[0] for c in self._table_columns(cursor,schema,table_name)]
+                cursor.execute("ALTER TABLE \"{0}\".\"{1}\" ADD COLUMN \"{2}\" text".format(schema,table_name,rowid_column))
+                cursor.execute(OgrDataset._rowid_trigger_sql(schema,table_name,columns,rowid_column))
 
             outputFile = tempfile.NamedTemporaryFile(delete=False)
             errorFile = tempfile.NamedTemporaryFile(delete=False)
@@ -1142,7 +1409,7 @@ class Input(JobFields,SpatialTableMixin):
                 if returncode != signal.SIGTERM * -1 and output[1].strip():
                     raise Exception(output[1])
                 else:
-                    raise Exception("Failed to create table '{}.{}', Check the datasource".format(schema,self.name))
+                    raise Exception("Failed to create table '{}.{}', Check the datasource".format(schema,table_name))
     
             else:
                 sleep_time = 0
@@ -1155,7 +1422,7 @@ class Input(JobFields,SpatialTableMixin):
                     time.sleep(0.2)
                     sleep_time += 200
 
-                    if sleep_time >= cancel_time:
+                    if sleep_time >= cancel_time and job_id:
                         sleep_time = 0
                         job = self._get_job(cursor,job_id)
                         if job.user_action and job.user_action.lower() == JobStateOutcome.cancelled_by_custodian.lower():
@@ -1185,8 +1452,16 @@ class Input(JobFields,SpatialTableMixin):
                     elif output[1]:
                         logger.error(output[1])
 
+                    if rowid_column:
+                        cursor.execute(OgrDataset._drop_rowid_trigger_sql(schema,table_name))
+                        self._add_rowid_constraint(cursor,schema,table_name)
                     self._set_info(database,table)
         finally:
+            if rowid_column:
+                try:
+                    cursor.execute(OgrDataset._drop_rowid_trigger_sql(schema,table_name))
+                except:
+                    pass
             if outputFile:
                 try:
                     outputFile.close()
@@ -1209,6 +1484,536 @@ class Input(JobFields,SpatialTableMixin):
 
         return (not cancelled,output[1] if output and output[1].strip() else None)
 
+    def _run_ogr2ogr(self,cursor,job_id,cmds,workers):
+        """
+        Run the ogr2ogr commands, at most 'workers' commands concurrently.
+        If any command fails, the other commands are terminated and an exception is raised.
+        Return (cancelled,the error outputs of the commands)
+        """
+        from harvest.jobstates import JobStateOutcome
+        pending = list(enumerate(cmds))
+        running = {}
+        outputs = []
+        cancelled = False
+        sleep_time = 0
+        cancel_time = BorgConfiguration.IMPORT_CANCEL_TIME * 1000
+        try:
+            while pending or running:
+                while pending and len(running) < workers:
+                    index,cmd = pending.pop(0)
+                    errorFile = tempfile.TemporaryFile()
+                    running[index] = (subprocess.Popen(cmd,stdout=errorFile,stderr=errorFile),errorFile)
+
+                for index,(pobj,errorFile) in running.items():
+                    if pobj.poll() is None:
+                        continue
+                    del running[index]
+                    errorFile.seek(0)
+                    output = errorFile.read()
+                    errorFile.close()
+                    if pobj.returncode != 0:
+                        raise Exception(output if output.strip() else "ogr2ogr failed with unknown exception")
+                    elif output.strip():
+                        outputs.append(output)
+
+                if not running:
+                    continue
+                time.sleep(0.2)
+                sleep_time += 200
+                if sleep_time >= cancel_time and job_id:
+                    sleep_time = 0
+                    job = self._get_job(cursor,job_id)
+                    if job.user_action and job.user_action.lower() == JobStateOutcome.cancelled_by_custodian.lower():
+                        cancelled = True
+                        logger.info("The job({1}) is cancelled, terminate the importing processes for '{0}'".format(self.name,job_id))
+                        #clear the user action
+                        job.user_action = None
+                        self._save_job(cursor,job,["user_action"])
+                        break
+        finally:
+            for pobj,errorFile in running.values():
+                try:
+                    pobj.terminate()
+                    pobj.wait()
+                except:
+                    pass
+                errorFile.close()
+
+        return (cancelled,outputs)
+
+    @staticmethod
+    def _layer_element(element):
+        """
+        return the OGRVRTLayer or OGRVRTUnionLayer element wrapped by OGRVRTWarpedLayer elements
+        """
+        while element is not None and element.tag == "OGRVRTWarpedLayer":
+            element = next((e for e in element if e.tag in ("OGRVRTLayer","OGRVRTUnionLayer","OGRVRTWarpedLayer")),None)
+        return element
+
+    def _union_members(self):
+        """
+        Split the union layer of the data source into one vrt per member layer.
+        The fields configured in the first member layer by insert_fields are applied to the other member layers,
+        the same as the 'FirstLayer' field strategy of the union layer.
+        Return a list of (vrt xml,layer name), or None if the data source is not a union layer which can be imported member by member.
+        """
+        if hasattr(self,"_union_members_cache"):
+            return self._union_members_cache
+        self._union_members_cache = None
+        try:
+            root = ET.parse(self.vrt.name).getroot()
+        except:
+            return None
+
+        layers = [e for e in root if e.tag in ("OGRVRTLayer","OGRVRTUnionLayer","OGRVRTWarpedLayer")]
+        if len(layers) != 1 or layers[0].tag != "OGRVRTUnionLayer":
+            return None
+        union_layer = layers[0]
+        field_strategy = union_layer.find("FieldStrategy")
+        if (field_strategy is not None and (field_strategy.text or "").strip() != "FirstLayer") or union_layer.find("SourceLayerFieldName") is not None or union_layer.findall("Field"):
+            #the fields of the union layer are not the same as the fields of the first layer
+            return None
+
+        members = [e for e in union_layer if e.tag in ("OGRVRTLayer","OGRVRTUnionLayer","OGRVRTWarpedLayer")]
+        if len(members) < 2:
+            return None
+        fields = None
+        result = []
+        for member in members:
+            member = copy.deepcopy(member)
+            layer = self._layer_element(member)
+            if layer is None or layer.tag == "OGRVRTUnionLayer":
+                return None
+            if fields is None:
+                fields = layer.findall("Field")
+            elif fields and not layer.findall("Field"):
+                for f in fields:
+                    layer.append(copy.deepcopy(f))
+            datasource = ET.Element("OGRVRTDataSource")
+            datasource.append(member)
+            #a warped layer is named after its source layer by default
+            result.append((ET.tostring(datasource,"UTF-8"),member.get("name") or layer.get("name")))
+
+        self._union_members_cache = result
+        return result
+
+    def _merge_tables(self,cursor,schema,tables,table_name,unlogged=False,renumber=True,dedup=False):
+        """
+        Merge the tables into the table in one transaction.
+        The first table is renamed to the table and keeps its indexes; the rows of the other tables are appended.
+        if renumber is True, the fids of the appended rows are renumbered after the current max fid, so the fids are unique.
+        if dedup is True, the rows whose fid already exists are skipped; the fid must be the primary key.
+        """
+        fid = self._fid_column
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(schema,table_name))
+            self._rename_table(cursor,schema,tables[0],table_name)
+            columns = [c[0] for c in self._table_columns(cursor,schema,table_name)]
+            for table in tables[1:]:
+                table_columns = [c[0] for c in self._table_columns(cursor,schema,table)]
+                data_columns = ",".join(["\"{0}\"".format(c) for c in columns if c in table_columns and c != fid])
+                if fid not in columns or fid not in table_columns:
+                    sql = "INSERT INTO \"{0}\".\"{1}\" ({3}) SELECT {3} FROM \"{0}\".\"{2}\""
+                elif dedup:
+                    sql = "INSERT INTO \"{0}\".\"{1}\" (\"{4}\",{3}) SELECT \"{4}\",{3} FROM \"{0}\".\"{2}\" ON CONFLICT (\"{4}\") DO NOTHING"
+                elif renumber:
+                    sql = "INSERT INTO \"{0}\".\"{1}\" (\"{4}\",{3}) SELECT (SELECT coalesce(max(\"{4}\"),0) FROM \"{0}\".\"{1}\") + row_number() OVER (ORDER BY \"{4}\"),{3} FROM \"{0}\".\"{2}\""
+                else:
+                    sql = "INSERT INTO \"{0}\".\"{1}\" (\"{4}\",{3}) SELECT \"{4}\",{3} FROM \"{0}\".\"{2}\""
+                cursor.execute(sql.format(schema,table_name,table,data_columns,fid))
+                cursor.execute("DROP TABLE \"{0}\".\"{1}\"".format(schema,table))
+            if fid in columns:
+                cursor.execute("SELECT setval(pg_get_serial_sequence('\"{0}\".\"{1}\"','{2}'),coalesce(max(\"{2}\"),0) + 1,false) FROM \"{0}\".\"{1}\"".format(schema,table_name,fid))
+            if not unlogged:
+                cursor.execute("ALTER TABLE \"{0}\".\"{1}\" SET LOGGED".format(schema,table_name))
+            cursor.execute("COMMIT")
+        except:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def _invoke_union(self,cursor,schema,job_id,validation,table_name,unlogged=False):
+        """
+        Import the member layers of the union layer into unlogged part tables by import_workers ogr2ogr processes concurrently,
+        and then merge the part tables into the table.
+
+        Return the same result as invoke
+        """
+        members = self._union_members()
+        union_layer = ET.parse(self.vrt.name).getroot().find("OGRVRTUnionLayer")
+        preserve_fid = (union_layer.findtext("PreserveSrcFID") or "").strip().lower() in ("on","true","yes","1")
+        part_tables = ["{0}_part{1}".format(table_name,i) for i in range(len(members))]
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+        srid = detect_epsg(self.vrt.name,self.introspection_key)
+        vrt_files = []
+        try:
+            cmds = []
+            for (xml,layer),part_table in zip(members,part_tables):
+                vrt_file = tempfile.NamedTemporaryFile(suffix=".vrt")
+                vrt_file.write(xml)
+                vrt_file.flush()
+                vrt_files.append(vrt_file)
+                cmds.append(self._ogr2ogr_cmd(vrt_file.name,layer,schema,part_table,False,True,srid))
+
+            logger.info("Importing {1} union members using {2} ogr2ogr processes, name={0}".format(self.name,len(members),self.import_workers))
+            cancelled,outputs = self._run_ogr2ogr(cursor,job_id,cmds,self.import_workers)
+            if cancelled:
+                return (False,None)
+
+            self._merge_tables(cursor,schema,part_tables,table_name,unlogged,renumber=not preserve_fid)
+            self._set_info(self._ogr_database,"{0}.{1}".format(schema,table_name))
+            output = "\n".join(outputs)
+            return (True,output if output.strip() else None)
+        finally:
+            for vrt_file in vrt_files:
+                try:
+                    vrt_file.close()
+                except:
+                    pass
+            for part_table in part_tables:
+                cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(schema,part_table))
+
+    def _source_tiles(self):
+        """
+        Read the information of the current data source, and split its extent into tiles.
+        The information set by the previous import describes the imported table, which is out of date if the data source is changed.
+        Return the same result as _tiles
+        """
+        try:
+            self._set_info()
+        except:
+            logger.warning("Failed to read the information of the data source '{0}'. {1}".format(self.name,traceback.format_exc()))
+            return None
+        return self._tiles()
+
+    _extent_re = re.compile("\\((?P<xmin>[^,]+),(?P<ymin>[^)]+)\\)\\s*-\\s*\\((?P<xmax>[^,]+),(?P<ymax>[^)]+)\\)")
+    def _tiles(self):
+        """
+        Split the extent of the data source into about 2 * import_workers tiles.
+        The extent is rounded by ogrinfo, so the outer borders of the tiles are extended a little to cover the features on the border.
+        Return the list of (xmin,ymin,xmax,ymax), or None if the extent or the feature count of the data source is unknown.
+        """
+        try:
+            if int(self.info_dict["feature_count"]) <= 0:
+                return None
+            m = self._extent_re.search(self.info_dict["extent"])
+            xmin,ymin,xmax,ymax = [float(m.group(k)) for k in ("xmin","ymin","xmax","ymax")]
+        except:
+            return None
+        if xmax <= xmin or ymax <= ymin:
+            return None
+        xpad = (xmax - xmin) * 1e-6 + 1e-6
+        ypad = (ymax - ymin) * 1e-6 + 1e-6
+        xmin,ymin,xmax,ymax = xmin - xpad,ymin - ypad,xmax + xpad,ymax + ypad
+
+        tiles = self.import_workers * 2
+        columns = int(math.ceil(math.sqrt(tiles)))
+        rows = int(math.ceil(tiles / float(columns)))
+        width = (xmax - xmin) / columns
+        height = (ymax - ymin) / rows
+        return [(xmin + width * c,ymin + height * r,xmax if c == columns - 1 else xmin + width * (c + 1),ymax if r == rows - 1 else ymin + height * (r + 1))
+            for r in range(rows) for c in range(columns)]
+
+    min_group_transactions = 1000
+    max_group_transactions = 500000
+    @property
+    def group_transactions(self):
+        """
+        The number of rows per transaction of ogr2ogr, tuned by the observed throughput of the previous imports.
+        """
+        return (self.importing_dict.get("group_transactions") or {}).get("size") or 20000
+
+    def _tune_group_transactions(self,size,throughput):
+        """
+        Hill climbing: keep changing the group size in the same direction while the throughput is improving,
+        go back to the best size and try the other direction if the throughput is worse.
+        The best throughput decays, so the size keeps adapting to the changes of the data and the database.
+        """
+        tuning = self.importing_dict.get("group_transactions") or {}
+        step = tuning.get("step") or 2
+        best_throughput = (tuning.get("throughput") or 0) * 0.9
+        if best_throughput and throughput < best_throughput:
+            step = 1.0 / step
+            best_size = tuning.get("best_size") or size
+        else:
+            best_size,best_throughput = size,throughput
+        self.importing_dict["group_transactions"] = {
+            "size":int(min(max(best_size * step,self.min_group_transactions),self.max_group_transactions)),
+            "best_size":best_size,
+            "throughput":best_throughput,
+            "step":step,
+        }
+
+    def _invoke_tiles(self,cursor,schema,job_id,validation,table_name,unlogged=False):
+        """
+        Import the tiles of the data source's extent into unlogged part tables by import_workers ogr2ogr processes concurrently
+        with spatial filters, and then merge the part tables into the table.
+        A feature crossing the border of the tiles is imported by each tile, and is de-duplicated by its fid.
+        A feature without geometry is not in any tile, and is imported into another part table by a filter on the null geometry.
+        The other features which are not in any tile, e.g. the features with empty geometries, are found by the gaps of the imported fids
+        if less features than the feature count of the data source are imported, and are imported into another part table by a filter on the fid.
+        The extent and the feature count are read from the current data source by _source_tiles before the tiles are imported.
+
+        Return the same result as invoke
+        """
+        tiles = self._tiles()
+        feature_count = int(self.info_dict["feature_count"])
+        part_tables = ["{0}_tile{1}".format(table_name,i) for i in range(len(tiles) + 1)]
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+        srid = detect_epsg(self.vrt.name,self.introspection_key)
+        size = self.group_transactions
+        try:
+            cmds = [self._ogr2ogr_cmd(self.vrt.name,self.layer,schema,part_table,False,True,srid,size) + ["-spat"] + [repr(v) for v in tile]
+                for tile,part_table in zip(tiles,part_tables)]
+            #the features without geometry
+            cmds.append(self._ogr2ogr_cmd(self.vrt.name,self.layer,schema,part_tables[-1],False,True,srid,size) + ["-where","OGR_GEOMETRY IS NULL"])
+
+            logger.info("Importing {1} tiles using {2} ogr2ogr processes, name={0},group transactions={3}".format(self.name,len(tiles),self.import_workers,size))
+            begin_time = time.time()
+            cancelled,outputs = self._run_ogr2ogr(cursor,job_id,cmds,self.import_workers)
+            if cancelled:
+                return (False,None)
+
+            #the features which are not in any tile and have a geometry, e.g. the features with empty geometries
+            where = self._missing_features_filter(cursor,schema,part_tables,feature_count)
+            if where:
+                part_tables.append("{0}_missing".format(table_name))
+                cmd = self._ogr2ogr_cmd(self.vrt.name,self.layer,schema,part_tables[-1],False,True,srid,size) + ["-where",where]
+                cancelled,missing_outputs = self._run_ogr2ogr(cursor,job_id,[cmd],1)
+                if cancelled:
+                    return (False,None)
+                outputs += missing_outputs
+
+            self._merge_tables(cursor,schema,part_tables,table_name,unlogged,dedup=True)
+            rows = self._fetchall(cursor,"SELECT count(1) FROM \"{0}\".\"{1}\"".format(schema,table_name))[0][0]
+            if rows != feature_count:
+                #the features skipped by ogr2ogr because of failures
+                message = "{1} of {2} features are imported by tiles from the data source '{0}'".format(self.name,rows,feature_count)
+                logger.warning(message)
+                outputs.append(message)
+
+            self._tune_group_transactions(size,rows / max(time.time() - begin_time,1))
+            self._set_info(self._ogr_database,"{0}.{1}".format(schema,table_name))
+            output = "\n".join([o for o in outputs if o and o.strip()])
+            return (True,output if output.strip() else None)
+        finally:
+            for part_table in part_tables:
+                cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(schema,part_table))
+
+    max_missing_ranges = 100
+    def _missing_features_filter(self,cursor,schema,tables,feature_count):
+        """
+        Return the attribute filter of the features whose fids are not imported into the tables, which are the fids before the min fid,
+        after the max fid and in the gaps between the imported fids.
+        Return None if no feature is missing, or if the missing fids are in more than max_missing_ranges ranges.
+        """
+        fid = self._fid_column
+        fids_sql = " UNION ".join(["SELECT \"{2}\" AS fid FROM \"{0}\".\"{1}\"".format(schema,table,fid) for table in tables])
+        rows,min_fid,max_fid = self._fetchall(cursor,"SELECT count(1),min(fid),max(fid) FROM ({0}) a".format(fids_sql))[0]
+        if rows >= feature_count:
+            return None
+        if not rows:
+            return "FID IS NOT NULL"
+
+        gaps = self._fetchall(cursor,"SELECT fid,next_fid FROM (SELECT fid,lead(fid) OVER (ORDER BY fid) AS next_fid FROM ({0}) a) b WHERE next_fid > fid + 1 LIMIT {1}".format(
+            fids_sql,self.max_missing_ranges + 1))
+        if len(gaps) > self.max_missing_ranges:
+            logger.warning("The missing features of the data source '{0}' are in more than {1} ranges of fids, and are not imported".format(self.name,self.max_missing_ranges))
+            return None
+        return " OR ".join(["FID < {0}".format(min_fid),"FID > {0}".format(max_fid)] + ["(FID > {0} AND FID < {1})".format(*gap) for gap in gaps])
+
+    def _invoke_gdal(self,cursor,schema,job_id=None,validation=True,table_name=None,unlogged=False,with_rowid=False):
+        """
+        Use the GDAL python bindings to copy the VRT source defined in Input into the harvest DB.
+        The data source is opened once; the spatial reference system, the layer information and the feature count
+        are collected while the features are streamed into the table by one COPY statement.
+
+        Return the same result as invoke
+        """
+        from harvest.jobstates import JobStateOutcome
+        table_name = table_name or self.name
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+        if self.advanced_options:
+            logger.warning("The advanced options '{1}' of input '{0}' are ignored by the GDAL import engine".format(self.name,self.advanced_options))
+
+        job = [None]
+        def _cancelled():
+            job[0] = self._get_job(cursor,job_id)
+            return job[0].user_action and job[0].user_action.lower() == JobStateOutcome.cancelled_by_custodian.lower()
+
+        dataset = OgrDataset(self.vrt.name)
+        try:
+            srid = dataset.epsg()
+            logger.info("Importing data using GDAL python bindings, name={},srid={}".format(self.name,srid))
+            try:
+                if validation:
+                    result = dataset.import_to(cursor,schema,table_name,srid,max_time=BorgConfiguration.MAX_TEST_IMPORT_TIME,unlogged=unlogged)
+                else:
+                    result = dataset.import_to(cursor,schema,table_name,srid,cancel_check=_cancelled if job_id else None,check_interval=BorgConfiguration.IMPORT_CANCEL_TIME,unlogged=unlogged,
+                        rowid_column=self.rowid_column if with_rowid else None)
+            except OgrImportCancelled:
+                logger.info("The job({1}) is cancelled, terminate the importing process for '{0}'".format(self.name,job_id))
+                #clear the user action
+                job[0].user_action = None
+                self._save_job(cursor,job[0],["user_action"])
+                return (False,None)
+
+            errors = "\n".join(result["errors"]) if result["errors"] else None
+            if validation:
+                if not result["completed"]:
+                    logger.info("The data set is too big, stop the test importing process for '{0}'".format(self.name))
+                if result["feature_count"] > 0:
+                    return
+                raise Exception(errors or "Failed to create table '{}.{}', Check the datasource".format(schema,table_name))
+
+            if with_rowid:
+                self._add_rowid_constraint(cursor,schema,table_name)
+
+            self.info = dataset.info(result["feature_count"],result["extent"])
+            try:
+                delattr(self,"_info_dict")
+            except:
+                pass
+            return (True,errors)
+        finally:
+            dataset.close()
+
+    @property
+    def staging_table_name(self):
+        return "{0}_staging".format(self.name)
+
+    def _fetchall(self,cursor,sql):
+        sql_result = cursor.execute(sql)
+        return sql_result.fetchall() if sql_result else cursor.fetchall()
+
+    def _table_exists(self,cursor,schema,table_name):
+        sql = "SELECT count(1) FROM pg_class b JOIN pg_namespace c ON b.relnamespace = c.oid WHERE b.relname='{1}' AND c.nspname='{0}' AND b.relkind = 'r'".format(schema,table_name)
+        return self._fetchall(cursor,sql)[0][0] > 0
+
+    def _table_columns(self,cursor,schema,table_name):
+        """
+        return the list of (column name,column type) of the table, except the rowid column
+        """
+        sql = "SELECT a.attname,format_type(a.atttypid,a.atttypmod) FROM pg_attribute a JOIN pg_class b ON a.attrelid = b.oid JOIN pg_namespace c ON b.relnamespace = c.oid WHERE a.attnum > 0 AND NOT a.attisdropped AND a.attname != '{2}' AND b.relname='{1}' AND c.nspname='{0}' ORDER BY a.attnum".format(schema,table_name,self.rowid_column)
+        return [(r[0],r[1]) for r in self._fetchall(cursor,sql)]
+
+    _fid_column = "ogc_fid"
+    def _apply_delta(self,cursor,schema,staging_table):
+        """
+        Apply the difference between the staging table and the input table to the input table.
+        The rows are compared by the hash of all the columns except the fid and the rowid, so the fids renumbered by the data source are ignored;
+        the deleted rows are deleted from the input table, and the inserted rows are inserted with new fids.
+        The unchanged rows are untouched, and keep their fid and rowid.
+        Return (inserted rows,deleted rows), or None if the table structure is changed.
+        """
+        columns = self._table_columns(cursor,schema,staging_table)
+        if columns != self._table_columns(cursor,schema,self.name) or self._fid_column not in [c[0] for c in columns]:
+            return None
+
+        data_columns = ",".join(["\"{0}\"".format(c[0]) for c in columns if c[0] != self._fid_column])
+        hash_sql = "SELECT \"{2}\" AS fid,md5(CAST(({3}) AS text)) AS hash,row_number() OVER (PARTITION BY md5(CAST(({3}) AS text))) AS seq FROM \"{0}\".\"{1}\""
+        context = {
+            "schema":schema,
+            "table":self.name,
+            "staging_table":staging_table,
+            "fid":self._fid_column,
+            "columns":data_columns,
+        }
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("CREATE TEMP TABLE _input_delta_target ON COMMIT DROP AS " + hash_sql.format(schema,self.name,self._fid_column,data_columns))
+            cursor.execute("CREATE TEMP TABLE _input_delta_staging ON COMMIT DROP AS " + hash_sql.format(schema,staging_table,self._fid_column,data_columns))
+            cursor.execute("""DELETE FROM "{schema}"."{table}" t USING (
+    SELECT a.fid FROM _input_delta_target a LEFT JOIN _input_delta_staging b ON a.hash = b.hash AND a.seq = b.seq WHERE b.hash IS NULL
+) d WHERE t."{fid}" = d.fid""".format(**context))
+            deleted_rows = cursor.rowcount
+            cursor.execute("""INSERT INTO "{schema}"."{table}" ("{fid}",{columns})
+SELECT m.max_fid + row_number() OVER (ORDER BY s."{fid}"),{columns}
+FROM "{schema}"."{staging_table}" s JOIN (
+    SELECT a.fid FROM _input_delta_staging a LEFT JOIN _input_delta_target b ON a.hash = b.hash AND a.seq = b.seq WHERE b.hash IS NULL
+) n ON s."{fid}" = n.fid CROSS JOIN (SELECT coalesce(max("{fid}"),0) AS max_fid FROM "{schema}"."{table}") m""".format(**context))
+            inserted_rows = cursor.rowcount
+            cursor.execute("COMMIT")
+        except:
+            cursor.execute("ROLLBACK")
+            raise
+
+        return (inserted_rows,deleted_rows)
+
+    def _invoke_incremental(self,cursor,schema,job_id):
+        """
+        Import the data source into a staging table, and apply only the inserted and deleted rows to the input table.
+        The whole table is reloaded if the input table doesn't exist or its structure is changed.
+
+        Return the same result as invoke
+        """
+        if not self._table_exists(cursor,schema,self.name):
+            return self.invoke(cursor,schema,job_id,with_rowid=True)
+
+        staging_table = self.staging_table_name
+        try:
+            result = self.invoke(cursor,schema,job_id,table_name=staging_table)
+            if not result[0]:
+                return result
+
+            delta = self._apply_delta(cursor,schema,staging_table)
+        finally:
+            cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(schema,staging_table))
+
+        if delta is None:
+            logger.info("The table structure of input '{0}' is changed, reload the whole table".format(self.name))
+            return self.invoke(cursor,schema,job_id,with_rowid=True)
+
+        logger.info("Import the delta of input '{0}', {1} rows inserted, {2} rows deleted".format(self.name,delta[0],delta[1]))
+        self.importing_dict["delta"] = {"inserts":delta[0],"deletes":delta[1]}
+        return result
+
+    def _rename_table(self,cursor,schema,table_name,new_table_name):
+        """
+        Rename the table, and rename its indexes, constraints and sequences whose names start with the table name.
+        """
+        cursor.execute("ALTER TABLE \"{0}\".\"{1}\" RENAME TO \"{2}\"".format(schema,table_name,new_table_name))
+        sql = """SELECT c.relname,c.relkind FROM pg_class c JOIN pg_index i ON c.oid = i.indexrelid WHERE i.indrelid = '"{0}"."{1}"'::regclass
+UNION
+SELECT c.relname,c.relkind FROM pg_class c JOIN pg_depend d ON c.oid = d.objid WHERE d.refobjid = '"{0}"."{1}"'::regclass AND c.relkind = 'S'""".format(schema,new_table_name)
+        for name,kind in self._fetchall(cursor,sql):
+            if not name.startswith(table_name):
+                continue
+            cursor.execute("ALTER {0} \"{1}\".\"{2}\" RENAME TO \"{3}\"".format("SEQUENCE" if kind == "S" else "INDEX",schema,name,new_table_name + name[len(table_name):]))
+
+    def _invoke_swap(self,cursor,schema,job_id):
+        """
+        Import the data source into a staging table with the rowid,
+        and then replace the input table with the staging table in one transaction.
+        The input table is untouched until the import is finished, so a failed or cancelled import keeps the previous data.
+        The staging table is created as a logged table if INPUT_TABLE_LOGGED is True, otherwise as an unlogged table;
+        it is never converted afterwards, because setting a table logged rewrites the whole table into the WAL.
+        The swap transaction only drops and renames the tables, and the input table is locked exclusively for a moment.
+
+        Return the same result as invoke
+        """
+        staging_table = self.staging_table_name
+        swapped = False
+        try:
+            result = self.invoke(cursor,schema,job_id,table_name=staging_table,unlogged=not BorgConfiguration.INPUT_TABLE_LOGGED,with_rowid=True)
+            if not result[0]:
+                return result
+
+            cursor.execute("BEGIN")
+            try:
+                cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(schema,self.name))
+                self._rename_table(cursor,schema,staging_table,self.name)
+                cursor.execute("COMMIT")
+                swapped = True
+            except:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            if not swapped:
+                cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(schema,staging_table))
+
+        return result
+
     @switch_searchpath(searchpath=BorgConfiguration.BORG_SCHEMA)
     def _get_job(self,cursor,job_id):
         from harvest.models import Job
@@ -1221,23 +2026,42 @@ class Input(JobFields,SpatialTableMixin):
     @switch_searchpath(searchpath=BorgConfiguration.BORG_SCHEMA)
     def _post_execute(self,cursor):
         if self.foreign_table:
-            self.importing_dict["row_count"] = self.foreign_table.table_row_count()
+            for key in ("row_count","table_md5","change_signature"):
+                if key in self.importing_dict: del self.importing_dict[key]
             if self.foreign_table.table_md5_support:
-                self.importing_dict["table_md5"] = self.foreign_table.table_md5()
+                self.importing_dict["change_signature"] = {"strategy":self.foreign_table.change_detection,"signature":self.foreign_table.change_signature()}
             if "check_job_id" in self.importing_dict: del self.importing_dict["check_job_id"]
             if "check_batch_id" in self.importing_dict: del self.importing_dict["check_batch_id"]
-            #import ipdb;ipdb.set_trace()
-            self.importing_info = json.dumps(self.importing_dict)
+        #import ipdb;ipdb.set_trace()
+        self.importing_info = json.dumps(self.importing_dict) if self.importing_dict else None
         self.save(update_fields=["importing_info","job_run_time","info"])
 
     @in_schema(BorgConfiguration.INPUT_SCHEMA)
     def execute(self,job_id ,cursor,schema):
         from harvest.jobstates import JobStateOutcome
         begin_time = timezone.now()
-        result = self.invoke(cursor,schema,job_id)
+        if "delta" in self.importing_dict: del self.importing_dict["delta"]
+        if "content_digest" in self.importing_dict: del self.importing_dict["content_digest"]
+        if "rowid_loaded" in self.importing_dict: del self.importing_dict["rowid_loaded"]
+        #hash the data source before the import, so a change during the import is detected by the next job
+        digest = None
+        if self.change_detection == ChangeDetection.CONTENT:
+            try:
+                digest = self.content_digest
+            except:
+                #the data source is imported again by the next job without the digest, but doesn't fail this job
+                logger.warning("Failed to compute the content digest of the input '{0}'. {1}".format(self.name,traceback.format_exc()))
+        if self.import_mode == ImportMode.INCREMENTAL:
+            result = self._invoke_incremental(cursor,schema,job_id)
+        elif self.import_mode == ImportMode.SWAP:
+            result = self._invoke_swap(cursor,schema,job_id)
+        else:
+            result = self.invoke(cursor,schema,job_id,with_rowid=True)
         if result[0]:
             # all data is imported
             self.job_run_time = begin_time
+            if digest:
+                self.importing_dict["content_digest"] = digest
             #save the latest data source information to table
             self._post_execute(cursor)
             if result[1] and result[1].lower().find("error") >= 0 :
@@ -1853,8 +2677,11 @@ class PublishChannel(BorgModel):
     wms_version = models.CharField(max_length=32, null=True,blank=True)
     wms_endpoint = models.CharField(max_length=256, null=True,blank=True)
     gwc_endpoint = models.CharField(max_length=256, null=True,blank=True)
+    dump_compression = models.CharField(max_length=32, default="1", help_text="The compression of the full data dumps, passed to pg_dump -Z: a level from 0 to 9, or 'method:level' such as 'zstd:3' if supported by pg_dump")
     last_modify_time = models.DateTimeField(auto_now=False,auto_now_add=True,editable=False,null=False)
 
+    _dump_compression_re = re.compile("^([0-9]|(none|gzip|lz4|zstd)(:[0-9]+)?)$")
+
     def delete(self,using=None):
         logger.info('Delete {0}:{1}'.format(type(self),self.name))
         if try_set_push_owner("publish_channel"):
@@ -1871,6 +2698,8 @@ class PublishChannel(BorgModel):
         if self.sync_geoserver_data:
             if not self.wfs_version or not self.wfs_endpoint or not self.wms_version or not self.wms_endpoint or not self.gwc_endpoint:
                 raise ValidationError("Please input wfs, wms and gwc related information.")
+        if not self._dump_compression_re.match(self.dump_compression or ""):
+            raise ValidationError("Invalid dump compression '{0}'.".format(self.dump_compression))
         self.last_modify_time = timezone.now()
 
 
@@ -2019,7 +2848,7 @@ class Workspace(BorgModel):
                     json_files.append(access_rule_json_file)
 
             if json_files:
-                hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+                hg = open_repository()
                 hg.commit(include=json_files,addremove=True, user=BorgConfiguration.BORG_STATE_USER, message="Update workspace {}".format(self.name))
 
                 increase_committed_changes()
@@ -2099,6 +2928,7 @@ class Publish(Transform,ResourceStatusMixin,SpatialTableMixin):
     spatial_info = models.TextField(max_length=512,editable=False,null=True,blank=True)
     create_extra_index_sql = SQLField(null=True, editable=True,blank=True)
     priority = models.PositiveIntegerField(default=1000)
+    publish_mode = models.CharField(max_length=16, choices=PublishMode.options, default=PublishMode.FULL, help_text="Full: recreate the published table; Incremental: apply only the inserted and deleted rows, compared by md5_rowhash, to the published table")
     create_table_sql = SQLField(null=True, editable=False)
     geoserver_setting = models.TextField(blank=True,null=True,editable=False)
     pending_actions = models.IntegerField(blank=True,null=True,editable=False)
@@ -2223,10 +3053,109 @@ class Publish(Transform,ResourceStatusMixin,SpatialTableMixin):
         drop related tables and transform functions
         """
         cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(publish_schema,self.table_name))
+        cursor.execute("DROP TABLE IF EXISTS \"{0}\".\"{1}\" CASCADE;".format(publish_schema,self.diff_table_name))
         super(Publish,self).drop(cursor,transform_schema)
 
+    @property
+    def diff_table_name(self):
+        """
+        The table recording the inserted and deleted rowhashes of each publish
+        """
+        return "{0}_diff".format(self.table_name)
+
+    #the number of the latest diffs kept in the diff table
+    diff_history = 30
+
     get_timeout_sql = "show statement_timeout"
     set_timeout_sql = "set statement_timeout to '{}'"
+    _columns_sql = "SELECT a.attname,format_type(a.atttypid,a.atttypmod) FROM pg_attribute a WHERE a.attrelid = '\"{0}\".\"{1}\"'::regclass AND a.attnum > 0 AND NOT a.attisdropped ORDER BY a.attnum"
+
+    def _record_diff(self,cursor,publish_schema,full,inserts_table=None,deletes_table=None):
+        """
+        Record the diff of this publish into the diff table, and remove the outdated diffs.
+        A full publish has no rowhash arrays.
+        """
+        cursor.execute("CREATE TABLE IF NOT EXISTS \"{0}\".\"{1}\" (difftime TIMESTAMP WITH TIME ZONE PRIMARY KEY,\"full\" BOOLEAN NOT NULL,inserts VARCHAR(32)[],deletes VARCHAR(32)[])".format(publish_schema,self.diff_table_name))
+        if full:
+            cursor.execute("INSERT INTO \"{0}\".\"{1}\" (difftime,\"full\") VALUES (clock_timestamp(),true)".format(publish_schema,self.diff_table_name))
+        else:
+            cursor.execute("INSERT INTO \"{0}\".\"{1}\" (difftime,\"full\",inserts,deletes) SELECT clock_timestamp(),false,(SELECT array_agg(md5_rowhash) FROM {2}),(SELECT array_agg(md5_rowhash) FROM {3})".format(
+                publish_schema,self.diff_table_name,inserts_table,deletes_table))
+        cursor.execute("DELETE FROM \"{0}\".\"{1}\" WHERE difftime < (SELECT min(difftime) FROM (SELECT difftime FROM \"{0}\".\"{1}\" ORDER BY difftime DESC LIMIT {2}) a)".format(
+            publish_schema,self.diff_table_name,self.diff_history))
+
+    def _index_signature(self,cursor,publish_schema):
+        """
+        return the md5 of the extra index sql and the definitions of the indexes of the published table
+        """
+        sql = Template(self.create_extra_index_sql).render(Context({"self": self,"publish_schema":publish_schema})) if self.create_extra_index_sql and self.create_extra_index_sql.strip() else ""
+        cursor.execute("SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = '\"{0}\".\"{1}\"'::regclass ORDER BY 1".format(publish_schema,self.table_name))
+        return hashlib.md5("\n".join([sql] + [r[0] for r in cursor.fetchall()]).encode("utf-8")).hexdigest()
+
+    _index_signature_comment = "index signature: {0}"
+    def _save_index_signature(self,cursor,publish_schema):
+        """
+        save the index signature as the comment of the published table, which is checked by the incremental publish.
+        should be called after all the indexes, including the spatial indexes, are created.
+        """
+        cursor.execute("COMMENT ON TABLE \"{0}\".\"{1}\" IS '{2}'".format(publish_schema,self.table_name,self._index_signature_comment.format(self._index_signature(cursor,publish_schema))))
+
+    def _publish_full(self,cursor,publish_view_schema,publish_schema):
+        """
+        recreate the published table from the latest data view
+        """
+        sql = (
+            "DROP TABLE IF EXISTS \"{2}\".\"{0}\" CASCADE;\n"
+            "CREATE TABLE \"{2}\".\"{0}\" (LIKE \"{1}\".\"{0}\",\n"
+            "CONSTRAINT pk_{0} PRIMARY KEY (md5_rowhash));\n"
+            "INSERT INTO \"{2}\".\"{0}\" SELECT * FROM \"{1}\".\"{0}\";"
+            ).format(self.table_name,publish_view_schema,publish_schema)
+        cursor.execute(sql)
+        self._record_diff(cursor,publish_schema,True)
+
+        #create extra index
+        if self.create_extra_index_sql and self.create_extra_index_sql.strip():
+            sql = Template(self.create_extra_index_sql).render(Context({"self": self,"publish_schema":publish_schema}))
+            cursor.execute(sql)
+
+    def _publish_incremental(self,cursor,publish_view_schema,publish_schema):
+        """
+        Apply the rows inserted into and deleted from the latest data view, compared by md5_rowhash, to the published table in one transaction.
+        The unchanged rows and the indexes are untouched.
+        Return (inserted rows,deleted rows), or None if the published table doesn't exist or its structure is changed;
+        the structure includes the extra index sql and the indexes, which are only created by the full publish.
+        """
+        cursor.execute("SELECT to_regclass('\"{0}\".\"{1}\"')".format(publish_schema,self.table_name))
+        if not cursor.fetchone()[0]:
+            return None
+        cursor.execute(self._columns_sql.format(publish_view_schema,self.table_name))
+        view_columns = cursor.fetchall()
+        cursor.execute(self._columns_sql.format(publish_schema,self.table_name))
+        if view_columns != cursor.fetchall():
+            return None
+        cursor.execute("SELECT obj_description('\"{0}\".\"{1}\"'::regclass,'pg_class')".format(publish_schema,self.table_name))
+        if cursor.fetchone()[0] != self._index_signature_comment.format(self._index_signature(cursor,publish_schema)):
+            return None
+
+        context = {"table":self.table_name,"view_schema":publish_view_schema,"schema":publish_schema}
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("CREATE TEMP TABLE publish_latest ON COMMIT DROP AS SELECT * FROM \"{view_schema}\".\"{table}\"".format(**context))
+            cursor.execute("CREATE TEMP TABLE publish_inserts ON COMMIT DROP AS SELECT md5_rowhash FROM publish_latest EXCEPT SELECT md5_rowhash FROM \"{schema}\".\"{table}\"".format(**context))
+            cursor.execute("CREATE TEMP TABLE publish_deletes ON COMMIT DROP AS SELECT md5_rowhash FROM \"{schema}\".\"{table}\" EXCEPT SELECT md5_rowhash FROM publish_latest".format(**context))
+            cursor.execute("DELETE FROM \"{schema}\".\"{table}\" a USING publish_deletes b WHERE a.md5_rowhash = b.md5_rowhash".format(**context))
+            deletes = cursor.rowcount
+            cursor.execute("INSERT INTO \"{schema}\".\"{table}\" SELECT a.* FROM publish_latest a JOIN publish_inserts b ON a.md5_rowhash = b.md5_rowhash".format(**context))
+            inserts = cursor.rowcount
+            self._record_diff(cursor,publish_schema,False,"publish_inserts","publish_deletes")
+            cursor.execute("COMMIT")
+        except:
+            cursor.execute("ROLLBACK")
+            raise
+
+        if inserts or deletes:
+            cursor.execute("ANALYZE \"{schema}\".\"{table}\"".format(**context))
+        return (inserts,deletes)
     def invoke(self, cursor,trans_schema,normal_schema,publish_view_schema,publish_schema):
         """
         invoke the function to populate the table data in speicifed schema
@@ -2244,30 +3173,21 @@ class Publish(Transform,ResourceStatusMixin,SpatialTableMixin):
             cursor.execute(self.set_timeout_sql.format("0"))
             sql = "CREATE OR REPLACE VIEW \"{3}\".\"{0}\" AS SELECT *, md5(CAST(row.* AS text)) as md5_rowhash FROM \"{2}\".\"{1}\"() as row;".format(self.table_name,self.func_name,trans_schema,publish_view_schema)
             cursor.execute(sql)
-            sql = (
-                "DROP TABLE IF EXISTS \"{4}\".\"{0}\" CASCADE;\n"
-                #"CREATE TABLE IF NOT EXISTS \"{4}\".\"{0}\" (LIKE \"{3}\".\"{0}\",\n"
-                "CREATE TABLE \"{4}\".\"{0}\" (LIKE \"{3}\".\"{0}\",\n"
-                "CONSTRAINT pk_{0} PRIMARY KEY (md5_rowhash));\n"
-                #"CREATE TABLE IF NOT EXISTS \"{0}_diff\" (\n"
-                #"difftime TIMESTAMP PRIMARY KEY\n,"
-                #"inserts VARCHAR(32)[], deletes VARCHAR(32)[]);\n"
-                #"INSERT INTO \"{0}_diff\" select now() as difftime, del.array_agg as deletes, ins.array_agg as inserts from\n"
-                #"(select array_agg(d.md5_rowhash) from (select md5_rowhash from \"{0}\" except (select md5_rowhash from publish_view.\"{0}\")) as d) as del,\n"
-                #"(select array_agg(i.md5_rowhash) from (select md5_rowhash from publish_view.\"{0}\" except (select md5_rowhash from \"{0}\")) as i) as ins;\n"
-                #"TRUNCATE \"{4}\".\"{0}\";" # For now don't actually use diff just truncate/full reinsert
-                "INSERT INTO \"{4}\".\"{0}\" SELECT * FROM \"{3}\".\"{0}\";"
-                ).format(self.table_name, timezone.now(),trans_schema,publish_view_schema,publish_schema)
-            cursor.execute(sql)
-    
-            #create extra index
-            if self.create_extra_index_sql and self.create_extra_index_sql.strip():
-                sql = Template(self.create_extra_index_sql).render(Context({"self": self,"publish_schema":publish_schema}))
-                cursor.execute(sql)
+            diff = None
+            if self.publish_mode == PublishMode.INCREMENTAL:
+                diff = self._publish_incremental(cursor,publish_view_schema,publish_schema)
+                if diff is None:
+                    logger.info("The published table of publish({0}) doesn't exist or its structure is changed, publish the full data".format(self.name))
+                else:
+                    logger.info("Publish({0}): {1} rows are inserted, {2} rows are deleted".format(self.name,*diff))
+            if diff is None:
+                self._publish_full(cursor,publish_view_schema,publish_schema)
     
             #create index
             #print "refresh spatial info for table (id={}, name={})".format(self.id,self.table_name)
             self.refresh_spatial_info(publish_schema).create_indexes(cursor=cursor)
+            if diff is None:
+                self._save_index_signature(cursor,publish_schema)
         finally:
             #reset the default timeout
             cursor.execute(self.set_timeout_sql.format(default_timeout))
@@ -2434,7 +3354,7 @@ class Publish(Transform,ResourceStatusMixin,SpatialTableMixin):
         try_set_push_owner("unpublish")
         hg = None
         try:
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #get all possible files
             files =[self.output_filename_abs(action) for action in ['meta','empty_gwc'] ]
@@ -2515,7 +3435,7 @@ class Publish(Transform,ResourceStatusMixin,SpatialTableMixin):
             with open(json_file, "wb") as output:
                 json.dump(json_out, output, indent=4)
 
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_file],addremove=True, user=BorgConfiguration.BORG_STATE_USER, message="Update feature's meta data {}.{}".format(self.workspace.name, self.name))
 
             increase_committed_changes()
@@ -2567,7 +3487,7 @@ class Publish(Transform,ResourceStatusMixin,SpatialTableMixin):
             with open(json_file, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_file],addremove=True, user="borgcollector", message="Empty GWC of publish {}.{}".format(self.workspace.name, self.name))
             increase_committed_changes()
                 
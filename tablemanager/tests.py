@@ -1,3 +1,199 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+
+from tablemanager.models import Input,Publish,PublishMode,Workspace
 
 # Create your tests here.
+
+class TilesTest(SimpleTestCase):
+    def _input(self,import_workers,feature_count,extent):
+        input = Input(name="test",import_workers=import_workers)
+        input.info = "Layer name: test\nGeometry: Multi Polygon\nFeature Count: {0}\nExtent: {1}\nLayer SRS WKT:\n".format(feature_count,extent)
+        return input
+
+    def test_unknown_extent(self):
+        self.assertIsNone(self._input(4,100,"Non Spatial")._tiles())
+        self.assertIsNone(self._input(4,0,"(0.000000, 0.000000) - (10.000000, 20.000000)")._tiles())
+        self.assertIsNone(self._input(4,-1,"(0.000000, 0.000000) - (10.000000, 20.000000)")._tiles())
+        #a point
+        self.assertIsNone(self._input(4,1,"(5.000000, 5.000000) - (5.000000, 5.000000)")._tiles())
+
+    def test_tiles_cover_extent(self):
+        xmin,ymin,xmax,ymax = 115.5,-35.25,129.0,-13.5
+        for import_workers in range(2,17):
+            tiles = self._input(import_workers,1000,"({0}, {1}) - ({2}, {3})".format(xmin,ymin,xmax,ymax))._tiles()
+            self.assertGreaterEqual(len(tiles),import_workers * 2)
+            #the tiles cover the whole extent, including the borders
+            self.assertLessEqual(min([t[0] for t in tiles]),xmin)
+            self.assertLessEqual(min([t[1] for t in tiles]),ymin)
+            self.assertGreaterEqual(max([t[2] for t in tiles]),xmax)
+            self.assertGreaterEqual(max([t[3] for t in tiles]),ymax)
+            #the tiles don't overlap and leave no gap
+            area = (max([t[2] for t in tiles]) - min([t[0] for t in tiles])) * (max([t[3] for t in tiles]) - min([t[1] for t in tiles]))
+            self.assertAlmostEqual(sum([(t[2] - t[0]) * (t[3] - t[1]) for t in tiles]),area)
+            for x in (xmin,(xmin + xmax) / 2,xmax):
+                for y in (ymin,(ymin + ymax) / 2,ymax):
+                    self.assertTrue(any([t[0] <= x <= t[2] and t[1] <= y <= t[3] for t in tiles]))
+
+class GroupTransactionsTest(SimpleTestCase):
+    def _input(self,tuning=None):
+        input = Input(name="test")
+        if tuning:
+            input.importing_dict["group_transactions"] = tuning
+        return input
+
+    def test_default(self):
+        self.assertEqual(self._input().group_transactions,20000)
+
+    def test_improving(self):
+        input = self._input()
+        input._tune_group_transactions(20000,1000)
+        self.assertEqual(input.group_transactions,40000)
+        input._tune_group_transactions(40000,2000)
+        self.assertEqual(input.group_transactions,80000)
+
+    def test_worse(self):
+        input = self._input({"size":40000,"best_size":20000,"throughput":1000,"step":2})
+        #go back to the best size and try the other direction
+        input._tune_group_transactions(40000,500)
+        self.assertEqual(input.group_transactions,10000)
+        self.assertEqual(input.importing_dict["group_transactions"]["best_size"],20000)
+
+    def test_clamping(self):
+        input = self._input({"size":Input.max_group_transactions,"best_size":Input.max_group_transactions,"throughput":1000,"step":2})
+        input._tune_group_transactions(Input.max_group_transactions,2000)
+        self.assertEqual(input.group_transactions,Input.max_group_transactions)
+
+        input = self._input({"size":Input.min_group_transactions,"best_size":Input.min_group_transactions,"throughput":1000,"step":0.5})
+        input._tune_group_transactions(Input.min_group_transactions,2000)
+        self.assertEqual(input.group_transactions,Input.min_group_transactions)
+
+        input = self._input({"size":Input.min_group_transactions,"best_size":Input.min_group_transactions,"throughput":1000,"step":2})
+        input._tune_group_transactions(Input.min_group_transactions,100)
+        self.assertEqual(input.group_transactions,Input.min_group_transactions)
+        for throughput in (1,10,100,1000,10000,100000):
+            input._tune_group_transactions(input.group_transactions,throughput)
+            self.assertGreaterEqual(input.group_transactions,Input.min_group_transactions)
+            self.assertLessEqual(input.group_transactions,Input.max_group_transactions)
+
+class _FidsCursor(object):
+    """
+    A cursor which returns the statistics and the gaps of the fids imported into the part tables.
+    """
+    def __init__(self,fids):
+        self.fids = sorted(set(fids))
+        self.result = None
+
+    def execute(self,sql):
+        if "lead(" in sql:
+            self.result = [(f,n) for f,n in zip(self.fids,self.fids[1:]) if n > f + 1]
+        else:
+            self.result = [(len(self.fids),min(self.fids) if self.fids else None,max(self.fids) if self.fids else None)]
+
+    def fetchall(self):
+        return self.result
+
+class MissingFeaturesTest(SimpleTestCase):
+    def _missing(self,source_fids,imported_fids):
+        where = Input(name="test")._missing_features_filter(_FidsCursor(imported_fids),"test",["test_tile0","test_tile1"],len(source_fids))
+        if where is None:
+            return None
+        condition = where.replace("FID","fid").replace(" OR "," or ").replace(" AND "," and ").replace("IS NOT NULL","is not None")
+        return [fid for fid in source_fids if eval(condition,{"fid":fid})]
+
+    def test_nothing_missing(self):
+        self.assertIsNone(self._missing(range(1,21),range(1,21)))
+
+    def test_empty_geometries(self):
+        #the features with empty geometries are not imported by any tile
+        source_fids = range(1,21)
+        self.assertEqual(self._missing(source_fids,[fid for fid in source_fids if fid not in (1,5,6,12,20)]),[1,5,6,12,20])
+        self.assertEqual(self._missing(source_fids,[]),source_fids)
+
+    def test_too_many_ranges(self):
+        source_fids = range(1,(Input.max_missing_ranges + 2) * 2)
+        self.assertIsNone(self._missing(source_fids,[fid for fid in source_fids if fid % 2]))
+
+class _PublishCursor(object):
+    """
+    A cursor which simulates the published table in the catalog, enough for the publish to choose between the full and incremental publish.
+    """
+    def __init__(self):
+        self.exists = False
+        self.indexes = []
+        self.comment = None
+        self.rowcount = 0
+        self._result = []
+
+    def execute(self,sql,params=None):
+        self._result = []
+        self.rowcount = 0
+        if sql.startswith("show statement_timeout"):
+            self._result = [("0",)]
+        elif sql.startswith("DROP TABLE IF EXISTS") and "CREATE TABLE" in sql:
+            #the full publish recreates the table with the primary key only
+            self.exists = True
+            self.indexes = ["CREATE UNIQUE INDEX pk_test ON test USING btree (md5_rowhash)"]
+            self.comment = None
+        elif sql.startswith("SELECT to_regclass"):
+            self._result = [("test" if self.exists else None,)]
+        elif sql.startswith("SELECT a.attname"):
+            self._result = [("wkb_geometry","geometry(MultiPolygon,4326)"),("md5_rowhash","text")]
+        elif sql.startswith("SELECT pg_get_indexdef"):
+            self._result = [(i,) for i in sorted(self.indexes)]
+        elif sql.startswith("SELECT obj_description"):
+            self._result = [(self.comment,)]
+        elif sql.startswith("COMMENT ON TABLE"):
+            self.comment = sql[sql.index(" IS '") + 5:-1]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+class _SpatialTable(object):
+    """
+    Create the gist index of the geometry column, the same as SpatialTable.create_indexes
+    """
+    index = "CREATE INDEX test_wkb_geometry ON test USING gist (wkb_geometry)"
+    def create_indexes(self,cursor=None):
+        if self.index not in cursor.indexes:
+            cursor.indexes.append(self.index)
+
+class IncrementalPublishTest(SimpleTestCase):
+    def _publish(self):
+        publish = Publish(name="test",publish_mode=PublishMode.INCREMENTAL,workspace=Workspace(name="test"))
+        publish.refresh_spatial_info = lambda schema:_SpatialTable()
+        publish.full_publishes = 0
+        publish_full = publish._publish_full
+        def _publish_full(*args):
+            publish.full_publishes += 1
+            return publish_full(*args)
+        publish._publish_full = _publish_full
+        return publish
+
+    def test_spatial_table(self):
+        cursor = _PublishCursor()
+        publish = self._publish()
+        publish.invoke(cursor,"transform","normal","view","publish")
+        self.assertEqual(publish.full_publishes,1)
+        #the spatial index is created after the full publish, and is part of the index signature
+        publish.invoke(cursor,"transform","normal","view","publish")
+        self.assertEqual(publish.full_publishes,1)
+        publish.invoke(cursor,"transform","normal","view","publish")
+        self.assertEqual(publish.full_publishes,1)
+
+    def test_index_changed(self):
+        cursor = _PublishCursor()
+        publish = self._publish()
+        publish.invoke(cursor,"transform","normal","view","publish")
+        #the spatial index is dropped
+        cursor.indexes.remove(_SpatialTable.index)
+        publish.invoke(cursor,"transform","normal","view","publish")
+        self.assertEqual(publish.full_publishes,2)
+        #the extra index sql is changed
+        publish.create_extra_index_sql = "CREATE INDEX test_name ON {{publish_schema}}.test (name);"
+        publish.invoke(cursor,"transform","normal","view","publish")
+        self.assertEqual(publish.full_publishes,3)
+        publish.invoke(cursor,"transform","normal","view","publish")
+        self.assertEqual(publish.full_publishes,3)
@@ -3,7 +3,6 @@ import re
 import json
 import requests
 import logging
-import hglib
 import urllib
 import traceback
 import mimetypes
@@ -25,6 +24,7 @@ from django.core.validators import RegexValidator
 
 from tablemanager.models import Workspace
 from borg_utils.borg_config import BorgConfiguration
+from borg_utils.hg_pool import open_repository
 from borg_utils.utils import file_md5
 from borg_utils.transaction import TransactionMixin
 from borg_utils.signals import refresh_select_choices,inherit_support_receiver
@@ -371,7 +371,7 @@ class WmsServer(models.Model,ResourceStatusMixin,TransactionMixin):
             with open(json_file, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_file],addremove=True, user="borgcollector", message="Unpublish wms store {}.{}".format(self.workspace.name, self.name))
             increase_committed_changes()
                 
@@ -423,7 +423,7 @@ class WmsServer(models.Model,ResourceStatusMixin,TransactionMixin):
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_filename],addremove=True, user="borgcollector", message="Update wms store {}.{}".format(self.workspace.name, self.name))
             increase_committed_changes()
                 
@@ -661,7 +661,7 @@ class WmsLayer(models.Model,ResourceStatusMixin,TransactionMixin):
             with open(json_file, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #remove other related json files
             json_files = [ self.json_filename_abs(action) for action in [ 'empty_gwc' ] ]
@@ -711,7 +711,7 @@ class WmsLayer(models.Model,ResourceStatusMixin,TransactionMixin):
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
 
             #remove other related json files
             json_files = [ self.json_filename_abs(action) for action in [ 'empty_gwc' ] ]
@@ -755,7 +755,7 @@ class WmsLayer(models.Model,ResourceStatusMixin,TransactionMixin):
             with open(json_filename, "wb") as output:
                 json.dump(json_out, output, indent=4)
         
-            hg = hglib.open(BorgConfiguration.BORG_STATE_REPOSITORY)
+            hg = open_repository()
             hg.commit(include=[json_filename],addremove=True, user="borgcollector", message="Empty GWC of wms layer {}.{}".format(self.server.workspace.name, self.name))
             increase_committed_changes()
                 